@@ -0,0 +1,415 @@
+"""Load harness for the message -> drop -> claim -> ledger pipeline.
+
+Replays a synthetic (or recorded) message stream through
+``ChristmasEvent.on_message``, clicks the gift button of every drop from
+several users at once so ``GiftButton``, the claim window on the drop timer
+wheel and ``finish_claim`` run for real, and stores everything through an in-process
+Supabase stand-in (see ``benchmarks/stand_in.py``) or, with
+``--backend sqlite``, the embedded SQLite backend.
+
+    python -m benchmarks.bench_drop_pipeline                       # 1, 50 and 500 channels
+    python -m benchmarks.bench_drop_pipeline --channels 50 --rate 400 --out results.json
+    python -m benchmarks.bench_drop_pipeline --replay stream.jsonl  # {"t": s, "channel": id, "user": id} per line
+
+Each scenario runs in a fresh subprocess so module state and peak RSS don't
+leak between them. Results are JSON so runs can be diffed for regressions.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+RESULT_TAG = "@@result "
+
+
+def percentiles(samples: List[float], scale: float = 1000.0) -> Dict[str, float]:
+    if not samples:
+        return {"count": 0}
+    s = sorted(samples)
+
+    def pick(q):
+        return round(s[min(len(s) - 1, int(q * len(s)))] * scale, 3)
+    return {"count": len(s), "p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": round(s[-1] * scale, 3)}
+
+
+def peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# --- DISCORD STAND-INS ---
+class FakeUser:
+    __slots__ = ("id", "bot", "mention")
+
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.bot = False
+        self.mention = f"<@{user_id}>"
+
+
+class FakeResponse:
+    async def defer(self):
+        pass
+
+
+class FakeInteraction:
+    def __init__(self, user: FakeUser, client):
+        self.user = user
+        self.client = client
+        self.response = FakeResponse()
+
+
+class FakeSentMessage:
+    _ids = iter(range(1, 1 << 62))
+
+    def __init__(self, harness, channel, view):
+        self.id = next(self._ids)
+        self.harness = harness
+        self.channel = channel
+        self.drop_id = getattr(gift_button(view), "drop_id", None)
+
+    async def edit(self, **_):
+        await asyncio.sleep(self.harness.discord_latency)
+        # the edit runs on the channel's outbound queue, not in the click's context
+        clicked = self.harness.first_click.pop(self.drop_id, None)
+        if clicked is not None:
+            self.harness.claim_to_result.append(time.perf_counter() - clicked)
+
+    async def delete(self):
+        await asyncio.sleep(self.harness.discord_latency)
+
+
+class FakeChannel:
+    def __init__(self, harness, channel_id: int):
+        self.id = channel_id
+        self.harness = harness
+
+    async def send(self, view=None, **_):
+        await asyncio.sleep(self.harness.discord_latency)
+        sent = FakeSentMessage(self.harness, self, view)
+        self.harness.on_drop(self, view)
+        return sent
+
+
+class FakeGuild:
+    __slots__ = ("id",)
+
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+
+
+class FakeMessage:
+    __slots__ = ("author", "channel", "content", "guild")
+
+    def __init__(self, author: FakeUser, channel: FakeChannel, guild: FakeGuild = None):
+        self.author = author
+        self.channel = channel
+        self.content = "hi"
+        self.guild = guild
+
+
+class FakeBot:
+    latency = 0.05
+    user = None
+    cog = None
+
+    async def wait_until_ready(self):
+        await asyncio.Event().wait()  # keep the hourly event check parked
+
+    def is_ready(self):
+        return True
+
+    def get_user(self, user_id):
+        return None
+
+    def get_cog(self, name):
+        return self.cog
+
+    def add_dynamic_items(self, *items):
+        pass
+
+    def remove_dynamic_items(self, *items):
+        pass
+
+
+def gift_button(view):
+    """The clickable ``GiftButton`` of a drop post."""
+    from cogs.christmas_event import GiftButton
+    return next((b for b in view.walk_children() if isinstance(b, GiftButton) and not b.item.disabled), None)
+
+
+# --- HARNESS ---
+class Harness:
+    def __init__(self, args):
+        self.args = args
+        self.discord_latency = args.discord_latency_ms / 1000
+        self.rng = random.Random(args.seed)
+        self.channels: Dict[int, FakeChannel] = {}
+        # channels are dealt round-robin to --guilds guilds, so claims go through the per-guild boards
+        self.guilds: Dict[int, FakeGuild] = {g: FakeGuild(g) for g in range(1, args.guilds + 1)}
+        self.users: Dict[int, FakeUser] = {}
+        self.handler_latency: List[float] = []
+        self.claim_to_result: List[float] = []
+        self.claim_to_recorded: List[float] = []
+        self.claim_to_persisted: List[float] = []
+        self.loop_lag: List[float] = []
+        self.awaiting_persist: List[float] = []
+        self.drops = 0
+        self.first_click: Dict[int, float] = {}  # id(drop view) -> first click time
+        self.clicks = 0
+        self.tasks = set()
+
+    def user(self, user_id: int) -> FakeUser:
+        u = self.users.get(user_id)
+        if u is None:
+            u = self.users[user_id] = FakeUser(user_id)
+        return u
+
+    def channel(self, channel_id: int) -> FakeChannel:
+        c = self.channels.get(channel_id)
+        if c is None:
+            c = self.channels[channel_id] = FakeChannel(self, channel_id)
+        return c
+
+    def guild(self, channel_id: int) -> FakeGuild:
+        return self.guilds[1 + channel_id % len(self.guilds)] if self.guilds else None
+
+    def spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    # stream of (offset seconds, channel id, user id)
+    def synthetic_stream(self):
+        a = self.args
+        t = 0.0
+        for _ in range(a.messages):
+            t += self.rng.expovariate(a.rate)
+            channel_id = 1000 + self.rng.randrange(a.channels)
+            user_id = channel_id * 100 + self.rng.randrange(a.users_per_channel)
+            yield t, channel_id, user_id
+
+    def replay_stream(self):
+        with open(self.args.replay, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rec = json.loads(line)
+                    yield float(rec["t"]), int(rec["channel"]), int(rec["user"])
+
+    def on_drop(self, channel: FakeChannel, view):
+        self.drops += 1
+        button = gift_button(view)
+        if button is None:
+            return
+        clickers = self.rng.randint(1, self.args.max_clickers)
+        for _ in range(clickers):
+            user_id = channel.id * 100 + self.rng.randrange(self.args.users_per_channel)
+            self.spawn(self.click(button, self.user(user_id), self.rng.uniform(0.05, 0.6)))
+
+    async def click(self, button, user: FakeUser, delay: float):
+        await asyncio.sleep(delay)
+        self.clicks += 1
+        now = time.perf_counter()
+        self.first_click.setdefault(button.drop_id, now)
+        await button.callback(FakeInteraction(user, self.bot))
+
+    def on_insert(self, rows):
+        now = time.perf_counter()
+        # the ledger is FIFO, so inserted rows match the oldest recorded claims
+        for clicked in self.awaiting_persist[:len(rows)]:
+            self.claim_to_persisted.append(now - clicked)
+        del self.awaiting_persist[:len(rows)]
+
+    def instrument(self, backend) -> Dict[str, int]:
+        """Count storage calls per method and time persisted history rows."""
+        calls: Dict[str, int] = {}
+
+        def wrap(name, fn):
+            async def wrapper(*args, **kwargs):
+                calls[name] = calls.get(name, 0) + 1
+                result = await fn(*args, **kwargs)
+                if name == "insert_history":
+                    self.on_insert(args[0])
+                return result
+            return wrapper
+
+        for name in ("fetch_users", "fetch_history", "fetch_user_history", "fetch_user_total",
+                     "increment_totals", "insert_history", "upsert_totals", "set_total", "clear"):
+            setattr(backend, name, wrap(name, getattr(backend, name)))
+        return calls
+
+    async def monitor_loop(self, interval: float = 0.01):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.loop_lag.append(max(0.0, time.perf_counter() - start - interval))
+
+    async def handle(self, cog, message: FakeMessage):
+        start = time.perf_counter()
+        await cog.on_message(message)
+        self.handler_latency.append(time.perf_counter() - start)
+
+    async def run(self) -> Dict[str, Any]:
+        from benchmarks import stand_in
+        tmp = tempfile.mkdtemp(prefix="drop-bench-")
+        stand_in.install(tmp, self.args.backend)
+        stand_in.StandInPostgrest.latency = self.args.storage_latency_ms / 1000
+        os.environ["DROP_CHANNEL_ID"] = "0"
+        # the stream packs hours of chat into seconds, so aim the drop model that much higher
+        os.environ["DROPS_PER_HOUR"] = os.environ["DROPS_MAX_PER_HOUR"] = str(self.args.drops_per_hour)
+
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            from data import data
+            from cogs.christmas_event import ChristmasEvent
+            await data.warm_start_async()
+
+            original_record_gift = data.record_gift_async
+
+            async def timed_record_gift(user_id, amount, drop_name=None, guild_id=None, drop_id=None):
+                total = await original_record_gift(user_id, amount, drop_name, guild_id, drop_id)
+                clicked = self.first_click.get(drop_id)
+                if clicked is not None:
+                    self.claim_to_recorded.append(time.perf_counter() - clicked)
+                    self.awaiting_persist.append(clicked)
+                return total
+            data.record_gift_async = timed_record_gift
+            calls = self.instrument(data.backend)
+
+            self.bot = FakeBot()
+            cog = self.bot.cog = ChristmasEvent(self.bot)
+            cog.event_active = True
+            monitor = asyncio.create_task(self.monitor_loop())
+
+            stream = self.replay_stream() if self.args.replay else self.synthetic_stream()
+            started = time.perf_counter()
+            count = 0
+            for offset, channel_id, user_id in stream:
+                delay = started + offset - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self.spawn(self.handle(cog, FakeMessage(self.user(user_id), self.channel(channel_id),
+                                                        self.guild(channel_id))))
+                count += 1
+            while self.tasks:
+                await asyncio.gather(*list(self.tasks))
+            elapsed = time.perf_counter() - started
+
+            # let the last claim windows close, then flush the ledger like a cog unload
+            await asyncio.sleep(1.0)
+            while self.tasks:
+                await asyncio.gather(*list(self.tasks))
+            await cog.cog_unload()
+            monitor.cancel()
+
+        return {
+            "scenario": {
+                "channels": len(self.channels),
+                "messages": count,
+                "rate": None if self.args.replay else self.args.rate,
+                "replay": self.args.replay,
+                "backend": self.args.backend,
+                "guilds": self.args.guilds,
+                "users_per_channel": self.args.users_per_channel,
+                "storage_latency_ms": self.args.storage_latency_ms,
+                "discord_latency_ms": self.args.discord_latency_ms,
+            },
+            "elapsed_s": round(elapsed, 3),
+            "messages_per_sec": round(count / elapsed, 1) if elapsed else None,
+            "handler_ms": percentiles(self.handler_latency),
+            "drops": self.drops,
+            "drops_per_hour_per_channel": round(self.drops / len(self.channels) * 3600 / elapsed, 1)
+            if elapsed and self.channels else None,
+            "clicks": self.clicks,
+            "claim_to_result_ms": percentiles(self.claim_to_result),
+            "claim_to_recorded_ms": percentiles(self.claim_to_recorded),
+            "claim_to_persisted_ms": percentiles(self.claim_to_persisted),
+            "loop_lag_ms": percentiles(self.loop_lag),
+            "outbound_queue_ms": outbound_queue_ms(),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "storage_calls": dict(calls),
+        }
+
+
+def outbound_queue_ms() -> Dict[str, Dict[str, float]]:
+    from utils import metrics
+    out = {}
+    for (action,), child in metrics.OUTBOUND_QUEUE_SECONDS._children.items():
+        out[action] = {"count": child.count, "mean": round(child.sum / child.count * 1000, 3) if child.count else None}
+    out["coalesced"] = sum(c.value for c in metrics.OUTBOUND_COALESCED._children.values())
+    return out
+
+
+def child_args(args, channels: int) -> List[str]:
+    out = [sys.executable, "-m", "benchmarks.bench_drop_pipeline", "--child",
+           "--channels", str(channels), "--messages", str(args.messages), "--rate", str(args.rate),
+           "--users-per-channel", str(args.users_per_channel), "--max-clickers", str(args.max_clickers),
+           "--storage-latency-ms", str(args.storage_latency_ms),
+           "--discord-latency-ms", str(args.discord_latency_ms), "--seed", str(args.seed),
+           "--backend", args.backend, "--drops-per-hour", str(args.drops_per_hour), "--guilds", str(args.guilds)]
+    if args.replay:
+        out += ["--replay", args.replay]
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--channels", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--rate", type=float, default=500.0, help="messages per second across all channels")
+    parser.add_argument("--users-per-channel", type=int, default=20)
+    parser.add_argument("--max-clickers", type=int, default=4, help="users racing for each drop")
+    parser.add_argument("--drops-per-hour", type=float, default=720.0,
+                        help="drop target per channel (DROPS_PER_HOUR); the 10s drop cooldown caps it near 360")
+    parser.add_argument("--guilds", type=int, default=4, help="guilds the channels belong to; 0 sends every message as a DM")
+    parser.add_argument("--backend", choices=["stand-in", "sqlite"], default="stand-in")
+    parser.add_argument("--storage-latency-ms", type=float, default=30.0, help="stand-in backend only")
+    parser.add_argument("--discord-latency-ms", type=float, default=60.0)
+    parser.add_argument("--replay", help="JSON Lines message stream instead of the synthetic one")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the JSON results here instead of stdout")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.channels = args.channels[0]
+        # data's atexit shutdown still prints after this, so tag the result line
+        print(RESULT_TAG + json.dumps(asyncio.run(Harness(args).run())), flush=True)
+        return
+
+    scenarios = [None] if args.replay else args.channels
+    results = []
+    for channels in scenarios:
+        proc = subprocess.run(child_args(args, channels or 1), capture_output=True, text=True)
+        if proc.returncode != 0:
+            sys.stderr.write(proc.stderr)
+            raise SystemExit(f"scenario with {channels} channels failed")
+        line = next(l for l in proc.stdout.splitlines() if l.startswith(RESULT_TAG))
+        result = json.loads(line[len(RESULT_TAG):])
+        results.append(result)
+        print(f"{result['scenario']['channels']:>4} channels: {result['messages_per_sec']:>8} msg/s, "
+              f"handler p99 {result['handler_ms'].get('p99')} ms, "
+              f"claim->result p95 {result['claim_to_result_ms'].get('p95')} ms, "
+              f"loop lag p99 {result['loop_lag_ms'].get('p99')} ms, "
+              f"peak RSS {result['peak_rss_mb']} MB", file=sys.stderr)
+
+    payload = json.dumps({"generated_at": time.time(), "results": results}, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Check the drop model hits its drops/hour target on simulated channels.
+
+    python -m benchmarks.bench_drop_rate [--hours 48] [--seed 1]
+
+Runs hours of made-up chat on a virtual clock through ``ChannelActivity`` and
+``DropRateModel`` with the same gating as ``ChristmasEvent.handle_message``
+(same-user cooldown, drop cooldown, one roll per counted message) and prints,
+per channel profile, the drops/hour the model aimed for next to what it
+produced. Also times the per-message cost and sizes one channel's state.
+"""
+import argparse
+import random
+import time
+
+from utils.activity import ChannelActivity
+from utils.drop_rate import DropRateModel
+from utils.profiler import deep_sizeof
+
+SAME_USER_COOLDOWN = 3
+DROP_COOLDOWN = 10
+
+# name -> (messages per minute, speakers, minutes on / minutes off; 0 off means always on)
+PROFILES = {
+    "quiet": (2, 3, (60, 0)),
+    "steady": (20, 5, (60, 0)),
+    "busy": (200, 12, (60, 0)),
+    "huge": (1500, 40, (60, 0)),
+    "bursty": (150, 8, (10, 50)),
+    "solo spammer": (30, 1, (60, 0)),
+}
+
+
+def simulate(model: DropRateModel, per_minute: float, speakers: int, duty, hours: float, rng: random.Random):
+    state = ChannelActivity(window=300)
+    on, off = duty
+    period = (on + off) * 60
+    t, end = 0.0, hours * 3600
+    drops = rolls = 0
+    target_time = 0.0  # integral of the target over time spent chatting
+    last_t = 0.0
+    while True:
+        t += rng.expovariate(per_minute / 60)
+        if off and t % period >= on * 60:
+            t += period - t % period  # skip to the next burst
+        if t >= end:
+            break
+        user = rng.randrange(speakers)
+        if state.on_cooldown(user, t, SAME_USER_COOLDOWN):
+            continue
+        state.record_message(user, t)
+        target_time += model.target(state.rate.speaker_count(t)) * min(t - last_t, 60)
+        last_t = t
+        if t - state.last_drop < DROP_COOLDOWN:
+            continue
+        rolls += 1
+        if rng.random() < model.chance(state.rate, t):
+            state.record_drop(t)
+            drops += 1
+    return drops / hours, target_time / end, rolls, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=48)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    model = DropRateModel(cooldown=DROP_COOLDOWN)
+
+    print(f"{'profile':<14}{'msgs/min':>9}{'users':>6}{'target/h':>10}{'drops/h':>9}")
+    for name, (per_minute, speakers, duty) in PROFILES.items():
+        got, target, _, state = simulate(model, per_minute, speakers, duty, args.hours, rng)
+        print(f"{name:<14}{per_minute:>9}{speakers:>6}{target:>10.2f}{got:>9.2f}")
+
+    # cost of one counted message: record + chance, on a busy channel
+    state = ChannelActivity(window=300)
+    n, t = 200_000, 0.0
+    started = time.perf_counter()
+    for i in range(n):
+        t += 0.05
+        state.record_message(i % 40, t)
+        model.chance(state.rate, t)
+    per_message = (time.perf_counter() - started) / n
+    print(f"\n{per_message * 1e6:.2f} us per message; one busy channel's state is "
+          f"{deep_sizeof(state) / 1024:.1f} KB ({len(state.rate.speakers)} speakers tracked)")
+
+
+if __name__ == "__main__":
+    main()
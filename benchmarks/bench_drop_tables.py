@@ -0,0 +1,84 @@
+"""Drop table sampling: speed of the alias sampler and a goodness-of-fit check.
+
+    python -m benchmarks.bench_drop_tables [--samples 1000000] [--dir data/drop_tables]
+
+Times ``random.choices`` with the weights list rebuilt per call (the old
+``get_random_drop``) against the compiled alias table, then draws
+``--samples`` drops from every table in the directory (default, each season,
+each guild override) and runs a chi-square test of the counts against the
+configured weights. Exits 1 if any table's p-value is below ``--alpha``.
+"""
+import argparse
+import math
+import random
+import sys
+import timeit
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from utils.drop_tables import DROP_TABLES_DIR, CompiledTable, DropTables
+
+
+def chi_square(counts: Dict[str, int], probabilities: Dict[str, float], n: int) -> Tuple[float, int, float]:
+    """``(statistic, degrees of freedom, p-value)``; the p-value uses the Wilson-Hilferty approximation."""
+    stat = sum((counts.get(name, 0) - n * p) ** 2 / (n * p) for name, p in probabilities.items())
+    k = len(probabilities) - 1
+    if k == 0:
+        return 0.0, 0, 1.0
+    z = ((stat / k) ** (1 / 3) - (1 - 2 / (9 * k))) / math.sqrt(2 / (9 * k))
+    return stat, k, 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def all_tables(directory: str) -> List[CompiledTable]:
+    """Base table plus every season and guild override found in ``directory``."""
+    tables = DropTables(directory)
+    seasons = sorted(name[len("season."):-len(".json")] for name, _, _ in tables._state.stamp[0]
+                     if name.startswith("season."))
+    out = [DropTables(directory, season="-").table()]  # no season matches "-", so the plain default
+    for season in seasons:
+        out.append(DropTables(directory, season=season).table())
+    out.extend(tables._state.guilds.values())
+    return out
+
+
+def bench(table: CompiledTable, number: int) -> Dict[str, float]:
+    drops = [{"name": d.name, "weight": d.weight} for d in table.drops]
+
+    def old():
+        weights = [d["weight"] for d in drops]
+        return random.choices(drops, weights=weights)[0]
+
+    return {
+        "random.choices (ns)": min(timeit.repeat(old, number=number, repeat=5)) / number * 1e9,
+        "alias sample (ns)": min(timeit.repeat(table.sample, number=number, repeat=5)) / number * 1e9,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=DROP_TABLES_DIR)
+    parser.add_argument("--samples", type=int, default=1_000_000)
+    parser.add_argument("--alpha", type=float, default=0.001)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    tables = all_tables(args.dir)
+    for name, ns in bench(tables[0], 200_000).items():
+        print(f"{name:>22}: {ns:8.1f}")
+
+    rng = random.Random(args.seed)
+    failed = False
+    for table in tables:
+        counts = Counter(table.sample(rng.random).name for _ in range(args.samples))
+        probabilities = table.probabilities()
+        stat, dof, p = chi_square(counts, probabilities, args.samples)
+        ok = p >= args.alpha
+        failed |= not ok
+        print(f"\n{table.name}: chi2={stat:.2f} dof={dof} p={p:.4f} {'OK' if ok else 'MISMATCH'}")
+        for drop_name, prob in probabilities.items():
+            print(f"  {drop_name:<20} expected {prob:7.4f}  observed {counts[drop_name] / args.samples:7.4f}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Memory of the compact HistoryStore vs the old dict-of-lists-of-dicts history.
+
+    python -m benchmarks.bench_history_memory [--users 10000] [--entries 40] [--retention 0]
+"""
+import argparse
+import datetime
+import gc
+import random
+import tracemalloc
+
+from data.history_store import HistoryStore
+
+DROPS = [("Santa Claus", 3), ("Christmas Tree", 1), ("Coal", -1), ("Grinch", -3)]
+
+
+def events(users, entries, seed=1):
+    rng = random.Random(seed)
+    start = datetime.datetime(2025, 11, 1)
+    for u in range(users):
+        uid = str(300000000000000000 + u)
+        for _ in range(entries):
+            name, amount = rng.choice(DROPS)
+            ts = start + datetime.timedelta(seconds=rng.randint(0, 60 * 86400), microseconds=rng.randint(0, 999999))
+            yield uid, amount, name, ts.isoformat()
+
+
+def build_dicts(users, entries):
+    # what data.history used to be: one fresh dict and strings per gift event
+    history = {}
+    for uid, amount, name, created_at in events(users, entries):
+        history.setdefault(uid, []).append({"amount": amount, "drop": name, "created_at": created_at})
+    return history
+
+
+def build_store(users, entries, retention):
+    store = HistoryStore(retention)
+    for uid, amount, name, created_at in events(users, entries):
+        store.append(uid, amount, name, created_at)
+    return store
+
+
+def measure(build, *args):
+    gc.collect()
+    tracemalloc.start()
+    obj = build(*args)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--entries", type=int, default=40, help="gift events per user")
+    parser.add_argument("--retention", type=int, default=0, help="ring size per user, 0 keeps everything")
+    args = parser.parse_args()
+
+    total = args.users * args.entries
+    old = measure(build_dicts, args.users, args.entries)
+    new = measure(build_store, args.users, args.entries, args.retention)
+    print(f"{args.users:,} users x {args.entries} events = {total:,} events")
+    print(f"  dict history : {old / 2**20:8.1f} MiB  ({old / total:6.1f} B/event)")
+    print(f"  HistoryStore : {new / 2**20:8.1f} MiB  ({new / total:6.1f} B/event)"
+          f"{'' if not args.retention else f'  retention {args.retention}'}")
+    print(f"  ratio        : {old / new:8.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
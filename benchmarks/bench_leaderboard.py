@@ -0,0 +1,72 @@
+"""Compare the RankIndex against the old sort-per-call /leaderboard.
+
+    python -m benchmarks.bench_leaderboard [--sizes 10000 100000 1000000]
+"""
+import argparse
+import random
+import time
+
+from data.rank import RankIndex
+
+
+def sort_per_call(gifts, user_id):
+    # what ChristmasEvent.leaderboard used to do on every call
+    sorted_users = sorted(gifts.items(), key=lambda x: x[1], reverse=True)
+    top_10 = sorted_users[:10]
+    rank = next((i for i, (uid, _) in enumerate(sorted_users, 1) if uid == user_id), None)
+    return top_10, rank
+
+
+def indexed(index, user_id):
+    return index.top(10), index.rank(user_id)
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(size, repeat):
+    rng = random.Random(size)
+    gifts = {str(100000000000000000 + i): rng.randint(-20, 200) for i in range(size)}
+    user_ids = list(gifts)
+    probe = [rng.choice(user_ids) for _ in range(repeat)]
+
+    start = time.perf_counter()
+    index = RankIndex()
+    index.rebuild(gifts.items())
+    build = time.perf_counter() - start
+
+    # both approaches must agree, ties included
+    for uid in probe[:3]:
+        assert sort_per_call(gifts, uid) == indexed(index, uid)
+
+    sort_time = timed(lambda: sort_per_call(gifts, rng.choice(probe)), repeat)
+    index_time = timed(lambda: indexed(index, rng.choice(probe)), repeat * 100)
+
+    def update():
+        uid = rng.choice(user_ids)
+        gifts[uid] += 1
+        index.set(uid, gifts[uid])
+    update_time = timed(update, repeat * 100)
+
+    print(f"{size:>9,} users | sort/call {sort_time * 1e3:9.2f} ms | "
+          f"index query {index_time * 1e6:7.2f} us | index update {update_time * 1e6:6.2f} us | "
+          f"build {build * 1e3:8.1f} ms | speedup {sort_time / index_time:,.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
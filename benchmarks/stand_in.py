@@ -0,0 +1,145 @@
+"""In-process stand-in for the Supabase REST client with configurable latency.
+
+Drop-in for ``data.client.AsyncPostgrest`` behind the Supabase backend:
+install it with ``install()`` before ``data.data`` is imported and every
+storage call lands in memory after ``STAND_IN_LATENCY_MS`` of simulated
+network time. ``install(tmpdir, "sqlite")`` uses the embedded SQLite backend
+instead.
+"""
+import asyncio
+import itertools
+import os
+import random
+from typing import Any, Dict, List
+
+
+def _matches(row: Dict[str, Any], filters) -> bool:
+    for col, op, value in filters:
+        x = row.get(col)
+        if op == "eq" and str(x) != str(value):
+            return False
+        if op == "gt" and not x > value:
+            return False
+        if op == "lt" and not x < value:
+            return False
+        if op == "in" and str(x) not in {str(v) for v in value}:
+            return False
+        if op == "not.is" and x is None:
+            return False
+    return True
+
+
+class StandInPostgrest:
+    """Same interface as ``AsyncPostgrest``, backed by dicts."""
+
+    latency: float = float(os.getenv("STAND_IN_LATENCY_MS", "30")) / 1000
+    jitter: float = 0.2
+
+    def __init__(self, url: str = "", key: str = "", **_):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {"users": [], "gift_history": [], "seasons": []}
+        self.batches = set()  # ledger_batches
+        self.calls: Dict[str, int] = {}
+        self._ids = itertools.count(1)
+
+    async def _wait(self, op: str):
+        self.calls[op] = self.calls.get(op, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def _users(self) -> Dict[tuple, Dict[str, Any]]:
+        return {(r["season"], r["user_id"]): r for r in self.tables["users"]}
+
+    async def select(self, table, columns="*", *filters, order=None, desc=False, limit=None):
+        await self._wait("select")
+        rows = [r for r in self.tables.setdefault(table, []) if _matches(r, filters)]
+        if order:
+            keys = order.split(",")
+            rows.sort(key=lambda r: tuple(r[k] for k in keys), reverse=desc)
+        if limit:
+            rows = rows[:limit]
+        if columns != "*":
+            cols = [c.strip() for c in columns.split(",")]
+            return [{c: r.get(c) for c in cols} for r in rows]
+        return [dict(r) for r in rows]
+
+    async def insert(self, table, rows, on_conflict=None):
+        await self._wait("insert")
+        rows = rows if isinstance(rows, list) else [rows]
+        stored = self.tables.setdefault(table, [])
+        seen = {r.get(on_conflict) for r in stored} if on_conflict else ()
+        for r in rows:
+            if on_conflict and r.get(on_conflict) is not None and r[on_conflict] in seen:
+                continue
+            stored.append(dict(r, id=next(self._ids)))
+
+    async def upsert(self, table, rows, on_conflict=None):
+        await self._wait("upsert")
+        existing = self._users()
+        for r in rows if isinstance(rows, list) else [rows]:
+            if (r["season"], r["user_id"]) in existing:
+                existing[r["season"], r["user_id"]].update(r)
+            else:
+                self.tables["users"].append(dict(r))
+
+    async def update(self, table, values, *filters):
+        await self._wait("update")
+        for r in self.tables.setdefault(table, []):
+            if _matches(r, filters):
+                r.update(values)
+
+    async def delete(self, table, *filters):
+        await self._wait("delete")
+        self.tables[table] = [r for r in self.tables.setdefault(table, []) if not _matches(r, filters)]
+
+    async def rpc(self, fn, params, idempotent=False):
+        await self._wait("rpc")
+        if fn == "guild_user_totals":
+            sums: Dict[str, int] = {}
+            for r in self.tables["gift_history"]:
+                if (r["season"] == params["season"] and r.get("guild_id") == params["gid"]
+                        and r["user_id"] > params["after"]):
+                    sums[r["user_id"]] = sums.get(r["user_id"], 0) + r["amount"]
+            return [{"user_id": uid, "total": sums[uid]} for uid in sorted(sums)[:params["lim"]]]
+        if fn == "start_season":
+            for r in self.tables["seasons"]:
+                if r["ended_at"] is None:
+                    r["ended_at"] = params["started_at"]
+            self.tables["seasons"].append(dict(params, ended_at=None, summary=None))
+            return None
+        if fn != "increment_user_totals":
+            raise ValueError(f"unknown rpc {fn}")
+        if params["batch_key"] in self.batches:
+            return None
+        self.batches.add(params["batch_key"])
+        existing = self._users()
+        out = []
+        for d in params["deltas"]:
+            key = (d["season"], d["user_id"])
+            row = existing.get(key)
+            if row is None:
+                row = existing[key] = {"season": d["season"], "user_id": d["user_id"], "total": 0}
+                self.tables["users"].append(row)
+            row["total"] += d["delta"]
+            out.append({"season": row["season"], "user_id": row["user_id"], "total": row["total"]})
+        return out
+
+    async def aclose(self):
+        pass
+
+
+def install(tmpdir: str, backend: str = "stand-in"):
+    """Point ``data`` at the stand-in (or SQLite) and a throwaway snapshot/journal.
+
+    Call before importing ``data.data``.
+    """
+    import data.client
+    os.environ["SNAPSHOT_PATH"] = os.path.join(tmpdir, "snapshot.json")
+    os.environ["JOURNAL_PATH"] = os.path.join(tmpdir, "journal.jsonl")
+    if backend == "sqlite":
+        os.environ["STORAGE_BACKEND"] = "sqlite"
+        os.environ["SQLITE_PATH"] = os.path.join(tmpdir, "gifts.sqlite3")
+        return
+    os.environ["STORAGE_BACKEND"] = "supabase"
+    os.environ.setdefault("PUBLIC_SUPABASE_URL", "http://stand-in")
+    os.environ.setdefault("PUBLIC_SUPABASE_ANON_KEY", "stand-in")
+    data.client.AsyncPostgrest = StandInPostgrest
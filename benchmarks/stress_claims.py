@@ -0,0 +1,140 @@
+"""Stress the claim write path and check every total comes out exact.
+
+    python -m benchmarks.stress_claims [--claims 20000] [--users 50] [--backend sqlite]
+
+Runs ``--claims`` gifts at once against a throwaway backend: half as tasks on
+the bot loop (``record_gift_async``, the path ``finish_claim`` takes) and half
+from a thread pool through the blocking ``record_gift``, the way the old
+``asyncio.to_thread`` claims did. A few hot users win a large share of the
+drops so the same user is written from many places at the same instant.
+Ledger flushes, guild loads and guild evictions (``MAX_GUILDS`` is kept
+below the number of guilds) run alongside.
+
+Afterwards the in-memory totals, every guild board, the stored ``users.total``
+and ``gift_history`` (after a full flush and a reconcile) are compared with
+totals computed from the generated claims. Exits 1 on any mismatch.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+AMOUNTS = (3, 1, 1, 1, -1, -3)
+
+
+def make_claims(args) -> List[Tuple[int, int, int]]:
+    rng = random.Random(args.seed)
+    hot = list(range(1, args.hot_users + 1))
+    claims = []
+    for _ in range(args.claims):
+        user = rng.choice(hot) if rng.random() < args.hot_share else rng.randint(1, args.users)
+        claims.append((user, rng.choice(AMOUNTS), rng.randint(1, args.guilds)))
+    return claims
+
+
+async def run(args) -> int:
+    from benchmarks import stand_in
+    stand_in.install(tempfile.mkdtemp(prefix="stress-claims-"), args.backend)
+    stand_in.StandInPostgrest.latency = 0.002
+    os.environ["MAX_GUILDS"] = str(max(1, args.guilds // 2))
+    from data import data
+    await data.warm_start_async()
+
+    claims = make_claims(args)
+    expected: Counter = Counter()
+    expected_guild: Dict[int, Counter] = {g: Counter() for g in range(1, args.guilds + 1)}
+    for user, amount, guild in claims:
+        expected[str(user)] += amount
+        expected_guild[guild][str(user)] += amount
+
+    pool = ThreadPoolExecutor(max_workers=args.threads)
+    loop = asyncio.get_running_loop()
+    done = asyncio.Event()
+
+    async def on_loop(user, amount, guild):
+        await asyncio.sleep(random.random() * 0.01)
+        await data.record_gift_async(user, amount, "stress", guild)
+
+    async def on_thread(user, amount, guild):
+        await loop.run_in_executor(pool, data.record_gift, user, amount, "stress", guild)
+
+    async def flusher():
+        while not done.is_set():
+            await data.flush_ledger_async(limit=256)
+            await asyncio.sleep(0.005)
+
+    async def guild_churn():
+        rng = random.Random(args.seed + 1)
+        while not done.is_set():
+            await data.guild_async(rng.randint(1, args.guilds))
+            await asyncio.sleep(0.002)
+
+    background = [asyncio.ensure_future(flusher()), asyncio.ensure_future(guild_churn())]
+    started = time.perf_counter()
+    await asyncio.gather(*((on_thread if i % 2 else on_loop)(*c) for i, c in enumerate(claims)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await asyncio.gather(*background)
+    pool.shutdown()
+
+    failures = []
+
+    def check(label, got: Dict[str, int], want: Counter):
+        want = {uid: total for uid, total in want.items()}
+        bad = {uid: (got.get(uid), total) for uid, total in want.items() if got.get(uid) != total}
+        extra = set(got) - set(want)
+        ok = not bad and not extra
+        print(f"  {label:<28} {'exact' if ok else f'{len(bad)} wrong, {len(extra)} unexpected'}")
+        if not ok:
+            failures.append(label)
+            for uid, (g, w) in list(bad.items())[:5]:
+                print(f"    user {uid}: got {g}, expected {w}")
+
+    print(f"{len(claims):,} claims ({args.users} users, {args.hot_users} hot taking {args.hot_share:.0%}, "
+          f"{args.guilds} guilds, {args.threads} threads + loop tasks) in {elapsed:.2f}s")
+    check("in-memory totals", dict(data.gifts), expected)
+    for guild in range(1, args.guilds + 1):
+        part = await data.guild_async(guild)  # a mix of live and freshly reloaded partitions
+        check(f"guild {guild} board", dict(part.gifts), expected_guild[guild])
+
+    await data.flush_all_async()
+    stored = {}
+    async for page in data._iter_pages(data.backend.fetch_users, "user_id", 1000, season=data.season):
+        stored.update((str(r["user_id"]), int(r["total"])) for r in page)
+    check("stored users.total", stored, expected)
+    drift = await data.reconcile_totals_async()
+    print(f"  {'gift_history vs users.total':<28} {'exact' if not drift else f'{len(drift)} drifted'}")
+    if drift:
+        failures.append("reconcile")
+
+    data.partitions.clear()
+    for guild in range(1, args.guilds + 1):
+        part = await data.guild_async(guild)
+        check(f"guild {guild} from storage", dict(part.gifts), expected_guild[guild])
+
+    print("OK" if not failures else f"FAILED: {', '.join(failures)}")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--claims", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--hot-users", type=int, default=3)
+    parser.add_argument("--hot-share", type=float, default=0.5, help="fraction of claims won by the hot users")
+    parser.add_argument("--guilds", type=int, default=6)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--backend", choices=["stand-in", "sqlite"], default="sqlite")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
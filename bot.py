@@ -1,32 +1,121 @@
 import discord
 from discord.ext import commands
 import os
+import json
+import time
 import asyncio
+import hashlib
 from dotenv import load_dotenv
+from data import data
+from data import export as data_export
+from utils.web import start_web
+from utils.profiler import LoopSampler, deep_sizeof, process_stats
 
 load_dotenv()
 
+# Startup phase timings in seconds, printed once the bot is ready
+startup_timings = {}
+_process_started = time.perf_counter()
+
+# Hash of the last command tree synced to Discord; sync is skipped when it matches
+COMMAND_HASH_PATH = os.getenv("COMMAND_HASH_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".command_tree_hash"))
+
 # Bot configuration
 intents = discord.Intents.default()
 intents.message_content = True
-intents.members = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+# Lean cache (default): no members intent, no member chunking at startup and no
+# member cache. Nothing here needs guild member lists; the leaderboard looks
+# names up on demand (cogs/christmas_event.py, utils/user_cache.py).
+# LEAN_CACHE=0 brings back the full member cache.
+LEAN_CACHE = os.getenv("LEAN_CACHE", "1") == "1"
+intents.members = not LEAN_CACHE
+cache_options = dict(
+    chunk_guilds_at_startup=not LEAN_CACHE,
+    member_cache_flags=discord.MemberCacheFlags.none() if LEAN_CACHE else discord.MemberCacheFlags.from_intents(intents),
+)
+
+# Sharded launch (see launcher.py): this process runs the gateway shards in
+# SHARD_IDS out of SHARD_COUNT. Without SHARD_COUNT it's one plain Bot.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+SHARD_IDS = [int(s) for s in os.getenv("SHARD_IDS", "").split(",") if s.strip().isdigit()]
+WORKER_ID = int(os.getenv("WORKER_ID", "0"))
+
+if SHARD_COUNT:
+    bot = commands.AutoShardedBot(command_prefix="!", intents=intents, **cache_options,
+                                  shard_count=SHARD_COUNT, shard_ids=SHARD_IDS or None)
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents, **cache_options)
+
+def cache_summary():
+    """Members cached against members in our guilds, users cached and RSS.
+
+    Compare a LEAN_CACHE=1 and a LEAN_CACHE=0 start to see what the member
+    cache costs in memory and in time to ready.
+    """
+    cached = sum(len(g.members) for g in bot.guilds)
+    total = sum(g.member_count or 0 for g in bot.guilds)
+    mode = "lean" if LEAN_CACHE else "full"
+    return (f"{mode} cache: {cached}/{total} members cached, {len(bot.users)} users, "
+            f"RSS {process_stats()['rss_mb']:.1f} MB")
+
+
+async def timed_phase(name, coro):
+    started = time.perf_counter()
+    result = await coro
+    startup_timings[name] = time.perf_counter() - started
+    print(f"⏱️ {name}: {startup_timings[name]:.2f}s")
+    return result
+
+
+def command_tree_hash():
+    """Hash of every app command as Discord would receive it."""
+    commands_json = sorted((c.to_dict(bot.tree) for c in bot.tree.get_commands()),
+                           key=lambda c: (c.get("type", 1), c["name"]))
+    blob = json.dumps({"application_id": bot.application_id, "commands": commands_json}, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+async def sync_command_tree():
+    digest = command_tree_hash()
+    try:
+        with open(COMMAND_HASH_PATH, "r", encoding="utf-8") as f:
+            if f.read().strip() == digest:
+                print("✅ Slash commands unchanged, skipped sync")
+                return
+    except FileNotFoundError:
+        pass
+
+    synced = await bot.tree.sync()
+    print(f"✅ Synced {len(synced)} slash command(s)")
+    with open(COMMAND_HASH_PATH, "w", encoding="utf-8") as f:
+        f.write(digest)
+
 
 @bot.event
 async def on_ready():
     print(f"✅ Bot is online!")
     print(f"Logged in as: {bot.user.name} ({bot.user.id})")
     print(f"Connected to {len(bot.guilds)} server(s)")
+    if SHARD_COUNT:
+        print(f"Worker {WORKER_ID}: shards {SHARD_IDS or 'all'} of {SHARD_COUNT}")
 
-    if not hasattr(bot, "synced"):  # only sync once
+    if "gateway" not in startup_timings:
+        startup_timings["gateway"] = time.perf_counter() - bot.gateway_started
+
+    # only sync once, and only from one worker when sharded
+    if WORKER_ID == 0 and not hasattr(bot, "synced"):
         try:
-            synced = await bot.tree.sync()
-            print(f"✅ Synced {len(synced)} slash command(s)")
+            await timed_phase("command sync", sync_command_tree())
             bot.synced = True
         except Exception as e:
             print(f"❌ Failed to sync commands: {e}")
 
+    if "ready" not in startup_timings:
+        startup_timings["ready"] = time.perf_counter() - _process_started
+        print("⏱️ Startup: " + ", ".join(f"{k} {v:.2f}s" for k, v in startup_timings.items()))
+        print("🧠 " + cache_summary())
+
     print("─" * 40)
 
     await bot.change_presence(
@@ -45,16 +134,17 @@ async def load_cogs():
     await bot.load_extension("warn_system")
 
 
-# Load all cogs from the 'cogs' folder
+# Load all cogs from the 'cogs' folder, concurrently
+async def load_one_cog(cog_name):
+    try:
+        await bot.load_extension(f'cogs.{cog_name}')
+        print(f"✅ Loaded cog: {cog_name}")
+    except Exception as e:
+        print(f"❌ Failed to load cog {cog_name}: {e}")
+
 async def load_cogs():
-    for filename in os.listdir('./cogs'):
-        if filename.endswith('.py'):
-            cog_name = filename[:-3]
-            try:
-                await bot.load_extension(f'cogs.{cog_name}')
-                print(f"✅ Loaded cog: {cog_name}")
-            except Exception as e:
-                print(f"❌ Failed to load cog {cog_name}: {e}")
+    names = [filename[:-3] for filename in sorted(os.listdir('./cogs')) if filename.endswith('.py')]
+    await asyncio.gather(*(load_one_cog(name) for name in names))
 
 # Command to manually reload cogs (admin only)
 @bot.command(name="reload")
@@ -104,26 +194,158 @@ async def sync(ctx):
     except Exception as e:
         await ctx.send(f"❌ Failed to sync: {e}")
 
-async def main():
-    async with bot:
-        await load_cogs()
-        await bot.start(os.getenv("DISCORD_TOKEN"))
+# Owner-only profiling: process stats and sizes of the in-memory state, or
+# with a duration, a sampling profile of the event loop for that long
+@bot.command(name="profile")
+@commands.is_owner()
+async def profile(ctx, seconds: float = 0.0):
+    """Memory/CPU breakdown; `!profile 10` samples the event loop for 10s"""
+    if seconds > 0:
+        seconds = min(seconds, 60)
+        await ctx.send(f"🔬 Sampling the event loop for {seconds:g}s...")
+        sampler = LoopSampler()
+        await sampler.run_async(seconds)
+        total = max(sampler.samples, 1)
+        lines = [f"{sampler.samples} samples over {seconds:g}s", f"{'self':>6} {'total':>6}  function"]
+        for label, self_n, total_n in sampler.top(15):
+            lines.append(f"{100 * self_n / total:5.1f}% {100 * total_n / total:5.1f}%  {label[:80]}")
+        await ctx.send("```\n" + "\n".join(lines) + "\n```")
+        return
 
+    stats = process_stats()
+    lines = [
+        f"RSS {stats['rss_mb']:.1f} MB | VMS {stats['vms_mb']:.1f} MB | CPU {stats['cpu_percent']:.1f}% "
+        f"| threads {stats['threads']} | fds {stats['open_fds']}",
+        f"discord cache: {len(bot.guilds)} guilds, {cache_summary()}",
+    ]
 
+    cog = bot.get_cog("ChristmasEvent")
+    if cog is not None:
+        data = cog.data
+        tracker = cog.activity_tracker
+        # the data I/O thread changes these under _cache_lock: copy them under
+        # it (the history copy shares arrays copy-on-write) and walk the copies
+        # on a worker thread, so neither side waits on the walk
+        with data._cache_lock:
+            shared = [
+                ("data.gifts", len(data.gifts), dict(data.gifts)),
+                ("data.ranks", len(data.ranks), data.ranks.copy()),
+                ("data.history", data.history.total_entries(), data.history.copy()),
+                ("ledger queue", data.queue_depth(), data.ledger.pending()),
+            ]
+        shared = await asyncio.to_thread(lambda: [(name, n, deep_sizeof(obj)) for name, n, obj in shared])
+        # the rest belongs to the bot loop we're on
+        # drops point at their posted messages; don't count those
+        outside = (discord.Message, discord.PartialMessage)
+        sizes = shared + [
+            ("activity_tracker", len(tracker), deep_sizeof(tracker)),
+            ("user_last_message", sum(len(c.user_last_message) for _, c in tracker),
+             sum(deep_sizeof(c.user_last_message) for _, c in tracker)),
+            ("rate speakers", sum(len(c.rate.speakers) for _, c in tracker),
+             sum(deep_sizeof(c.rate) for _, c in tracker)),
+            ("live drops", len(cog.live_drops), deep_sizeof(cog.live_drops, outside)),
+            ("drop timers", len(cog.drop_timers), deep_sizeof(cog.drop_timers)),
+            ("user_names", len(cog.user_names), deep_sizeof(cog.user_names._names)),
+        ]
+        lines.append(f"{'structure':<22}{'entries':>10}{'size':>12}")
+        for name, entries, size in sizes:
+            lines.append(f"{name:<22}{entries:>10}{size / 1024:>10.1f} KB")
+
+    await ctx.send("```\n" + "\n".join(lines) + "\n```")
+
+@bot.command(name="export")
+@commands.is_owner()
+async def export_season(ctx, fmt: str = "csv", *options):
+    """Export a season's users and gift history; `!export jsonl`, `!export csv restart`, `!export parquet christmas-2025`"""
+    if fmt not in data_export.FORMATS:
+        await ctx.send(f"❌ Format must be one of: {', '.join(data_export.FORMATS)}")
+        return
+    season = next((o for o in options if o != "restart"), data.season)
+    out_dir = os.path.join(data_export.EXPORT_DIR, season, fmt)
+    await ctx.send(f"📦 Exporting season `{season}` to `{out_dir}`...")
+    try:
+        stats = await data_export.export_async(fmt, out_dir, restart="restart" in options, season=season)
+    except Exception as e:
+        await ctx.send(f"❌ Export failed (run it again to resume): {e}")
+        return
+    lines = []
+    for table, t in stats["tables"].items():
+        rate = f"{t['rows_per_sec']:.0f} rows/s" if t["rows_per_sec"] else "-"
+        resumed = f", after {t['resumed_after']}" if t["resumed_after"] is not None else ""
+        lines.append(f"{table:<13}{t['rows']:>10} rows {t['bytes'] / 2**20:>8.2f} MB  {rate}{resumed}")
+    lines.append(f"{'total':<13}{stats['rows']:>10} rows {stats['bytes'] / 2**20:>8.2f} MB  in {stats['elapsed']:.1f}s")
+    await ctx.send("```\n" + "\n".join(lines) + "\n```")
 
-from flask import Flask
-import threading
+@bot.command(name="season")
+@commands.is_owner()
+async def season_command(ctx, name: str = None, *, title: str = None):
+    """List seasons, or end the current one and start another; `!season easter-2026 Easter 2026`"""
+    if name is None:
+        lines = []
+        for s in data.get_seasons():
+            if not s["ended_at"]:
+                state = f"active, {len(data.gifts)} users"
+            elif s["summary"]:
+                state = f"{s['summary']['users']} users, {s['summary']['gifts']} gifts"
+            else:
+                state = "archiving"
+            lines.append(f"{s['name']:<20} {s['title']:<22} {state}")
+        await ctx.send("```\n" + "\n".join(lines or ["no seasons loaded yet"]) + "\n```")
+        return
+    try:
+        ended = await data.start_season_async(name, title)
+    except ValueError as e:
+        await ctx.send(f"❌ {e}")
+        return
+    await ctx.send(f"🎬 Season **{title or name}** started; `{ended}` is being archived.")
 
-app = Flask(__name__)
+# Owner-only view of what the drop model sees per channel, for tuning the DROP* settings
+@bot.command(name="rates")
+@commands.is_owner()
+async def drop_rates(ctx, limit: int = 15):
+    """Per-channel message rate, speakers, drop chance and drops/hour (target vs last hour)"""
+    cog = bot.get_cog("ChristmasEvent")
+    if cog is None:
+        await ctx.send("❌ ChristmasEvent is not loaded")
+        return
+    model = cog.drop_rate
+    lines = [f"window {cog.activity_tracker.window:g}s | {model.per_hour:g}/h + {model.per_speaker:g}/h per speaker "
+             f"over {model.min_speakers}, max {model.max_per_hour:g}/h",
+             f"{'channel':<20}{'msgs/h':>8}{'users':>6}{'chance':>8}{'target':>8}{'last h':>7}"]
+    for r in cog.drop_rates()[:limit]:
+        lines.append(f"{r['channel_id']:<20}{r['messages_per_hour']:>8.0f}{r['speakers']:>6}{r['chance']:>8.1%}"
+                     f"{r['target_per_hour']:>8.1f}{r['drops_last_hour']:>7}")
+    await ctx.send("```\n" + "\n".join(lines) + "\n```")
 
-@app.route('/')
-def home():
-    return "✅ Bot is alive!"
+async def warm_up_data():
+    delay = 5
+    while True:
+        try:
+            return await data.warm_start_async()
+        except Exception as e:
+            print(f"❌ Data warm-up failed, retrying in {delay}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 300)
 
-def run_web():
-    app.run(host='0.0.0.0', port=10000)
+# /healthz and /metrics, served on the bot's own loop
+WEB_PORT = int(os.getenv("WEB_PORT", "10000"))
 
-threading.Thread(target=run_web).start()
+async def main():
+    async with bot:
+        web = await start_web(bot, WEB_PORT, {"worker": WORKER_ID, "shards": SHARD_IDS})
+        # data warm-up runs alongside cog loading and the gateway login;
+        # gifts are only recorded once it's done
+        warm_up = asyncio.create_task(timed_phase("data warm-up", warm_up_data()))
+        try:
+            await timed_phase("cogs", load_cogs())
+            await timed_phase("login", bot.login(os.getenv("DISCORD_TOKEN")))
+            bot.gateway_started = time.perf_counter()
+            await bot.connect()
+        finally:
+            # still retrying if login or the gateway failed first
+            warm_up.cancel()
+            await asyncio.gather(warm_up, return_exceptions=True)
+            await web.cleanup()
 
 
 
@@ -3,15 +3,114 @@ from discord import ui
 from discord.ext import commands, tasks
 from discord.ui import Button
 import os, random, time, asyncio, json
-from collections import defaultdict
 from datetime import datetime
 from data import data
+from utils.activity import ActivityTracker
+from utils.timer_wheel import TimerWheel
+from utils.drop_rate import DropRateModel
+from utils import metrics
+from utils.outbound import OutboundScheduler, CLAIM_EDIT
+from utils.drop_tables import DropTables
+from utils.user_cache import UserDisplayCache
 from dotenv import load_dotenv
 
 load_dotenv()
 
 IS_COMPONENTS_V2 = True
 
+
+class LeaderboardCache:
+    """Rendered top-10 text of one board (global or a guild's), keyed by its version."""
+
+    __slots__ = ("version", "text", "render")
+
+    def __init__(self):
+        self.version = None
+        self.text = None
+        self.render = None  # (version, task) of the render in flight
+
+
+class LiveDrop:
+    """A posted drop, from the post until its message is deleted.
+
+    ``claimants`` is None until the first click opens the claim window, then
+    the ids of everyone who clicked before it closed. The persistent part is
+    mirrored in ``data.drops``.
+    """
+
+    __slots__ = ("id", "channel_id", "guild_id", "drop", "slot", "message", "claimants", "winner")
+
+    def __init__(self, drop_id, channel_id, guild_id, drop, slot):
+        self.id = drop_id
+        self.channel_id = channel_id
+        self.guild_id = guild_id
+        self.drop = drop
+        self.slot = slot
+        self.message = None
+        self.claimants = None
+        self.winner = None
+
+
+class GiftButton(ui.DynamicItem[ui.Button], template=r"gift:(?P<drop>[0-9a-f]+):(?P<slot>[0-3])"):
+    """Every gift button of every drop; the drop id in the custom_id says which drop was clicked.
+
+    Registered once with the bot, so clicks route here without a view per
+    drop and keep working after a restart.
+    """
+
+    def __init__(self, drop_id: str, slot: int, active: bool = True):
+        super().__init__(ui.Button(
+            style=discord.ButtonStyle.primary if active else discord.ButtonStyle.secondary,
+            emoji="🎁" if active else None,
+            label=None if active else "\u200b",
+            custom_id=f"gift:{drop_id}:{slot}",
+            disabled=not active,
+        ))
+        self.drop_id = drop_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match["drop"], int(match["slot"]))
+
+    async def callback(self, interaction: discord.Interaction):
+        cog = interaction.client.get_cog("ChristmasEvent")
+        if cog is not None:
+            cog.click_gift(self.drop_id, interaction.user.id)
+        try:
+            await interaction.response.defer()
+        except:
+            pass
+
+
+class GiftLayouts:
+    """The drop post and the claim result; only the drop id, the lit slot and the result line vary."""
+
+    TITLE = "# 🎁 A Mysterious Gift just appeared!"
+    PROMPT = "✨ Click it to reveal your surprise!"
+    REVEALED = "✨ Someone clicked to reveal it!"
+
+    @classmethod
+    def claim(cls, drop_id: str, slot: int) -> ui.LayoutView:
+        row = ui.ActionRow(*(GiftButton(drop_id, i, i == slot) for i in range(4)))
+        return cls._view(ui.TextDisplay(cls.TITLE), ui.TextDisplay(cls.PROMPT), cls._separator(), row)
+
+    @classmethod
+    def result(cls, winner_id: int, drop) -> ui.LayoutView:
+        return cls._view(ui.TextDisplay(cls.TITLE), ui.TextDisplay(cls.REVEALED), cls._separator(),
+                         ui.TextDisplay(f"🎉 <@{winner_id}> {drop.result_text}"))
+
+    @staticmethod
+    def _separator() -> ui.Separator:
+        return ui.Separator(spacing=discord.SeparatorSpacing.large, visible=True)
+
+    @staticmethod
+    def _view(*items) -> ui.LayoutView:
+        # nothing to dispatch on the view itself (GiftButton is registered with the bot), so it isn't kept
+        view = ui.LayoutView(timeout=None)
+        view.add_item(ui.Container(*items))
+        return view
+
+
 class ChristmasEvent(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -22,211 +121,209 @@ class ChristmasEvent(commands.Cog):
         spam_channels = os.getenv("SPAM_CHANNEL_IDS", "")
         self.spam_channel_ids = [int(cid.strip()) for cid in spam_channels.split(",") if cid.strip().isdigit()]
 
-        # Activity
-        self.activity_tracker = defaultdict(lambda: {"users": set(), "count": 0, "last_drop": 0})
-        self.user_last_message = {}
-
-        self.message_counts = {}  # user_id -> count
+        # Activity (per channel, idle channels evicted after ACTIVITY_TTL seconds,
+        # message rate measured over the last DROP_WINDOW seconds)
+        self.activity_tracker = ActivityTracker(ttl=float(os.getenv("ACTIVITY_TTL", "1800")),
+                                                window=float(os.getenv("DROP_WINDOW", "300")))
 
-        # Drop config
-        self.drop_types = [
-            {"name": "Santa Claus", "emoji": "🎅", "gifts": +3, "weight": 10},
-            {"name": "Christmas Tree", "emoji": "🎄", "gifts": +1, "weight": 55},
-            {"name": "Coal", "emoji": "🪨", "gifts": -1, "weight": 25},
-            {"name": "Grinch", "emoji": "👺", "gifts": -3, "weight": 10},
-        ]
+        # Drop config (data/drop_tables/*.json, picked up again when the files change)
+        self.drop_tables = DropTables()
+        self.drop_tables_poll = float(os.getenv("DROP_TABLES_POLL", "30"))
 
         # Settings
-        self.min_messages = 11
-        self.max_messages = 18
-        self.min_unique_users = 2
         self.same_user_cooldown = 3
         self.drop_cooldown = 10
         self.event_active = False
 
-        self.check_event_status.start()
-
-    def cog_unload(self):
-        self.check_event_status.cancel()
+        # Posted drops by drop id. One timer per drop on a shared wheel: the claim
+        # window (CLAIM_WINDOW seconds after the first click) while it's open,
+        # otherwise removal of the message (DROP_TIMEOUT seconds after the post
+        # or the claim). Clicks come in through GiftButton.
+        self.claim_window = float(os.getenv("CLAIM_WINDOW", "0.7"))
+        self.drop_timeout = float(os.getenv("DROP_TIMEOUT", "25"))
+        self.live_drops = {}
+        self.drop_timers = TimerWheel(float(os.getenv("DROP_TIMER_TICK", "0.1")))
+        self._drops_restored = False
+        self.bot.add_dynamic_items(GiftButton)
+        metrics.CACHE_SIZE.labels("live_drops").set_function(lambda: len(self.live_drops))
+
+        # Drops per hour aimed at in each channel (see utils/drop_rate.py)
+        self.drop_rate = DropRateModel(
+            per_hour=float(os.getenv("DROPS_PER_HOUR", "6")),
+            per_speaker=float(os.getenv("DROPS_PER_SPEAKER", "2")),
+            max_per_hour=float(os.getenv("DROPS_MAX_PER_HOUR", "20")),
+            min_speakers=int(os.getenv("DROP_MIN_SPEAKERS", "2")),
+            min_messages=int(os.getenv("DROP_MIN_MESSAGES", "5")),
+            max_chance=float(os.getenv("DROP_MAX_CHANCE", "0.8")),
+            cooldown=self.drop_cooldown,
+        )
 
-    # --- COMPONENTS SYSTEM ---
-    class GiftDropView(ui.LayoutView):
-        def __init__(self, cog, drop_type, active_slot, message, data):
-            super().__init__(timeout=25)
-            self.cog = cog
-            self.drop_type = drop_type
-            self.active_slot = active_slot
-            self.message = message
-            self.data = data
-            self.claimed = False
-            self.claim_window_open = False
-            self.pending_claims = set()
-
-            self.container = ui.Container(ui.TextDisplay(f"# 🎁 A Mysterious Gift just appeared!"))
-            self.container.add_item(ui.TextDisplay("✨ Click it to reveal your surprise!"))
-            self.container.add_item(ui.Separator(spacing=discord.SeparatorSpacing.large, visible=True))
-
-            # button row
-            row = ui.ActionRow()
-            for i in range(4):
-                if i == active_slot:
-                    button = ui.Button(
-                        style=discord.ButtonStyle.primary,
-                        emoji="🎁",
-                        custom_id=f"gift_{i}",
-                        disabled=False
-                    )
-
-                    async def make_callback(interaction: discord.Interaction, index=i):
-                        if self.claimed:
-                            try:
-                                await interaction.response.defer()
-                            except:
-                                pass
-                            return
-
-                        # start claim window if not started
-                        if not self.claim_window_open:
-                            self.claim_window_open = True
-                            self.pending_claims = set()
-
-                            async def claim_window():
-                                await asyncio.sleep(0.7)  # wait for others to click
-                                await self.finish_claim()  # <-- only call here, after window
-
-                            asyncio.create_task(claim_window())  # <-- run the window in background
-
-                        # append user to pending_claims
-                        self.pending_claims.add(interaction.user)
-
-                        try:
-                            await interaction.response.defer()
-                        except:
-                            pass
-
-                    button.callback = make_callback
-
-                else:
-                    button = ui.Button(
-                        style=discord.ButtonStyle.secondary,
-                        label="\u200b",
-                        custom_id=f"empty_{i}",
-                        disabled=True
-                    )
-                row.add_item(button)
-
-            self.container.add_item(row)
-            self.add_item(self.container)
-
-        async def finish_claim(self):
-            import random
-            if self.claimed or not self.pending_claims:
-                return
-
-            self.claimed = True
-            winner = random.choice(list(self.pending_claims))
-
-            # instantly disable all buttons so no one else can click
-            for child in self.container.children:
-                if isinstance(child, ui.ActionRow):
-                    for btn in child.children:
-                        btn.disabled = True
-
-            # record gift in a thread-safe way
-            await asyncio.to_thread(
-                self.data.record_gift,
-                winner.id,
-                self.drop_type["gifts"],
-                self.drop_type.get("name"),
-            )
-
-            channel_id = self.message.channel.id
-            tracker = self.cog.activity_tracker[channel_id]
-            tracker["last_drop"] = time.time()
-
-            messages_2 = {
-                "Santa Claus": "You are on the nice list! You got a special gift!",
-                "Christmas Tree": "That's a lovely gift to brighten the season!",
-                "Coal": "Oops! Looks like you're on the naughty list this year!",
-                "Grinch": "Oh no! The Grinch got you! Better luck next time!",
-            }
-            append_message = messages_2.get(self.drop_type["name"], "You found something interesting!")
-
-            new_container = ui.Container(
-                ui.TextDisplay(f"# 🎁 A Mysterious Gift just appeared!"),
-                ui.TextDisplay("✨ Someone clicked to reveal it!"),
-                ui.Separator(spacing=discord.SeparatorSpacing.large, visible=True),
-                ui.TextDisplay(
-                    f"🎉 {winner.mention} claimed the {self.drop_type['emoji']} **{self.drop_type['name']}**! {append_message} **`{'+' if self.drop_type['gifts'] > 0 else ''}{self.drop_type['gifts']}`**🎁"
-                )
-            )
-            new_view = ui.LayoutView(timeout=None)
-            new_view.add_item(new_container)
-
-            # edit message instantly (no defer lag)
-            try:
-                await self.message.edit(view=new_view)
-            except Exception as e:
-                print(f"Error editing message: {e}")
-
-            # start background cooldown reset after claim (non-blocking)
-            async def _post_claim_cooldown(channel_id_local, tracker_local):
-                try:
-                    # Immediately stop counting new activity if you want:
-                    # (set a flag the on_message checks, OR rely on tracker["last_drop"] checks)
-                    # example: set a guard flag (optional)
-                    # self.cog._tracking_paused = True
-
-                    await asyncio.sleep(self.cog.drop_cooldown)  # non-blocking for callback
-
-                    # reset tracker state after cooldown
-                    if tracker_local is not None:
-                        tracker_local["users"].clear()
-                        tracker_local["count"] = 0
-                        # optionally reset last_drop if you want:
-                        # tracker_local["last_drop"] = 0
-
-                    # re-enable tracking guard if you used one:
-                    # self.cog._tracking_paused = False
-
-                    print(f"Cooldown ended for channel {channel_id_local}")
-                except Exception as e:
-                    print(f"Post-claim cooldown task error: {e}")
-
-            try:
-                asyncio.create_task(_post_claim_cooldown(channel_id, tracker))
-            except Exception as e:
-                print(f"Failed to start cooldown task: {e}")
-
-
-        async def on_timeout(self):
-            try:
-                await self.message.delete()
-            except:
-                pass
+        # Sharded launch: only worker 0 runs the storage-wide reconcile
+        self.worker_id = int(os.getenv("WORKER_ID", "0"))
 
-        # --- DROP LOGIC ---
-    def calculate_drop_chance(self, active_users, message_count):
-        if active_users < self.min_unique_users:
-            return 0
+        # Rendered global top-10 block, keyed by data.leaderboard_version
+        # (a guild's board keeps its own on the guild partition)
+        self._leaderboard = LeaderboardCache()
 
-        if message_count < self.min_messages:
-            return 0
-        if message_count > self.max_messages:
-            message_count = self.max_messages
+        # Leaderboard display names, fetched on demand since the bot runs without a member cache
+        self.user_names = UserDisplayCache(int(os.getenv("USER_CACHE_SIZE", "1000")))
+        metrics.CACHE_SIZE.labels("user_names").set_function(lambda: len(self.user_names))
 
-        base_chance = random.randint(1, 10)
+        # Drop posts, claim edits and deletes go through one rate-limited queue per channel
+        self.outbound = OutboundScheduler()
+        metrics.OUTBOUND_PENDING.set_function(self.outbound.pending)
 
-        if active_users > 3:
-            extra = active_users - 3
-            boost = random.randint(5, 15) * extra
-            base_chance += boost
-
-        return min(base_chance, 80)
+        self.check_event_status.start()
+        self.flush_ledger.start()
+        if self.worker_id == 0:
+            self.reconcile_totals.start()
+        if data.SHARED_SYNC_INTERVAL > 0:
+            self.sync_shared.start()
+        self.compact_snapshot.start()
+        self.reload_drop_tables.change_interval(seconds=self.drop_tables_poll)
+        self.reload_drop_tables.start()
+        self.run_drop_timers.change_interval(seconds=self.drop_timers.tick)
+        self.run_drop_timers.start()
+
+    async def cog_unload(self):
+        self.check_event_status.cancel()
+        self.flush_ledger.cancel()
+        self.reconcile_totals.cancel()
+        self.sync_shared.cancel()
+        self.compact_snapshot.cancel()
+        self.reload_drop_tables.cancel()
+        self.run_drop_timers.cancel()
+        self.bot.remove_dynamic_items(GiftButton)
+        await self.outbound.close()
+        # write out whatever claims are still queued and leave a fresh snapshot
+        await self.data.flush_all_async()
+        await self.data.compact_async()
+
+    # --- GIFT DROPS ---
+    def click_gift(self, drop_id, user_id):
+        """A click on a drop's gift; the first one opens the claim window."""
+        live = self.live_drops.get(drop_id)
+        if live is None or live.winner is not None or live.drop is None:
+            return
+        if live.claimants is None:
+            live.claimants = set()
+            self.drop_timers.schedule(drop_id, time.time() + self.claim_window)
+        live.claimants.add(user_id)
+
+    async def post_drop(self, channel, guild_id):
+        drop = self.get_random_drop(guild_id)
+        live = LiveDrop(os.urandom(6).hex(), channel.id, guild_id, drop, random.randint(0, 3))
+        # known before the post goes out, so an early click finds it
+        self.live_drops[live.id] = live
+        try:
+            live.message = await self.outbound.send(channel, view=GiftLayouts.claim(live.id, live.slot))
+        except Exception:
+            self.live_drops.pop(live.id, None)
+            raise
+        expires_at = time.time() + self.drop_timeout
+        self.data.open_drop(live.id, channel.id, live.message.id, guild_id, drop.name, live.slot, expires_at)
+        if live.claimants is None:
+            self.drop_timers.schedule(live.id, expires_at)
+        metrics.DROPS_SPAWNED.inc()
+
+    async def finish_claim(self, live):
+        winner = random.choice(list(live.claimants))
+        live.winner = winner
+        live.claimants = None
+        self.drop_timers.schedule(live.id, time.time() + self.drop_timeout)
+
+        # record gift (in-memory, written to Supabase on the next ledger flush)
+        await self.data.record_gift_async(winner, live.drop.gifts, live.drop.name, live.guild_id, live.id)
+        metrics.DROPS_CLAIMED.labels(live.drop.name).inc()
+
+        tracker = self.activity_tracker.channel(live.channel_id)
+        tracker.last_drop = time.time()
+
+        # claim results jump the channel's outbound queue
+        await self.show_result(live)
+
+    async def show_result(self, live):
+        try:
+            await self.outbound.edit(live.message, priority=CLAIM_EDIT, view=GiftLayouts.result(live.winner, live.drop))
+        except Exception as e:
+            print(f"Error editing message: {e}")
+
+    async def remove_drop(self, live):
+        self.live_drops.pop(live.id, None)
+        try:
+            await self.outbound.delete(live.message)
+        except (discord.NotFound, discord.Forbidden):
+            pass  # already gone, or never will be
+        except Exception as e:
+            # stays journaled and comes back round, with no more claims on it
+            print(f"Error deleting drop message, retrying: {e}")
+            live.drop = None
+            self.live_drops[live.id] = live
+            self.drop_timers.schedule(live.id, time.time() + self.drop_timeout)
+            return
+        self.data.close_drop(live.id)
+
+    def restore_drops(self):
+        """Pick up the drops still posted from before a restart; ones past their time are removed."""
+        now = time.time()
+        restored = 0
+        for rec in self.data.open_drops():
+            if rec["id"] in self.live_drops:
+                continue
+            restored += 1
+            drop = self.drop_tables.table(rec["guild_id"]).get(rec["drop_name"])
+            live = LiveDrop(rec["id"], rec["channel_id"], rec["guild_id"], drop, rec["slot"])
+            live.winner = int(rec["winner"]) if rec["winner"] else None
+            channel = self.bot.get_partial_messageable(rec["channel_id"], guild_id=rec["guild_id"])
+            live.message = channel.get_partial_message(rec["message_id"])
+            self.live_drops[live.id] = live
+            # a drop whose table entry is gone can't be claimed any more
+            self.drop_timers.schedule(live.id, rec["expires_at"] if drop is not None else now)
+            if live.winner is not None and drop is not None and rec["expires_at"] > now:
+                # the claim may have been recorded before its result was shown
+                asyncio.create_task(self.show_result(live))
+        if restored:
+            print(f"🎁 Restored {restored} posted drops")
+
+    @tasks.loop(seconds=0.1)
+    async def run_drop_timers(self):
+        # restored drops are edited and deleted over HTTP, which needs the login;
+        # the warm start usually has the data ready well before that
+        if not self._drops_restored and self.bot.is_ready() and self.data.is_ready():
+            self._drops_restored = True
+            self.restore_drops()
+        for drop_id in self.drop_timers.advance():
+            live = self.live_drops.get(drop_id)
+            if live is None:
+                continue
+            if live.message is None:  # clicked while the post was still going out
+                self.drop_timers.schedule(drop_id, time.time() + self.drop_timers.tick)
+                continue
+            # the edit or delete waits its turn in the outbound queue, not here
+            if live.claimants:
+                asyncio.create_task(self.finish_claim(live))
+            else:
+                asyncio.create_task(self.remove_drop(live))
+
+    @run_drop_timers.error
+    async def run_drop_timers_error(self, error):
+        print(f"Drop timer error: {error}")
 
-    def get_random_drop(self):
-        weights = [d["weight"] for d in self.drop_types]
-        return random.choices(self.drop_types, weights=weights)[0]
+        # --- DROP LOGIC ---
+    def drop_rates(self, now: float = None):
+        """What the drop model sees in each tracked channel right now, busiest first."""
+        now = time.time() if now is None else now
+        rows = []
+        for channel_id, tracker in self.activity_tracker:
+            row = self.drop_rate.describe(tracker.rate, now)
+            row["channel_id"] = channel_id
+            row["drops_last_hour"] = tracker.drops.messages(now)
+            rows.append(row)
+        rows.sort(key=lambda r: r["messages_per_hour"], reverse=True)
+        return rows
+
+    def get_random_drop(self, guild_id=None):
+        return self.drop_tables.sample(guild_id)
 
     # --- EVENT CHECKER ---
     @tasks.loop(hours=1)
@@ -253,11 +350,78 @@ class ChristmasEvent(commands.Cog):
     def is_event_active(self):
         return self.event_active
 
+    # --- DROP TABLES ---
+    @tasks.loop(seconds=30)
+    async def reload_drop_tables(self):
+        # stat + parse off the loop; the new tables replace the old ones in one assignment
+        await asyncio.to_thread(self.drop_tables.reload)
+
+    @reload_drop_tables.error
+    async def reload_drop_tables_error(self, error):
+        print(f"Drop table reload error: {error}")
+
+    # --- LEDGER FLUSH ---
+    @tasks.loop(seconds=data.LEDGER_FLUSH_INTERVAL)
+    async def flush_ledger(self):
+        # one batch per window, keep going while a full batch is waiting
+        while True:
+            written = await self.data.flush_ledger_async()
+            if written < self.data.LEDGER_BATCH_SIZE or not self.data.queue_depth():
+                break
+
+    @flush_ledger.error
+    async def flush_ledger_error(self, error):
+        print(f"Ledger flush error: {error}")
+
+    @tasks.loop(minutes=data.RECONCILE_INTERVAL_MINUTES)
+    async def reconcile_totals(self):
+        await self.data.reconcile_totals_async()
+
+    @reconcile_totals.before_loop
+    async def before_reconcile_totals(self):
+        # first check one interval after startup, not during warm-up
+        await self.bot.wait_until_ready()
+        await asyncio.sleep(self.data.RECONCILE_INTERVAL_MINUTES * 60)
+
+    @reconcile_totals.error
+    async def reconcile_totals_error(self, error):
+        print(f"Reconcile error: {error}")
+
+    @tasks.loop(seconds=data.SHARED_SYNC_INTERVAL or 5)
+    async def sync_shared(self):
+        # totals other shard workers wrote to the shared storage
+        await self.data.sync_shared_async()
+
+    @sync_shared.error
+    async def sync_shared_error(self, error):
+        print(f"Shared sync error: {error}")
+
+    @tasks.loop(minutes=data.SNAPSHOT_INTERVAL_MINUTES)
+    async def compact_snapshot(self):
+        await self.data.compact_async()
+
+    @compact_snapshot.before_loop
+    async def before_compact_snapshot(self):
+        await asyncio.sleep(self.data.SNAPSHOT_INTERVAL_MINUTES * 60)
+
+    @compact_snapshot.error
+    async def compact_snapshot_error(self, error):
+        print(f"Snapshot compaction error: {error}")
+
     # --- MESSAGE HANDLER ---
     @commands.Cog.listener()
     async def on_message(self, message):
+        started = time.perf_counter()
+        try:
+            await self.handle_message(message)
+        finally:
+            metrics.ON_MESSAGE_SECONDS.observe(time.perf_counter() - started)
+
+    async def handle_message(self, message):
         if not self.is_event_active():
             return
+        if not self.data.is_ready():  # still warming up alongside the gateway login
+            return
         if message.author.bot:
             return
         if self.drop_channel_id and message.channel.id != self.drop_channel_id:
@@ -266,107 +430,129 @@ class ChristmasEvent(commands.Cog):
             return
 
         channel_id = message.channel.id
+        guild_id = message.guild.id if message.guild else None
         current_time = time.time()
         user_id = message.author.id
 
-        # Track messages per-user
-        self.message_counts[user_id] = self.message_counts.get(user_id, 0) + 1
-
-        # Track last user speaking
-        last_user = getattr(self, "last_user", None)
-        consecutive = getattr(self, "consecutive_messages", 0)
+        if guild_id:
+            self.data.touch_guild(guild_id)  # loads the guild's leaderboard on its first activity
 
-        if last_user == user_id:
-            consecutive += 1
-        else:
-            consecutive = 1
-            self.last_user = user_id
+        tracker = self.activity_tracker.channel(channel_id, current_time)
 
-        self.consecutive_messages = consecutive
-
-        # SOLO-SPAM RESET
-        if consecutive >= 4 and len(self.message_counts) == 1:
-            self.message_counts[user_id] = 0
-            self.consecutive_messages = 0
+        # rate-limit spammy same-user messages; they don't count towards the channel's rate either
+        if tracker.on_cooldown(user_id, current_time, self.same_user_cooldown):
             return
 
-        # CHECK for real participants
-        valid_users = [
-            uid for uid, count in self.message_counts.items()
-            if 1 <= count <= 3
-        ]
-
-        if len(valid_users) >= 2:
-            print("🎄 Trigger: enough users chatting, starting drop calculation")
-
-            # Reset the chat cycle properly
-            self.message_counts.clear()
-            self.last_user = None
-            self.consecutive_messages = 0
-        else:
+        tracker.record_message(user_id, current_time)
+        if current_time - tracker.last_drop < self.drop_cooldown:
             return
 
-        # rate-limit spammy same-user messages
-        if user_id in self.user_last_message:
-            if current_time - self.user_last_message[user_id] < self.same_user_cooldown:
-                return
-        self.user_last_message[user_id] = current_time
+        drop_chance = self.drop_rate.chance(tracker.rate, current_time)
+        if drop_chance > 0 and random.random() < drop_chance:
+            tracker.record_drop(current_time)
+            print(f"📊 Drop in {channel_id}: {tracker.rate.per_hour(current_time):.0f} msgs/h, "
+                  f"{tracker.rate.speaker_count(current_time)} users, {drop_chance:.1%} chance")
+            await self.post_drop(message.channel, guild_id)
 
-        tracker = self.activity_tracker[channel_id]
-        tracker["users"].add(user_id)
-        tracker["count"] += 1
 
-        active_users = len(tracker["users"])
-        message_count = tracker["count"]
-        drop_chance = self.calculate_drop_chance(active_users, message_count)
+    # --- LEADERBOARD RENDER CACHE ---
+    async def get_leaderboard_block(self, guild=None):
+        """Top-10 text for the current version of the global board, or of ``guild``'s partition.
 
-        print(f"📊 Activity: {message_count} msgs, {active_users} users, {drop_chance}% chance")
+        Rebuilt only after ``record_gift``/``reset`` bump the version; callers
+        arriving while a render is running wait for that same render.
+        """
+        if guild is None:
+            cache, version = self._leaderboard, data.leaderboard_version
+        else:
+            if guild.leaderboard is None:
+                guild.leaderboard = LeaderboardCache()
+            cache, version = guild.leaderboard, guild.version
+        if cache.version == version:
+            return cache.text
+
+        if cache.render is None or cache.render[0] != version:
+            cache.render = (version, asyncio.ensure_future(self._render_leaderboard_block(cache, guild)))
+        # shielded so one cancelled interaction doesn't cancel everyone's render
+        return await asyncio.shield(cache.render[1])
+
+    async def _render_leaderboard_block(self, cache, guild=None):
+        version, top_10 = data.get_top_versioned(10, guild)
+        leaderboard_text = await self._leaderboard_lines(top_10)
+        if cache.version is None or cache.version < version:
+            cache.version, cache.text = version, leaderboard_text
+        return leaderboard_text
+
+    async def _leaderboard_lines(self, top):
+        names = await self.user_names.resolve(self.bot, [int(user_id) for user_id, _ in top])
 
-        if drop_chance > 0 and random.randint(1, 100) <= drop_chance:
-            if current_time - tracker["last_drop"] < self.drop_cooldown:
-                return
+        leaderboard_text = ""
+        for idx, (user_id, gifts_count) in enumerate(top, 1):
+            # a name reads the same for every viewer; a bare mention only if the viewer's client knows the user
+            name = names.get(int(user_id))
+            user_mention = f"**{discord.utils.escape_markdown(name)}**" if name else f"<@{user_id}>"
+            medal = "🥇" if idx == 1 else "🥈" if idx == 2 else "🥉" if idx == 3 else f"{idx}."
+            leaderboard_text += f"{medal} {user_mention}: **`{gifts_count}`** 🎁\n"
+        return leaderboard_text
 
-            tracker["last_drop"] = time.time()
-            tracker["users"].clear()
-            tracker["count"] = 0
+    async def send_past_leaderboard(self, interaction: discord.Interaction, name: str):
+        """Final standings of an ended season, from its stored summary (global, not per server)."""
+        past = data.get_season(name)
+        if past is None:
+            await interaction.followup.send(f"There's no season called `{name}`.")
+            return
+        summary = past["summary"]
+        if summary is None:
+            await interaction.followup.send(f"**{past['title']}** is still being archived, try again in a minute.")
+            return
 
-            drop = self.get_random_drop()
-            active_slot = random.randint(0, 3)
-            view = self.GiftDropView(self, drop, active_slot, None, data)
-            sent = await message.channel.send(view=view)
-            view.message = sent
+        top = summary["top"]
+        leaderboard_text = await self._leaderboard_lines(top[:10])
+        user_id = str(interaction.user.id)
+        user_rank = next((i for i, (uid, _) in enumerate(top, 1) if uid == user_id), None)
+        rank_display = f"#{user_rank}" if user_rank else f"outside the top {len(top)}"
 
+        leaderboard_container = ui.Container(
+            ui.TextDisplay(f"# 🎄 {past['title']} Leaderboard"),
+            ui.Separator(spacing=discord.SeparatorSpacing.large, visible=True),
+            ui.TextDisplay(leaderboard_text or "_No one collected any gifts that season._"),
+            ui.Separator(spacing=discord.SeparatorSpacing.large, visible=True),
+            ui.TextDisplay(f"-# Final standings: {summary['users']} collectors, **`{summary['gifts']}`**🎁 "
+                           f"| Your Rank: **{rank_display}**"),
+        )
+        view = ui.LayoutView(timeout=None)
+        view.add_item(leaderboard_container)
+        await interaction.followup.send(view=view, allowed_mentions=discord.AllowedMentions.none())
 
     # --- COMMANDS ---
     @discord.app_commands.command(name="leaderboard", description="Show the top 10 gift collectors")
-    async def leaderboard(self, interaction: discord.Interaction):
+    @discord.app_commands.describe(season="A past season to show instead of the current one")
+    async def leaderboard(self, interaction: discord.Interaction, season: str = None):
         await interaction.response.defer()
 
-        counts = getattr(data, "gifts", {})
-        if not counts:
+        await data.wait_ready_async()
+        if season and season != data.season:
+            await self.send_past_leaderboard(interaction, season)
+            return
+        # this server's board; the global one in DMs
+        guild = await data.guild_async(interaction.guild_id) if interaction.guild_id else None
+        if not (guild.gifts if guild is not None else data.gifts):
             await interaction.followup.send("No one has collected any gifts yet! 🎁")
             return
 
-        sorted_users = sorted(counts.items(), key=lambda x: x[1], reverse=True)
-        top_10 = sorted_users[:10]
+        leaderboard_text = await self.get_leaderboard_block(guild)
 
-        # build leaderboard text
-        leaderboard_text = ""
-        for idx, (user_id, gifts_count) in enumerate(top_10, 1):
-            user = self.bot.get_user(int(user_id))
-            user_mention = user.mention if user else f"<@{user_id}>"
-            medal = "🥇" if idx == 1 else "🥈" if idx == 2 else "🥉" if idx == 3 else f"{idx}."
-            leaderboard_text += f"{medal} {user_mention}: **`{gifts_count}`** 🎁\n"
-
-        # get user's own stats
-        user_id_str = str(interaction.user.id)
-        user_gifts = counts.get(user_id_str, 0)
-        user_rank = next((i for i, (uid, _) in enumerate(sorted_users, 1) if uid == user_id_str), None)
+        # only the caller's own line is built per request
+        if guild is not None:
+            user_gifts = data.get_guild_total(interaction.user.id, guild)
+        else:
+            user_gifts = data.gifts.get(str(interaction.user.id), 0)
+        user_rank = data.get_rank(interaction.user.id, guild)
         rank_display = f"#{user_rank}" if user_rank else "Unranked"
 
         # create leaderboard container styled like gift drop
         leaderboard_container = ui.Container(
-            ui.TextDisplay("# 🎄 Christmas 2025 Leaderboard"),
+            ui.TextDisplay(f"# 🎄 {data.season_title} Leaderboard"),
             ui.Separator(spacing=discord.SeparatorSpacing.large, visible=True),
             ui.TextDisplay(leaderboard_text or "_No one has collected any gifts yet!_"),
             ui.Separator(spacing=discord.SeparatorSpacing.large, visible=True),
@@ -377,6 +563,13 @@ class ChristmasEvent(commands.Cog):
 
         await interaction.followup.send(view=view, allowed_mentions=discord.AllowedMentions.none())
 
+    @leaderboard.autocomplete("season")
+    async def leaderboard_season_autocomplete(self, interaction: discord.Interaction, current: str):
+        current = current.lower()
+        return [discord.app_commands.Choice(name=s["title"], value=s["name"])
+                for s in reversed(data.get_seasons())
+                if current in s["name"].lower() or current in s["title"].lower()][:25]
+
 
     @discord.app_commands.command(name="christmasstatus", description="Check if the Christmas event is active")
     async def christmasstatus(self, interaction: discord.Interaction):
@@ -0,0 +1,187 @@
+import random
+import asyncio
+import threading
+import concurrent.futures
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+# (column, operator, value), e.g. ("user_id", "eq", "123") or ("id", "in", [1, 2]);
+# ("or", "or", "a.gt.1,and(a.eq.1,b.gt.2)") passes a PostgREST or-group through
+Filter = Tuple[str, str, Any]
+
+
+class PostgrestError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+
+
+def _format_filter(op: str, value: Any) -> str:
+    if op == "in":
+        return "in.(" + ",".join(f'"{v}"' for v in value) + ")"
+    if op == "or":
+        return f"({value})"
+    if op == "is":
+        return f"is.{'null' if value is None else value}"
+    return f"{op}.{value}"
+
+
+class AsyncPostgrest:
+    """Pooled async client for the Supabase REST (PostgREST) API.
+
+    One ``httpx.AsyncClient`` with keep-alive is shared by every call. A
+    semaphore caps in-flight requests, every request has a timeout, and
+    transient failures are retried with exponential backoff and full jitter.
+    Writes that are not idempotent (inserts, RPCs) are only retried when the
+    server can't have applied them (connect errors, 429).
+    """
+
+    RETRY_STATUS = (429, 502, 503, 504)
+
+    def __init__(self, url: str, key: str, *, max_connections: int = 20, max_keepalive: int = 10,
+                 concurrency: int = 10, timeout: float = 10.0, retries: int = 3,
+                 backoff: float = 0.25, backoff_cap: float = 5.0):
+        self.base_url = url.rstrip("/") + "/rest/v1"
+        self.headers = {"apikey": key, "Authorization": f"Bearer {key}"}
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_cap = backoff_cap
+        self._http: Optional[httpx.AsyncClient] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+
+    def _client(self) -> httpx.AsyncClient:
+        # created lazily so it binds to the loop that uses it
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive,
+                    keepalive_expiry=30,
+                ),
+            )
+            self._sem = asyncio.Semaphore(self.concurrency)
+        return self._http
+
+    async def request(self, method: str, path: str, *, params: List[Tuple[str, str]] = None,
+                      json: Any = None, prefer: str = None, idempotent: bool = True) -> Any:
+        http = self._client()
+        headers = {"Prefer": prefer} if prefer else None
+        attempt = 0
+        while True:
+            try:
+                async with self._sem:
+                    resp = await http.request(method, path, params=params, json=json, headers=headers)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                # never reached the server, always safe to retry
+                if attempt >= self.retries:
+                    raise
+            except httpx.TransportError:
+                if not idempotent or attempt >= self.retries:
+                    raise
+            else:
+                retryable = resp.status_code in self.RETRY_STATUS and (idempotent or resp.status_code == 429)
+                if resp.status_code < 400:
+                    return resp.json() if resp.content else None
+                if not retryable or attempt >= self.retries:
+                    raise PostgrestError(resp.status_code, resp.text)
+            delay = random.uniform(0, min(self.backoff_cap, self.backoff * 2 ** attempt))
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _params(filters: Tuple[Filter, ...]) -> List[Tuple[str, str]]:
+        return [(col, _format_filter(op, value)) for col, op, value in filters]
+
+    async def select(self, table: str, columns: str = "*", *filters: Filter, order: str = None,
+                     desc: bool = False, limit: int = None) -> List[Dict[str, Any]]:
+        params = [("select", columns.replace(" ", ""))] + self._params(filters)
+        if order:
+            params.append(("order", f"{order}.{'desc' if desc else 'asc'}"))
+        if limit:
+            params.append(("limit", str(limit)))
+        return await self.request("GET", f"/{table}", params=params) or []
+
+    async def insert(self, table: str, rows: Any, on_conflict: str = None):
+        """Insert ``rows``; with ``on_conflict`` rows clashing on that unique key are skipped, so a retry is safe."""
+        if on_conflict is None:
+            await self.request("POST", f"/{table}", json=rows, prefer="return=minimal", idempotent=False)
+            return
+        await self.request("POST", f"/{table}", params=[("on_conflict", on_conflict)], json=rows,
+                           prefer="resolution=ignore-duplicates,return=minimal")
+
+    async def upsert(self, table: str, rows: Any, on_conflict: str = None):
+        params = [("on_conflict", on_conflict)] if on_conflict else None
+        await self.request("POST", f"/{table}", params=params, json=rows,
+                           prefer="resolution=merge-duplicates,return=minimal")
+
+    async def update(self, table: str, values: Dict[str, Any], *filters: Filter):
+        await self.request("PATCH", f"/{table}", params=self._params(filters), json=values,
+                           prefer="return=minimal")
+
+    async def delete(self, table: str, *filters: Filter):
+        await self.request("DELETE", f"/{table}", params=self._params(filters), prefer="return=minimal")
+
+    async def rpc(self, fn: str, params: Dict[str, Any], idempotent: bool = False) -> Any:
+        return await self.request("POST", f"/rpc/{fn}", json=params, idempotent=idempotent)
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+class LoopThread:
+    """A private event loop on one daemon thread that runs all storage I/O.
+
+    Coroutines from the bot's loop are awaited through ``call`` and plain
+    functions block on ``run``; either way there is one I/O thread for the
+    whole process, not one per request.
+    """
+
+    def __init__(self, name: str = "data-io"):
+        self.name = name
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self.loop.run_forever, name=self.name, daemon=True)
+                self._thread.start()
+            return self.loop
+
+    def in_loop(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure())
+
+    def run(self, coro, timeout: float = None) -> Any:
+        if self.in_loop():
+            coro.close()
+            raise RuntimeError("blocking data call made from the data I/O loop; await the async variant")
+        return self.submit(coro).result(timeout)
+
+    async def call(self, coro) -> Any:
+        if self.in_loop():
+            return await coro
+        return await asyncio.wrap_future(self.submit(coro))
+
+    def stop(self):
+        with self._lock:
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                self._thread.join(timeout=5)
+                self.loop = None
+                self._thread = None
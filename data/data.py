@@ -1,146 +1,1248 @@
 import os
+import sys
+import time
+import atexit
+import asyncio
 import datetime
-from typing import Dict, Any, List
+import heapq
+import threading
+from typing import Dict, Any, List, AsyncIterator, Callable, Optional
 from dotenv import load_dotenv
-from supabase import create_client, Client
+
+from .client import LoopThread
+from .history_store import HistoryStore, to_epoch, to_iso
+from .ledger import WriteBehindLedger
+from .partitions import GuildPartition, GuildPartitions
+from .rank import RankIndex
+from .snapshot import Journal, read_journal, load_snapshot, write_snapshot
+from .storage import DEFAULT_SEASON, DEFAULT_SEASON_TITLE, StorageBackend, create_backend
+from utils.metrics import (CACHE_SIZE, RECORD_GIFT_SECONDS, STORAGE_ERRORS, STORAGE_SECONDS,
+                           WRITE_QUEUE_DEPTH)
 
 load_dotenv()
 
-SUPABASE_URL: str = os.getenv("PUBLIC_SUPABASE_URL")
-SUPABASE_KEY: str = os.getenv("PUBLIC_SUPABASE_ANON_KEY")
+# All storage I/O runs on one private loop against one backend
+# (STORAGE_BACKEND=supabase or sqlite, see data/storage.py)
+_io = LoopThread("data-io")
+backend: StorageBackend = create_backend()
+
+
+def _instrument(b: StorageBackend):
+    """Time every storage call into ``sylcore_storage_call_seconds``."""
+    def timed(op: str, fn):
+        hist = STORAGE_SECONDS.labels(b.name, op)
+        errors = STORAGE_ERRORS.labels(b.name, op)
+
+        async def call(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                hist.observe(time.perf_counter() - started)
+        return call
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise RuntimeError("Supabase credentials not set in environment variables.")
+    for op in ("fetch_users", "fetch_changed_users", "fetch_history", "fetch_user_history", "fetch_user_total",
+               "fetch_guild_totals", "increment_totals", "insert_history", "upsert_totals", "set_total",
+               "fetch_seasons", "start_season", "save_season_summary", "clear"):
+        setattr(b, op, timed(op, getattr(b, op)))
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+_instrument(backend)
 
 gifts: Dict[str, int] = {}
-history: Dict[str, List[Dict[str, Any]]] = {}
+ranks = RankIndex()
+leaderboard_version: int = 0  # bumped on every ranks change, keys rendered leaderboards
+drops: Dict[str, Dict[str, Any]] = {}  # drop id -> posted drop still on screen, see open_drop
+
+# Active season: gifts are recorded under it and the caches above only hold
+# its totals. start_season_async switches it; an ended season stays in
+# storage and gets a summary (SEASON_SUMMARY_TOP users) for its leaderboard.
+season: str = DEFAULT_SEASON
+season_title: str = DEFAULT_SEASON_TITLE
+seasons: Dict[str, Dict[str, Any]] = {}  # name -> {"name", "title", "started_at", "ended_at", "summary"}
+SEASON_SUMMARY_TOP: int = int(os.getenv("SEASON_SUMMARY_TOP", "100"))
+
+# Write-behind ledger settings
+LEDGER_FLUSH_INTERVAL: float = float(os.getenv("LEDGER_FLUSH_INTERVAL", "2"))
+LEDGER_BATCH_SIZE: int = int(os.getenv("LEDGER_BATCH_SIZE", "500"))
+
+# Background check of users.total against gift_history
+RECONCILE_INTERVAL_MINUTES: float = float(os.getenv("RECONCILE_INTERVAL_MINUTES", "30"))
+RECONCILE_PAGE_SIZE: int = int(os.getenv("RECONCILE_PAGE_SIZE", "500"))
+
+# Startup load: page size and how much history to keep in memory.
+# HISTORY_LOAD_MODE is "all", "recent" or "lazy"; outside "all" each user's
+# history is a ring buffer of the last HISTORY_RECENT_LIMIT entries.
+LOAD_PAGE_SIZE: int = int(os.getenv("LOAD_PAGE_SIZE", "1000"))
+HISTORY_LOAD_MODE: str = os.getenv("HISTORY_LOAD_MODE", "recent")
+HISTORY_RECENT_LIMIT: int = int(os.getenv("HISTORY_RECENT_LIMIT", "50"))
+
+
+def _history_retention(history_mode: str = None, recent_limit: int = None) -> int:
+    if (history_mode or HISTORY_LOAD_MODE) == "all":
+        return 0
+    return recent_limit or HISTORY_RECENT_LIMIT
+
+
+history = HistoryStore(_history_retention())
+
+# Local warm-start state: snapshot of the caches plus a journal of ledger mutations
+_DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_PATH: str = os.getenv("SNAPSHOT_PATH", os.path.join(_DATA_DIR, "gifts_snapshot.json"))
+# where the default snapshot used to go; data/gifts_data.json is tracked, so it is only read
+_LEGACY_SNAPSHOT_PATH = os.path.join(_DATA_DIR, "gifts_data.json")
+JOURNAL_PATH: str = os.getenv("JOURNAL_PATH", os.path.join(_DATA_DIR, "gifts_journal.jsonl"))
+JOURNAL_SYNC_EVERY: int = int(os.getenv("JOURNAL_SYNC_EVERY", "64"))
+SNAPSHOT_INTERVAL_MINUTES: float = float(os.getenv("SNAPSHOT_INTERVAL_MINUTES", "10"))
+
+# Per-guild leaderboards, loaded from storage the first time a guild is used.
+# A guild idle for GUILD_TTL_SECONDS is dropped from memory, as is the least
+# recently used one beyond MAX_GUILDS loaded (0 = no cap).
+GUILD_TTL_SECONDS: float = float(os.getenv("GUILD_TTL_SECONDS", "3600"))
+MAX_GUILDS: int = int(os.getenv("MAX_GUILDS", "0"))
+
+# save_data: rows per multi-row upsert and how often a failed chunk is retried
+SAVE_CHUNK_SIZE: int = int(os.getenv("SAVE_CHUNK_SIZE", "500"))
+SAVE_RETRIES: int = int(os.getenv("SAVE_RETRIES", "2"))
+
+ledger = WriteBehindLedger(LEDGER_BATCH_SIZE)
+journal = Journal(JOURNAL_PATH, JOURNAL_SYNC_EVERY)
+# gifts are journaled on the bot loop under _cache_lock; a full batch is
+# fsynced on the I/O loop so neither waits on the disk
+journal.on_sync_due = lambda: _io.submit(_sync_journal())
+# Random id of this journal, kept in the snapshot; "<writer>:<seq>" names one
+# ledger entry in storage, so a flush retried after an unclear failure
+# can't write it twice
+writer: str = None
+_cache_lock = threading.RLock()
+_dirty = set()  # users whose total changed since the last save_data
+partitions = GuildPartitions(GUILD_TTL_SECONDS, MAX_GUILDS)
+_guild_loads: Dict[str, asyncio.Future] = {}  # guild loads in progress, on the I/O loop
+_flush_lock: asyncio.Lock = None  # created on the I/O loop, see _flush_guard
+_ready = threading.Event()  # set once warm_start restored or loaded the caches
+_warming: asyncio.Future = None  # the warm start in progress, on the I/O loop
+
+# Sharded mode: every SHARED_SYNC_INTERVAL seconds pick up totals other
+# processes wrote (0 disables). Each poll re-reads SHARED_SYNC_OVERLAP seconds
+# before the newest updated_at seen, for transactions that committed late.
+SHARED_SYNC_INTERVAL: float = float(os.getenv("SHARED_SYNC_INTERVAL", "0"))
+SHARED_SYNC_OVERLAP: int = int(os.getenv("SHARED_SYNC_OVERLAP", "5"))
+_sync_since: str = None  # newest users.updated_at seen in storage
+_archives: Dict[str, asyncio.Future] = {}  # season summaries in progress, on the I/O loop
+
+
+def _flush_guard() -> asyncio.Lock:
+    """Serializes flushes, loads, reconciles and snapshots on the I/O loop."""
+    global _flush_lock
+    if _flush_lock is None:
+        _flush_lock = asyncio.Lock()
+    return _flush_lock
+
+
+def _bump_leaderboard():
+    # callers hold _cache_lock
+    global leaderboard_version
+    leaderboard_version += 1
+
+
+def _now() -> str:
+    return datetime.datetime.utcnow().isoformat()
+
+
+def _peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+async def _iter_pages(fetch: Callable, key: str, page_size: int, **kwargs) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Yield ``fetch(after, limit)`` keyset pages ordered by ``key``; only one page is alive at a time."""
+    last = None
+    while True:
+        rows = await fetch(last, page_size, **kwargs)
+        if not rows:
+            return
+        last = rows[-1][key]
+        yield rows
+        if len(rows) < page_size:
+            return
 
-def load_data():
+
+def _print_progress(table: str, rows: int, pages: int):
+    print(f"[data]   {table}: {rows} rows ({pages} pages), peak RSS {_peak_rss_mb():.1f} MB")
+
+
+# --- LOADING ---
+async def _load_data(page_size: int = None, history_mode: str = None, recent_limit: int = None,
+                     progress: Callable[[str, int, int], None] = None):
+    page_size = page_size or LOAD_PAGE_SIZE
+    history_mode = history_mode or HISTORY_LOAD_MODE
+    recent_limit = recent_limit or HISTORY_RECENT_LIMIT
+    progress = progress or _print_progress
+    started = time.perf_counter()
+    print(f"[data] Loading data from {backend.name} (page size {page_size}, history {history_mode})...")
+
+    # no flush may land between reading a page and applying the pending deltas
+    async with _flush_guard():
+        hist_rows = await _load_pages(page_size, history_mode, recent_limit, progress)
+
+    print(f"[data] Loaded {len(gifts)} users and {hist_rows} history entries "
+          f"in {time.perf_counter() - started:.2f}s (peak RSS {_peak_rss_mb():.1f} MB).")
+
+
+async def _load_pages(page_size: int, history_mode: str, recent_limit: int,
+                      progress: Callable[[str, int, int], None]) -> int:
     global gifts, history
-    print("[data] Loading data from Supabase...")
+    # callers hold the flush guard, so the season can't change under us
+    await _load_seasons()
+    new_gifts: Dict[str, int] = {}
+    newest = None
+    rows = pages = 0
+    async for page in _iter_pages(backend.fetch_users, "user_id", page_size, season=season):
+        for u in page:
+            new_gifts[str(u["user_id"])] = int(u["total"])
+            if u.get("updated_at") and (newest is None or to_epoch(u["updated_at"]) > to_epoch(newest)):
+                newest = u["updated_at"]
+        rows += len(page)
+        pages += 1
+        if pages % 10 == 0:
+            progress("users", rows, pages)
+    progress("users", rows, pages)
 
-    users_resp = supabase.table("users").select("*").execute()
-    hist_resp = supabase.table("gift_history").select("*").execute()
+    # the ring buffers keep only the newest entries as pages stream through
+    new_history = HistoryStore(_history_retention(history_mode, recent_limit))
+    hist_rows = pages = 0
+    if history_mode != "lazy":
+        async for page in _iter_pages(backend.fetch_history, "id", page_size, season=season):
+            for e in page:
+                new_history.append(str(e["user_id"]), e["amount"], e.get("drop_name"), e.get("created_at"))
+            hist_rows += len(page)
+            pages += 1
+            if pages % 10 == 0:
+                progress("gift_history", hist_rows, pages)
+        progress("gift_history", hist_rows, pages)
 
-    users = users_resp.data or []
-    hist = hist_resp.data or []
+    with _cache_lock:
+        # claims queued but not yet flushed aren't in storage yet
+        entries, deltas = ledger.pending()
+        for uid, delta in deltas.get(season, {}).items():
+            new_gifts[uid] = new_gifts.get(uid, 0) + delta
+        for _, row in entries:
+            if row["season"] != season:
+                continue
+            new_history.append(row["user_id"], row["amount"], row["drop_name"], row["created_at"],
+                               complete=history_mode != "lazy")
+        gifts = new_gifts
+        history = new_history
+        ranks.rebuild(gifts.items())
+        _bump_leaderboard()
+        _advance_sync(newest)
 
-    gifts = {str(u["user_id"]): int(u["total"]) for u in users}
-    history.clear()
+    return hist_rows
 
-    for e in hist:
-        uid = str(e["user_id"])
-        entry = {
-            "amount": e["amount"],
-            "drop": e.get("drop_name", ""),
-            "created_at": e.get("created_at", "")
-        }
-        history.setdefault(uid, []).append(entry)
 
-    print(f"[data] Loaded {len(gifts)} users and {len(hist)} history entries.")
+async def load_data_async(page_size: int = None, history_mode: str = None, recent_limit: int = None,
+                          progress: Callable[[str, int, int], None] = None):
+    """Load the caches from storage in keyset-paginated pages.
 
+    ``history_mode`` picks how much of ``gift_history`` is kept: ``"all"``,
+    ``"recent"`` (last ``recent_limit`` entries per user) or ``"lazy"`` (none;
+    each user's history is fetched on first use by ``get_user_history``).
+    ``progress(table, rows, pages)`` is called every 10 pages and at the end.
+    """
+    await _io.call(_load_data(page_size, history_mode, recent_limit, progress))
 
-def save_data():
-    print("[data] Saving all users to Supabase...")
 
-    for uid, total in gifts.items():
-        resp = supabase.table("users").upsert({
-            "user_id": uid,
-            "total": total,
-            "updated_at": datetime.datetime.utcnow().isoformat()
-        }).execute()
-        if resp.error is not None:
-            print(f"Error upserting user {uid}: {resp.error}")
+def load_data(page_size: int = None, history_mode: str = None, recent_limit: int = None,
+              progress: Callable[[str, int, int], None] = None):
+    _io.run(_load_data(page_size, history_mode, recent_limit, progress))
 
-    print("[data] Users upserted successfully.")
 
+# --- SAVING ---
+async def _save_data(chunk_size: int = None, retries: int = None) -> Dict[str, Any]:
+    global _dirty
+    if SHARED_SYNC_INTERVAL > 0:
+        # our totals lag the other workers' increments by up to a sync interval
+        raise RuntimeError("save_data writes absolute totals and would undo other workers' gifts; "
+                           "in sharded mode totals only reach storage through the ledger")
+    chunk_size = chunk_size or SAVE_CHUNK_SIZE
+    retries = SAVE_RETRIES if retries is None else retries
+    started = time.perf_counter()
 
-def record_gift(user_id: int, amount: int, drop_name: str = None) -> int:
-    uid = str(user_id)
+    async with _flush_guard():
+        if ledger.unsettled() is not None:
+            # storage may or may not hold that batch, so no total is known to be right
+            print("[data] Save skipped: a ledger increment is still unsettled, retry after the next flush.")
+            return {"rows": 0, "chunks": 0, "failed_rows": 0, "errors": ["ledger increment unsettled"],
+                    "elapsed": time.perf_counter() - started}
+        with _cache_lock:
+            dirty, _dirty = _dirty, set()
+            now = _now()
+            # users.total only holds what the ledger already flushed; queued
+            # deltas still go through increment_user_totals
+            rows = [{
+                "season": season,
+                "user_id": uid,
+                "total": gifts[uid] - ledger.pending_delta(uid, season),
+                "updated_at": now
+            } for uid in dirty if uid in gifts]
+
+        print(f"[data] Saving {len(rows)} changed users to {backend.name}...")
+        pending = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+        chunks = len(pending)
+        errors: List[str] = []
+        for attempt in range(retries + 1):
+            failed = []
+            for chunk in pending:
+                try:
+                    await backend.upsert_totals(chunk)
+                except Exception as e:
+                    failed.append(chunk)
+                    errors.append(f"attempt {attempt + 1}, {len(chunk)} rows: {e}")
+            pending = failed
+            if not pending:
+                break
 
-    upsert_user_resp = supabase.table("users").upsert({
-        "user_id": uid,
-        "total": gifts.get(uid, 0),
-        "updated_at": datetime.datetime.utcnow().isoformat()
-    }).execute()
-
-    if upsert_user_resp.data and "error" in upsert_user_resp.data:
-        print(f"Failed to upsert user {uid}: {upsert_user_resp.data['error']}")
-        return None
-
-    insert_resp = supabase.table("gift_history").insert({
-        "user_id": uid,
-        "amount": amount,
-        "drop_name": drop_name or "",
-        "created_at": datetime.datetime.utcnow().isoformat()
-    }).execute()
-
-    if insert_resp.data and "error" in insert_resp.data:
-        print(f"Insert gift error: {insert_resp.data['error']}")
-        return None
-
-    resp = supabase.table("gift_history").select("amount").eq("user_id", uid).execute()
-    total = sum(r["amount"] for r in resp.data) if resp.data else 0
-
-    upsert_resp = supabase.table("users").update({
-        "total": total,
-        "updated_at": datetime.datetime.utcnow().isoformat()
-    }).eq("user_id", uid).execute()
-
-    if upsert_resp.data and "error" in upsert_resp.data:
-        print(f"Failed to update user total for {uid}: {upsert_resp.data['error']}")
-        return None
-
-    # Update caches
-    gifts[uid] = total
-    entry = {
-        "amount": amount,
-        "drop": drop_name or "",
-        "created_at": datetime.datetime.utcnow().isoformat()
+        if pending:
+            with _cache_lock:
+                # try these users again on the next save
+                _dirty.update(r["user_id"] for chunk in pending for r in chunk)
+
+    failed_rows = sum(len(c) for c in pending)
+    stats = {
+        "rows": len(rows) - failed_rows,
+        "chunks": chunks,
+        "failed_rows": failed_rows,
+        "errors": errors,
+        "elapsed": time.perf_counter() - started,
     }
-    history.setdefault(uid, []).append(entry)
+    if failed_rows:
+        print(f"[data] Saved {stats['rows']} users, {failed_rows} failed after {retries} retries: {errors[-1]}")
+    else:
+        print(f"[data] Saved {stats['rows']} users in {chunks} chunks ({stats['elapsed']:.2f}s).")
+    return stats
+
+
+async def save_data_async(chunk_size: int = None, retries: int = None) -> Dict[str, Any]:
+    """Upsert users changed since the last save, in chunked multi-row requests.
+
+    Chunks that fail are retried up to ``retries`` times; users still failing
+    stay dirty for the next save. Returns ``rows``, ``chunks``,
+    ``failed_rows``, ``errors`` and ``elapsed`` (seconds).
+
+    The upsert sets absolute totals, so it is refused in sharded mode
+    (``SHARED_SYNC_INTERVAL`` > 0), where it would overwrite increments
+    other workers made since our last sync.
+    """
+    return await _io.call(_save_data(chunk_size, retries))
+
+
+def save_data(chunk_size: int = None, retries: int = None) -> Dict[str, Any]:
+    return _io.run(_save_data(chunk_size, retries))
+
+
+# --- LEDGER ---
+def _writer_id() -> str:
+    global writer
+    with _cache_lock:
+        if writer is None:
+            writer = os.urandom(6).hex()
+            journal.append("w", writer)
+        return writer
+
+
+def record_gift(user_id: int, amount: int, drop_name: str = None, guild_id: int = None, drop_id: str = None) -> int:
+    """Apply a gift to the caches and queue it for the next ledger flush.
+
+    With a ``guild_id`` it also counts towards that guild's leaderboard. A
+    guild that isn't loaded picks the gift up from storage and the ledger
+    queue when it is. With a ``drop_id`` the same journal record marks that
+    drop claimed, so a restart can't hand it out twice.
+
+    Safe from any thread. The read-add-write of the total, the journal
+    sequence and the ledger position are taken together under
+    ``_cache_lock``, so gifts land in one order everywhere. Storage only ever
+    sees per-user deltas from the single flusher on the I/O loop. The gift
+    counts towards the season that is active when the lock is taken.
+    """
+    started = time.perf_counter()
+    uid = str(user_id)
+    gid = str(guild_id) if guild_id else None
+    now = _now()
+
+    with _cache_lock:
+        # first: it's the only step that can reject the amount (int8, OverflowError)
+        # and it does so before touching anything
+        history.append(uid, amount, drop_name, now, complete=HISTORY_LOAD_MODE != "lazy")
+        total = gifts.get(uid, 0) + amount
+        gifts[uid] = total
+        ranks.set(uid, total)
+        _bump_leaderboard()
+        _dirty.add(uid)
+        part = partitions.get(gid) if gid else None
+        if part is not None:
+            part.add(uid, amount)
+        drop = drops.get(drop_id) if drop_id else None
+        if drop is not None:
+            drop["winner"] = uid
+        seq = journal.append("g", uid, amount, drop_name or "", now, gid, *((drop_id,) if drop_id else ()))
+        ledger.push({
+            "season": season,
+            "user_id": uid,
+            "amount": amount,
+            "drop_name": drop_name or "",
+            "created_at": now,
+            "guild_id": gid
+        }, seq)
 
+    RECORD_GIFT_SECONDS.observe(time.perf_counter() - started)
     return total
 
 
-def get_user_total(user_id: int) -> int:
+async def record_gift_async(user_id: int, amount: int, drop_name: str = None, guild_id: int = None,
+                            drop_id: str = None) -> int:
+    # never touches the network, the write happens on the next flush
+    return record_gift(user_id, amount, drop_name, guild_id, drop_id)
+
+
+# --- LIVE DROPS ---
+def open_drop(drop_id: str, channel_id: int, message_id: int, guild_id: int, drop_name: str, slot: int,
+              expires_at: float):
+    """Remember a posted drop until ``close_drop``; journaled like gifts, so it survives a restart."""
+    with _cache_lock:
+        drops[drop_id] = {"id": drop_id, "channel_id": channel_id, "message_id": message_id, "guild_id": guild_id,
+                          "drop_name": drop_name, "slot": slot, "expires_at": expires_at, "winner": None}
+        journal.append("d", drop_id, channel_id, message_id, guild_id, drop_name, slot, expires_at)
+
+
+def close_drop(drop_id: str):
+    """Forget a drop whose message is gone."""
+    with _cache_lock:
+        if drops.pop(drop_id, None) is not None:
+            journal.append("x", drop_id)
+
+
+def open_drops() -> List[Dict[str, Any]]:
+    """Drops posted and not closed yet, e.g. the ones left over from before a restart."""
+    with _cache_lock:
+        return [dict(d) for d in drops.values()]
+
+
+def queue_depth() -> int:
+    """Number of history rows waiting to be written to storage."""
+    return ledger.depth()
+
+
+WRITE_QUEUE_DEPTH.set_function(queue_depth)
+CACHE_SIZE.labels("gifts").set_function(lambda: len(gifts))
+CACHE_SIZE.labels("ranks").set_function(lambda: len(ranks))
+CACHE_SIZE.labels("history_users").set_function(lambda: len(history))
+CACHE_SIZE.labels("history_entries").set_function(lambda: history.total_entries())
+CACHE_SIZE.labels("guild_partitions").set_function(lambda: len(partitions))
+CACHE_SIZE.labels("guild_entries").set_function(lambda: partitions.total_entries())
+
+
+async def _sync_journal():
+    journal.sync()
+
+
+async def _flush_ledger(limit: int = None) -> int:
+    async with _flush_guard():
+        journal.sync()
+        with _cache_lock:
+            # every gift journaled so far is in the pending deltas
+            rows, seqs, deltas, upto = ledger.drain(limit or LEDGER_BATCH_SIZE, journal.seq)
+        if not rows and not deltas:
+            return 0
+
+        # users first so history rows never point at a missing user
+        if deltas:
+            # a call that failed may still have landed: it is resent under the same
+            # key, which storage applies once, and a restart rebuilds it from "a"
+            batch = f"{_writer_id()}:{upto}"
+            journal.append("a", upto)
+            journal.sync()
+            try:
+                await backend.increment_totals(deltas, batch)
+            except Exception as e:
+                print(f"[data] Ledger increment {batch} failed, will resend it; requeued {len(rows)} rows: {e}")
+                ledger.requeue(rows, seqs)
+                return 0
+            ledger.settle()
+            journal.append("t", upto)
+
+        if rows:
+            # an insert that timed out may have landed; the keys make the retry skip those rows
+            key = _writer_id()
+            keyed = [dict(r, ledger_key=f"{key}:{seq}") for r, seq in zip(rows, seqs)]
+            try:
+                await backend.insert_history(keyed)
+            except Exception as e:
+                print(f"[data] Ledger insert failed, requeued {len(rows)} rows: {e}")
+                ledger.requeue(rows, seqs)
+                return 0
+            journal.append("h", seqs[-1])
+
+        return len(rows)
+
+
+async def _flush_all() -> int:
+    written = 0
+    while True:
+        before = (ledger.depth(), ledger.pending_users())
+        n = await _flush_ledger()
+        written += n
+        after = (ledger.depth(), ledger.pending_users())
+        # deltas can outlast the rows: a resent batch leaves newer ones queued
+        if not any(after) or (n == 0 and after == before):
+            break
+    if written:
+        print(f"[data] Flushed {written} queued gifts.")
+    return written
+
+
+async def flush_ledger_async(limit: int = None) -> int:
+    """Write one batch of queued gifts: one atomic increment call and one multi-row insert.
+
+    Totals are sent as per-user deltas (the ``increment_user_totals`` RPC on
+    Supabase, see ``data/sql/increment_user_totals.sql``) so concurrent
+    writers can't overwrite each other. Returns the number of history rows written. Failed
+    writes go back on the queue and are retried on the next flush; both writes
+    carry keys, so one that timed out after landing isn't applied twice.
+    """
+    return await _io.call(_flush_ledger(limit))
+
+
+def flush_ledger(limit: int = None) -> int:
+    return _io.run(_flush_ledger(limit))
+
+
+async def flush_all_async() -> int:
+    """Drain the whole ledger, batch by batch. Used on shutdown and cog unload."""
+    return await _io.call(_flush_all())
+
+
+def flush_all() -> int:
+    return _io.run(_flush_all())
+
+
+# --- RECONCILE ---
+async def _reconcile_totals(page_size: int = None, repair: bool = False) -> List[Dict[str, Any]]:
+    page_size = page_size or RECONCILE_PAGE_SIZE
+    drift: List[Dict[str, Any]] = []
+    checked = 0
+    active = season  # past seasons don't change any more
+    after = None
+
+    while True:
+        # the page is read under the guard too, so no flush lands between it and the history sums
+        async with _flush_guard():
+            users = await backend.fetch_users(after, page_size, active)
+            ids = [str(u["user_id"]) for u in users]
+            sums = dict.fromkeys(ids, 0)
+            async for rows in _iter_pages(backend.fetch_history, "id", page_size, season=active, user_ids=ids):
+                for r in rows:
+                    sums[str(r["user_id"])] += int(r["amount"])
+
+            # queued rows aren't in gift_history yet and deltas not drained aren't in users.total;
+            # both are read under one lock, so a gift is in both or neither
+            with _cache_lock:
+                queued_rows, _ = ledger.pending()
+                queued_deltas = ledger.queued_deltas().get(active, {})
+            queued = set()
+            for _, r in queued_rows:
+                if r["season"] == active and r["user_id"] in sums:
+                    sums[r["user_id"]] += r["amount"]
+                    queued.add(r["user_id"])
+
+            for u in users:
+                uid = str(u["user_id"])
+                total = int(u["total"]) + queued_deltas.get(uid, 0)
+                if total != sums[uid]:
+                    drift.append({"user_id": uid, "total": total, "history": sums[uid]})
+                    # an unsettled increment may or may not have landed: leave those to the next run
+                    if repair and uid not in queued:
+                        await backend.set_total(uid, sums[uid], _now(), active)
+
+        checked += len(users)
+        if len(users) < page_size:
+            break
+        after = users[-1]["user_id"]
+
+    if drift:
+        print(f"[data] Reconcile: {len(drift)} of {checked} users drifted from gift_history.")
+        for d in drift[:10]:
+            print(f"[data]   {d['user_id']}: total={d['total']} history={d['history']}")
+    else:
+        print(f"[data] Reconcile: {checked} users match gift_history.")
+    return drift
+
+
+async def reconcile_totals_async(page_size: int = None, repair: bool = False) -> List[Dict[str, Any]]:
+    """Check the active season's ``users.total`` against the sum of its ``gift_history``.
+
+    Users are walked in keyset pages on ``user_id``; each page pulls only the
+    ``amount`` column for that page's users. The flush lock is held per page,
+    from reading the users to comparing them, so a half-finished flush is
+    never counted as drift, and gifts still in the ledger queue count on both
+    sides. With ``repair`` the stored total is overwritten with the history
+    sum, except for users with queued rows.
+    """
+    return await _io.call(_reconcile_totals(page_size, repair))
+
+
+def reconcile_totals(page_size: int = None, repair: bool = False) -> List[Dict[str, Any]]:
+    return _io.run(_reconcile_totals(page_size, repair))
+
+
+# --- SHARED LEDGER (sharded mode) ---
+def _advance_sync(updated_at: str):
+    global _sync_since
+    if updated_at and (_sync_since is None or to_epoch(updated_at) > to_epoch(_sync_since)):
+        _sync_since = updated_at
+
+
+async def _sync_shared(page_size: int = None) -> int:
+    page_size = page_size or LOAD_PAGE_SIZE
+    since = to_iso(max(0, to_epoch(_sync_since) - SHARED_SYNC_OVERLAP)) if _sync_since else to_iso(0)
+    after = None
+    changed = 0
+
+    # no flush may land between reading a total and subtracting what's still queued
+    async with _flush_guard():
+        # another process may have started a new season
+        await _load_seasons()
+        while True:
+            rows = await backend.fetch_changed_users(since, after, page_size, season)
+            with _cache_lock:
+                before = changed
+                for r in rows:
+                    uid = str(r["user_id"])
+                    total = int(r["total"]) + ledger.pending_delta(uid, season)
+                    if gifts.get(uid) == total:
+                        continue  # our own write, or nothing new
+                    gifts[uid] = total
+                    ranks.set(uid, total)
+                    cached = history.get(uid)
+                    if cached is not None:
+                        # another process added entries we don't have
+                        cached.complete = False
+                    changed += 1
+                if changed > before:
+                    _bump_leaderboard()
+            if not rows:
+                break
+            _advance_sync(rows[-1]["updated_at"])
+            if len(rows) < page_size:
+                break
+            since, after = rows[-1]["updated_at"], str(rows[-1]["user_id"])
+
+    if changed:
+        print(f"[data] Shared sync: {changed} users changed by other processes.")
+    return changed
+
+
+async def sync_shared_async(page_size: int = None) -> int:
+    """Pull totals other processes wrote since the last sync into the caches.
+
+    Used by sharded workers that share one storage backend; a season another
+    worker started is switched to here as well. Totals are taken
+    from storage plus whatever this process still has queued, so applying a
+    row twice (or our own write) changes nothing. Users whose total moved get
+    their cached history marked incomplete and the leaderboard version bumps.
+    Returns the number of users changed.
+    """
+    return await _io.call(_sync_shared(page_size))
+
+
+def sync_shared(page_size: int = None) -> int:
+    return _io.run(_sync_shared(page_size))
+
+
+# --- QUERIES ---
+async def _fetch_user_total(uid: str) -> int:
+    active = season
+    total = await backend.fetch_user_total(uid, active)
+    if total is not None:
+        with _cache_lock:
+            if season != active:
+                return gifts.get(uid, 0)
+            if uid not in gifts:
+                gifts[uid] = total
+                ranks.set(uid, gifts[uid])
+                _bump_leaderboard()
+            return gifts[uid]
+    return 0
+
+
+async def get_user_total_async(user_id: int) -> int:
     uid = str(user_id)
     if uid in gifts:
         return gifts[uid]
+    return await _io.call(_fetch_user_total(uid))
+
 
-    resp = supabase.table("users").select("total").eq("user_id", uid).execute()
-    if resp.data:
-        gifts[uid] = int(resp.data[0]["total"])
+def get_user_total(user_id: int) -> int:
+    uid = str(user_id)
+    if uid in gifts:
         return gifts[uid]
-    return 0
+    return _io.run(_fetch_user_total(uid))
 
 
 def get_leaderboard(limit: int = 10) -> List[tuple]:
-    resp = supabase.table("users").select("user_id, total").order("total", desc=True).limit(limit).execute()
-    if not resp.data:
-        return []
-    return [(int(row["user_id"]), row["total"]) for row in resp.data]
+    return [(int(uid), total) for uid, total in get_top(limit)]
+
+
+async def get_leaderboard_async(limit: int = 10) -> List[tuple]:
+    return get_leaderboard(limit)
+
+
+def get_top(limit: int = 10) -> List[tuple]:
+    """Top ``limit`` ``(user_id, total)`` pairs from the rank index, ties in first-seen order."""
+    with _cache_lock:
+        return ranks.top(limit)
+
+
+def get_top_versioned(limit: int = 10, guild: GuildPartition = None) -> tuple:
+    """``(version, top)`` read together, for render caches; the guild's board if one is given."""
+    with _cache_lock:
+        if guild is not None:
+            return guild.version, guild.ranks.top(limit)
+        return leaderboard_version, ranks.top(limit)
+
+
+def get_rank(user_id: int, guild: GuildPartition = None) -> int:
+    """1-based leaderboard position of a user, or None if they have no gifts entry."""
+    with _cache_lock:
+        return (guild.ranks if guild is not None else ranks).rank(str(user_id))
+
+
+# --- GUILD PARTITIONS ---
+async def _load_guild(gid: str) -> GuildPartition:
+    totals: Dict[str, int] = {}
+    # no flush may move rows from the ledger queue into storage while we read
+    async with _flush_guard():
+        generation = partitions.generation
+        async for page in _iter_pages(backend.fetch_guild_totals, "user_id", LOAD_PAGE_SIZE,
+                                      guild_id=gid, season=season):
+            for r in page:
+                totals[str(r["user_id"])] = int(r["total"])
+
+        with _cache_lock:
+            part = partitions.get(gid)
+            if part is not None or generation != partitions.generation:
+                return part or GuildPartition(gid)
+            for _, row in ledger.pending()[0]:
+                if row.get("guild_id") == gid and row["season"] == season:
+                    totals[row["user_id"]] = totals.get(row["user_id"], 0) + row["amount"]
+            part = GuildPartition(gid, totals.items())
+            partitions.put(part)
+    return part
+
+
+async def _guild_once(gid: str) -> GuildPartition:
+    with _cache_lock:
+        part = partitions.get(gid)
+    if part is not None:
+        return part
+    task = _guild_loads.get(gid)
+    if task is None:
+        task = _guild_loads[gid] = asyncio.ensure_future(_load_guild(gid))
+        task.add_done_callback(lambda _: _guild_loads.pop(gid, None))
+    return await asyncio.shield(task)
+
+
+async def guild_async(guild_id: int) -> GuildPartition:
+    """The guild's partition, loaded from storage (plus queued gifts) if it isn't in memory.
+
+    Concurrent callers for the same guild share one load.
+    """
+    return await _io.call(_guild_once(str(guild_id)))
+
+
+def touch_guild(guild_id: int):
+    """Mark a guild as active; starts loading it in the background if needed. Never blocks."""
+    gid = str(guild_id)
+    with _cache_lock:
+        if partitions.get(gid) is not None:
+            partitions.evict()
+            return
+    if _ready.is_set():
+        _io.submit(_guild_once(gid)).add_done_callback(_report_guild_load)
+
+
+def _report_guild_load(fut):
+    if not fut.cancelled() and fut.exception() is not None:
+        print(f"[data] Loading a guild from {backend.name} failed, will retry on its next use: {fut.exception()}")
+
+
+def get_guild_total(user_id: int, guild: GuildPartition) -> int:
+    with _cache_lock:
+        return guild.gifts.get(str(user_id), 0)
+
+
+async def _fetch_user_history(uid: str, limit: int = None) -> List[Dict[str, Any]]:
+    with _cache_lock:
+        cached = history.get(uid)
+        if cached is not None and cached.can_serve(limit):
+            return [dict(e, user_id=uid) for e in history.entries(uid, limit)]
+
+    # not (fully) cached: page through storage newest-first, projected columns only
+    page_size = min(limit, LOAD_PAGE_SIZE) if limit else LOAD_PAGE_SIZE
+    rows: List[Dict[str, Any]] = []
+    last_id = None
+    async with _flush_guard():
+        active = season
+        while True:
+            page = await backend.fetch_user_history(uid, last_id, page_size, active)
+            rows.extend(page)
+            if len(page) < page_size or (limit and len(rows) >= limit):
+                break
+            last_id = page[-1]["id"]
+
+        # gifts still in the ledger queue aren't in storage yet
+        queued = [r for _, r in ledger.pending()[0] if r["user_id"] == uid and r["season"] == active]
+
+    entries = [{"user_id": uid, "amount": r["amount"], "drop_name": r["drop_name"], "created_at": r["created_at"]}
+               for r in reversed(queued)]
+    entries += [{"user_id": uid, "amount": r["amount"], "drop_name": r.get("drop_name", ""),
+                 "created_at": r.get("created_at", "")} for r in rows]
+
+    if not limit:
+        # we have the full history now, keep it (unless the season moved on meanwhile)
+        with _cache_lock:
+            if season == active:
+                history.replace(uid, [(e["amount"], e["drop_name"], e["created_at"]) for e in reversed(entries)])
+    return entries[:limit] if limit else entries
+
+
+async def get_user_history_async(user_id: int, limit: int = None) -> List[Dict[str, Any]]:
+    """Newest-first ``{"user_id", "amount", "drop_name", "created_at"}`` entries of the active season.
+
+    Served from the in-memory history when it holds enough of the user's
+    entries, otherwise from a keyset-paginated query.
+    """
+    return await _io.call(_fetch_user_history(str(user_id), limit))
 
 
 def get_user_history(user_id: int, limit: int = None) -> List[Dict[str, Any]]:
-    uid = str(user_id)
-    query = supabase.table("gift_history").select("*").eq("user_id", uid).order("created_at", desc=True)
-    if limit:
-        query = query.limit(limit)
-    resp = query.execute()
-    return resp.data or []
+    return _io.run(_fetch_user_history(str(user_id), limit))
+
+
+# --- SEASONS ---
+def _switch_season(name: str, title: str):
+    """Point the caches at a new, empty season. Callers hold the flush guard and ``_cache_lock``.
+
+    Only references are swapped, so this takes the same time however big the
+    old season was. Gifts still queued keep their season and flush into it.
+    """
+    global season, season_title, gifts, history, ranks, _dirty
+    season, season_title = name, title
+    gifts = {}
+    history = HistoryStore(_history_retention())
+    ranks = RankIndex()
+    _dirty = set()
+    partitions.clear()
+    _bump_leaderboard()
+    journal.append("s", name, title)
+
+
+async def _load_seasons() -> Dict[str, Any]:
+    """Refresh ``seasons`` from storage and follow its active season. Callers hold the flush guard."""
+    global seasons, season_title
+    rows = await backend.fetch_seasons()
+    active = next((s for s in rows if not s.get("ended_at")), None)
+    if active is None:
+        # storage from before seasons, or a fresh one
+        active = {"name": DEFAULT_SEASON, "title": DEFAULT_SEASON_TITLE, "started_at": _now(),
+                  "ended_at": None, "summary": None}
+        await backend.start_season(active["name"], active["title"], active["started_at"])
+        rows.append(active)
+    with _cache_lock:
+        seasons = {s["name"]: s for s in rows}
+        if active["name"] != season:
+            _switch_season(active["name"], active["title"])
+        season_title = active["title"]
+    return active
+
+
+async def _start_season(name: str, title: str = None) -> str:
+    title = title or name
+    async with _flush_guard():
+        await _load_seasons()
+        if name in seasons:
+            raise ValueError(f"season {name!r} already exists")
+        started_at = _now()
+        await backend.start_season(name, title, started_at)
+        with _cache_lock:
+            ended = season
+            seasons[ended]["ended_at"] = started_at
+            seasons[name] = {"name": name, "title": title, "started_at": started_at, "ended_at": None, "summary": None}
+            _switch_season(name, title)
+    print(f"[data] Season {ended!r} ended and {name!r} started; archiving {ended!r} in the background.")
+    _archive_once(ended).add_done_callback(_report_archive)
+    return ended
+
+
+async def start_season_async(name: str, title: str = None) -> str:
+    """End the active season and start ``name``, shown as ``title``. Returns the season that ended.
+
+    The switch is one storage call plus swapping the caches for empty ones.
+    Gifts still queued for the old season flush into it, and its summary is
+    computed in the background (see ``archive_season_async``).
+    """
+    return await _io.call(_start_season(name, title))
+
+
+def start_season(name: str, title: str = None) -> str:
+    return _io.run(_start_season(name, title))
+
+
+async def _archive_season(name: str) -> Dict[str, Any]:
+    if name == season:
+        raise ValueError(f"season {name!r} is still active")
+    started = time.perf_counter()
+    # the season's last gifts may still be queued
+    await _flush_all()
+    if ledger.pending_deltas(name):
+        raise RuntimeError(f"gifts of season {name!r} are still queued for {backend.name}")
+
+    top: List[tuple] = []  # min-heap of the best (total, user_id) seen so far
+    users = total_gifts = 0
+    async for page in _iter_pages(backend.fetch_users, "user_id", LOAD_PAGE_SIZE, season=name):
+        for u in page:
+            entry = (int(u["total"]), str(u["user_id"]))
+            users += 1
+            total_gifts += entry[0]
+            if len(top) < SEASON_SUMMARY_TOP:
+                heapq.heappush(top, entry)
+            elif entry > top[0]:
+                heapq.heapreplace(top, entry)
+
+    summary = {
+        "users": users,
+        "gifts": total_gifts,
+        "top": [[uid, total] for total, uid in sorted(top, key=lambda e: (-e[0], e[1]))],
+        "archived_at": _now(),
+    }
+    await backend.save_season_summary(name, summary)
+    with _cache_lock:
+        if name in seasons:
+            seasons[name]["summary"] = summary
+    print(f"[data] Archived season {name!r}: {users} users, {total_gifts} gifts "
+          f"in {time.perf_counter() - started:.2f}s.")
+    return summary
+
+
+def _archive_once(name: str) -> asyncio.Future:
+    task = _archives.get(name)
+    if task is None:
+        task = _archives[name] = asyncio.ensure_future(_archive_season(name))
+        task.add_done_callback(lambda _: _archives.pop(name, None))
+    return task
+
+
+def _report_archive(fut):
+    if not fut.cancelled() and fut.exception() is not None:
+        print(f"[data] Archiving a season failed, will retry on the next start: {fut.exception()}")
+
+
+def _archive_missing():
+    """Summarize ended seasons that have none yet (the bot stopped while archiving)."""
+    with _cache_lock:
+        missing = [s["name"] for s in seasons.values() if s.get("ended_at") and not s.get("summary")]
+    for name in missing:
+        _archive_once(name).add_done_callback(_report_archive)
+
+
+async def _archive_wait(name: str) -> Dict[str, Any]:
+    return await asyncio.shield(_archive_once(name))
+
+
+async def archive_season_async(name: str) -> Dict[str, Any]:
+    """Compute and store an ended season's summary.
+
+    That is its user count, gift total and top ``SEASON_SUMMARY_TOP``
+    ``[user_id, total]`` pairs, read from its ``users`` rows in keyset pages.
+    Past leaderboards are served from it, never from ``gift_history``.
+    """
+    return await _io.call(_archive_wait(name))
+
+
+def get_seasons() -> List[Dict[str, Any]]:
+    """Every known season, oldest first."""
+    with _cache_lock:
+        return sorted((dict(s) for s in seasons.values()), key=lambda s: str(s["started_at"]))
+
+
+def get_season(name: str) -> Optional[Dict[str, Any]]:
+    """A season's row, with its ``summary`` once archived; None if there's no such season."""
+    with _cache_lock:
+        s = seasons.get(name)
+        return dict(s) if s is not None else None
+
+
+async def _reset():
+    async with _flush_guard():
+        await backend.clear()
+        with _cache_lock:
+            ledger.clear()
+            journal.append("r")
+            gifts.clear()
+            history.clear()
+            ranks.clear()
+            partitions.clear()
+            _bump_leaderboard()
+            _dirty.clear()
+    print(f"[data] Reset all {backend.name} data.")
+
+
+async def reset_async():
+    """Clear all stored users and gift history, of every season.
+
+    To end a season and keep it, use ``start_season_async`` instead.
+    """
+    await _io.call(_reset())
 
 
 def reset():
-    """Clear all data in Supabase tables safely using filters to satisfy API."""
-    supabase.table("gift_history").delete().not_.is_("id", None).execute()
-    supabase.table("users").delete().not_.is_("user_id", None).execute()
-    gifts.clear()
-    history.clear()
-    print("[data] Reset all Supabase data.")
+    _io.run(_reset())
+
+
+# --- LOCAL SNAPSHOT + JOURNAL ---
+def _restore_local() -> bool:
+    """Rebuild the caches and ledger queue from the snapshot and journal.
+
+    The journal is replayed even without a snapshot so gifts that never
+    reached storage are queued again. Returns whether a snapshot was found,
+    i.e. whether the caches are complete enough to serve from.
+    """
+    global gifts, history, season, season_title, seasons, drops, writer
+    found = load_snapshot(SNAPSHOT_PATH)
+    if found is None and "SNAPSHOT_PATH" not in os.environ:
+        found = load_snapshot(_LEGACY_SNAPSHOT_PATH)
+    snap = found or {"seq": 0, "gifts": {}, "history": {}, "pending": [], "deltas": {}}
+    base_seq = snap["seq"]
+    # snapshots from before seasons hold the default season's gifts
+    cur_season, cur_title = snap.get("season") or (DEFAULT_SEASON, DEFAULT_SEASON_TITLE)
+    new_gifts: Dict[str, int] = dict(snap["gifts"])
+    # the snapshot only has each user's newest entries, so none of them are complete
+    new_history = HistoryStore(_history_retention())
+    for uid, entries in snap["history"].items():
+        for amount, drop_name, created_at in entries:
+            new_history.append(uid, amount, drop_name, created_at, complete=False)
+    # (seq, row) not yet in gift_history, and (seq, season, uid, amount) not yet in users.total
+    pending = [(seq, {"season": extra[1] if len(extra) > 1 else cur_season, "user_id": uid, "amount": a,
+                      "drop_name": d, "created_at": c, "guild_id": extra[0] if extra else None})
+               for seq, uid, a, d, c, *extra in snap["pending"]]
+    snap_deltas = snap["deltas"]
+    if any(isinstance(d, int) for d in snap_deltas.values()):
+        snap_deltas = {cur_season: snap_deltas}
+    unapplied = [(base_seq, s, uid, d) for s, user_deltas in snap_deltas.items() for uid, d in user_deltas.items()]
+    # increment batch sent up to this seq without a "t" yet: resent as is, see _flush_ledger
+    sent_upto, sent = snap.get("unsettled") or (0, {})
+    unapplied += [(sent_upto, s, uid, d) for s, user_deltas in sent.items() for uid, d in user_deltas.items()]
+    new_drops = {d["id"]: d for d in snap.get("drops", [])}
+    new_writer = snap.get("writer")
+    last_seq = base_seq
+    replayed = 0
+
+    for rec in read_journal(JOURNAL_PATH):
+        kind, seq = rec[0], rec[1]
+        if seq <= base_seq:
+            continue
+        last_seq = seq
+        replayed += 1
+        if kind == "g":
+            _, _, uid, amount, drop_name, created_at, *extra = rec
+            new_gifts[uid] = new_gifts.get(uid, 0) + amount
+            new_history.append(uid, amount, drop_name, created_at, complete=False)
+            pending.append((seq, {"season": cur_season, "user_id": uid, "amount": amount, "drop_name": drop_name,
+                                  "created_at": created_at, "guild_id": extra[0] if extra else None}))
+            unapplied.append((seq, cur_season, uid, amount))
+            if len(extra) > 1 and extra[1] in new_drops:
+                new_drops[extra[1]]["winner"] = uid
+        elif kind == "d":
+            _, _, drop_id, channel_id, message_id, guild_id, drop_name, slot, expires_at = rec
+            new_drops[drop_id] = {"id": drop_id, "channel_id": channel_id, "message_id": message_id,
+                                  "guild_id": guild_id, "drop_name": drop_name, "slot": slot,
+                                  "expires_at": expires_at, "winner": None}
+        elif kind == "x":
+            new_drops.pop(rec[2], None)
+        elif kind == "w":
+            new_writer = rec[2]
+        elif kind == "a":
+            sent_upto = rec[2]
+        elif kind == "t":
+            unapplied = [u for u in unapplied if u[0] > rec[2]]
+            if rec[2] >= sent_upto:
+                sent_upto = 0
+        elif kind == "h":
+            pending = [p for p in pending if p[0] > rec[2]]
+        elif kind == "s":
+            # new season: the caches start empty, queued gifts keep theirs
+            cur_season, cur_title = rec[2], rec[3]
+            new_gifts.clear()
+            new_history.clear()
+        elif kind == "r":
+            new_gifts.clear()
+            new_history.clear()
+            pending.clear()
+            unapplied.clear()
+            sent_upto = 0
+
+    deltas: Dict[str, Dict[str, int]] = {}
+    sent = {}
+    for seq, s, uid, amount in unapplied:
+        user_deltas = (sent if seq <= sent_upto else deltas).setdefault(s, {})
+        user_deltas[uid] = user_deltas.get(uid, 0) + amount
+
+    with _cache_lock:
+        season, season_title = cur_season, cur_title
+        seasons = {s["name"]: s for s in snap.get("seasons", [])}
+        gifts = new_gifts
+        history = new_history
+        ranks.rebuild(gifts.items())
+        _bump_leaderboard()
+        ledger.restore(pending, deltas, (sent, sent_upto) if sent else None)
+        journal.seq = last_seq
+        drops = new_drops
+        writer = new_writer
+
+    if found is not None or replayed:
+        print(f"[data] Restored {len(gifts)} users of season {season!r} from snapshot, replayed {replayed} "
+              f"journal records, {len(pending)} gifts still queued for {backend.name}, {len(drops)} drops posted.")
+    return found is not None
+
+
+async def _compact():
+    if not _ready.is_set():
+        return  # a snapshot of caches that were never loaded would hide the real one
+    started = time.perf_counter()
+    async with _flush_guard():
+        # only copies under the lock (record_gift waits on it); building the
+        # JSON-ready lists happens afterwards, from copies nothing else touches
+        with _cache_lock:
+            base_seq = journal.seq
+            current = [season, season_title]
+            all_seasons = [dict(s) for s in seasons.values()]
+            gifts_copy = dict(gifts)
+            history_copy = history.copy()
+            queued, _ = ledger.pending()
+            deltas = ledger.queued_deltas()
+            unsettled = ledger.unsettled()
+            live = [dict(d) for d in drops.values()]
+            writer_id = writer
+            journal.rotate()
+        snap = {
+            "seq": base_seq,
+            "season": current,
+            "seasons": all_seasons,
+            "gifts": gifts_copy,
+            "history": {
+                uid: history_copy.compact_entries(uid, HISTORY_RECENT_LIMIT)
+                for uid in history_copy.user_ids()
+            },
+            "pending": [[seq, r["user_id"], r["amount"], r["drop_name"], r["created_at"], r.get("guild_id"),
+                         r["season"]] for seq, r in queued],
+            "deltas": deltas,
+            "unsettled": [unsettled[1], unsettled[0]] if unsettled else None,
+            "drops": live,
+            "writer": writer_id,
+        }
+        # blocking, but only the private I/O loop waits and it must finish at exit too
+        write_snapshot(SNAPSHOT_PATH, snap)
+        journal.discard_rotated()
+    print(f"[data] Snapshot written: {len(snap['gifts'])} users, {len(snap['pending'])} queued "
+          f"in {time.perf_counter() - started:.2f}s.")
+
+
+async def compact_async():
+    """Fold the journal into a fresh snapshot of the caches and the unflushed queue."""
+    await _io.call(_compact())
+
+
+def compact():
+    _io.run(_compact())
+
+
+async def _background_load():
+    try:
+        await _load_data()
+    except Exception as e:
+        print(f"[data] Background reconcile with {backend.name} failed, serving local snapshot: {e}")
+        return
+    _archive_missing()
+
+
+async def _warm_start() -> float:
+    started = time.perf_counter()
+    if _restore_local():
+        _ready.set()
+        asyncio.ensure_future(_background_load())
+    else:
+        await _load_data()
+        _ready.set()
+        _archive_missing()
+    elapsed = time.perf_counter() - started
+    print(f"[data] Ready in {elapsed:.2f}s.")
+    return elapsed
+
+
+async def _warm_start_once() -> float:
+    global _warming
+    if _warming is None:
+        _warming = asyncio.ensure_future(_warm_start())
+    try:
+        return await asyncio.shield(_warming)
+    except Exception:
+        _warming = None  # let the next caller try again
+        raise
+
+
+async def warm_start_async() -> float:
+    """Serve from the local snapshot and journal right away, then reload from storage in the background.
+
+    Falls back to a full load when there is no local state yet. Nothing is
+    loaded on import; the bot runs this alongside the gateway login and
+    gifts are only recorded once it finished (see ``is_ready``). Safe to
+    call more than once. Returns the seconds until the caches were usable.
+    """
+    return await _io.call(_warm_start_once())
+
+
+def warm_start() -> float:
+    return _io.run(_warm_start_once())
+
+
+def is_ready() -> bool:
+    """Whether the caches are loaded and gifts can be recorded."""
+    return _ready.is_set()
+
+
+async def wait_ready_async():
+    if not _ready.is_set():
+        await warm_start_async()
+
+
+def shutdown():
+    """Flush the ledger, write a snapshot, close the journal and the storage backend."""
+    flush_all()
+    try:
+        compact()
+    except Exception as e:
+        print(f"[data] Failed to write snapshot on shutdown: {e}")
+    journal.close()
+    _io.run(backend.aclose())
+    _io.stop()
 
 
-# Load once on import
-load_data()
+# Don't lose queued gifts if the process exits without unloading the cog
+atexit.register(shutdown)
@@ -0,0 +1,294 @@
+"""Streaming export of one season's ``users`` and ``gift_history`` for audits.
+
+    python -m data.export [--format csv|jsonl|parquet] [--season NAME] [--out DIR] [--restart]
+
+The season defaults to the active one and the output directory to
+``EXPORT_DIR/<season>/<format>``.
+
+Each table is read in keyset pages and written page by page, so memory stays
+at one page no matter how big the season got. CSV and JSON Lines are gzipped
+(``users.csv.gz``, ``gift_history.jsonl.gz``); parquet needs ``pyarrow`` and
+writes one row group per page.
+
+``export_state.json`` in the output directory records the last exported key
+of each table, so a run picks up where the previous one stopped (after a
+crash, or later in the season to add the new rows). A resumed gzip file gets
+another gzip member appended, which every gzip reader treats as one stream;
+a resumed parquet export adds a ``.partN`` file. ``gift_history`` only
+grows, so a finished export is extended with the rows added since;
+``users`` totals change, so once a users export finished the next run
+writes it again from the start.
+"""
+import os
+import csv
+import json
+import gzip
+import time
+import asyncio
+import argparse
+from typing import Any, Callable, Dict, List
+
+from . import data
+
+EXPORT_DIR: str = os.getenv("EXPORT_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "exports"))
+EXPORT_PAGE_SIZE: int = int(os.getenv("EXPORT_PAGE_SIZE", "5000"))
+FORMATS = ("csv", "jsonl", "parquet")
+STATE_FILE = "export_state.json"
+
+# table -> (fetch method on the backend, keyset column, columns in file order, append-only)
+TABLES = {
+    "users": ("fetch_users", "user_id", ("season", "user_id", "total", "updated_at"), False),
+    "gift_history": ("fetch_history", "id",
+                     ("id", "season", "user_id", "amount", "drop_name", "created_at", "guild_id"), True),
+}
+
+
+class _Gzip:
+    """Text rows into a gzip file; every checkpoint closes one complete gzip member."""
+
+    def __init__(self, path: str, columns, resume: bool):
+        self.path = path
+        self.columns = columns
+        self._file = gzip.open(path, "at" if resume else "wt", encoding="utf-8", newline="")
+        if not resume:
+            self.header()
+
+    def header(self):
+        pass
+
+    def checkpoint(self):
+        self._file.close()
+        self._file = gzip.open(self.path, "at", encoding="utf-8", newline="")
+
+    def close(self):
+        self._file.close()
+
+
+class _GzipCsv(_Gzip):
+    def header(self):
+        csv.writer(self._file).writerow(self.columns)
+
+    def write(self, rows: List[Dict[str, Any]]):
+        csv.writer(self._file).writerows([r.get(c) for c in self.columns] for r in rows)
+
+
+class _GzipJsonl(_Gzip):
+    def write(self, rows: List[Dict[str, Any]]):
+        self._file.write("".join(json.dumps({c: r.get(c) for c in self.columns}, ensure_ascii=False) + "\n"
+                                 for r in rows))
+
+
+class _Parquet:
+    def __init__(self, path: str, columns):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("parquet export needs pyarrow (pip install pyarrow)") from None
+        self._pa = pyarrow
+        self.path = path
+        self.columns = columns
+        types = {"id": pyarrow.int64(), "total": pyarrow.int64(), "amount": pyarrow.int64()}
+        self._schema = pyarrow.schema([(c, types.get(c, pyarrow.string())) for c in columns])
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema, compression="zstd")
+
+    def write(self, rows: List[Dict[str, Any]]):
+        arrays = {c: [r.get(c) for r in rows] for c in self.columns}
+        for c in self.columns:
+            if self._schema.field(c).type == self._pa.string():
+                arrays[c] = [None if v is None else str(v) for v in arrays[c]]
+        self._writer.write_table(self._pa.table(arrays, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def _table_path(out_dir: str, table: str, fmt: str, part: int) -> str:
+    if fmt == "parquet":
+        return os.path.join(out_dir, f"{table}.parquet" if part == 0 else f"{table}.part{part}.parquet")
+    return os.path.join(out_dir, f"{table}.{fmt}.gz")
+
+
+def _remove_table_files(out_dir: str, table: str):
+    for name in os.listdir(out_dir):
+        if name.startswith(table + "."):
+            os.remove(os.path.join(out_dir, name))
+
+
+def _load_state(out_dir: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(out_dir, STATE_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_state(out_dir: str, state: Dict[str, Any]):
+    path = os.path.join(out_dir, STATE_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+async def _export_table(table: str, fmt: str, season: str, out_dir: str, state: Dict[str, Any], page_size: int,
+                        progress: Callable[[str, int, int], None]) -> Dict[str, Any]:
+    fetch_name, key, columns, append_only = TABLES[table]
+    fetch = getattr(data.backend, fetch_name)
+    prev = state.get(table) or {}
+    if prev.get("complete") and not append_only:
+        _remove_table_files(out_dir, table)
+        prev = {}
+    resume = prev.get("last") is not None
+    part = prev.get("parts", 0)
+    path = _table_path(out_dir, table, fmt, part)
+    if fmt == "parquet":
+        # a parquet file is only readable once closed, so a new part per run
+        size_before = 0
+        writer = _Parquet(path, columns)
+    else:
+        size_before = prev.get("size", 0) if resume else 0
+        if resume and os.path.exists(path) and os.path.getsize(path) > size_before:
+            # drop the torn member a crashed run left after its last checkpoint
+            with open(path, "r+b") as f:
+                f.truncate(size_before)
+        writer = (_GzipCsv if fmt == "csv" else _GzipJsonl)(path, columns, resume)
+
+    def entry(last, rows, size, parts, complete=False):
+        return {"last": last, "rows": prev.get("rows", 0) + rows, "bytes": prev.get("bytes", 0) + size - size_before,
+                "size": size, "parts": parts, "complete": complete}
+
+    started = time.perf_counter()
+    last, rows, pages = prev.get("last"), 0, 0
+    try:
+        while True:
+            page = await fetch(last, page_size, season)
+            if not page:
+                break
+            # compression runs off the I/O loop so ledger flushes aren't held up
+            await asyncio.to_thread(writer.write, page)
+            last = page[-1][key]
+            rows += len(page)
+            pages += 1
+            if pages % 10 == 0:
+                progress(table, rows, pages)
+                if fmt != "parquet":
+                    # everything up to here is in complete gzip members, safe to resume from
+                    await asyncio.to_thread(writer.checkpoint)
+                    state[table] = entry(last, rows, os.path.getsize(path), part)
+                    await asyncio.to_thread(_save_state, out_dir, state)
+            if len(page) < page_size:
+                break
+    finally:
+        await asyncio.to_thread(writer.close)
+
+    elapsed = time.perf_counter() - started
+    if fmt == "parquet" and not rows:
+        os.remove(path)  # nothing new, don't leave an empty part behind
+        path, size = None, 0
+    else:
+        size = os.path.getsize(path)
+    state[table] = entry(last, rows, size, part + 1 if fmt == "parquet" and rows else part, complete=True)
+    written = size - size_before
+    progress(table, rows, pages)
+    return {
+        "rows": rows,
+        "bytes": written,
+        "elapsed": elapsed,
+        "rows_per_sec": rows / elapsed if elapsed else None,
+        "mb_per_sec": written / 2**20 / elapsed if elapsed else None,
+        "resumed_after": prev.get("last"),
+        "path": path,
+    }
+
+
+def _print_progress(table: str, rows: int, pages: int):
+    print(f"[data]   export {table}: {rows} rows ({pages} pages)")
+
+
+async def _active_season() -> str:
+    if data.is_ready():
+        return data.season
+    # a standalone export: ask storage rather than loading the caches
+    rows = await data.backend.fetch_seasons()
+    return next((s["name"] for s in rows if not s.get("ended_at")), data.DEFAULT_SEASON)
+
+
+async def _export(fmt: str = "csv", out_dir: str = None, tables: List[str] = None, page_size: int = None,
+                  restart: bool = False, progress: Callable[[str, int, int], None] = None,
+                  season: str = None) -> Dict[str, Any]:
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}, expected one of {', '.join(FORMATS)}")
+    season = season or await _active_season()
+    out_dir = out_dir or os.path.join(EXPORT_DIR, season, fmt)
+    tables = tables or list(TABLES)
+    page_size = page_size or EXPORT_PAGE_SIZE
+    progress = progress or _print_progress
+    os.makedirs(out_dir, exist_ok=True)
+
+    state = {} if restart else _load_state(out_dir)
+    if state.get("format") not in (None, fmt):
+        raise ValueError(f"{out_dir} holds a {state['format']} export; use another directory or restart")
+    if restart:
+        for table in tables:
+            _remove_table_files(out_dir, table)
+    state["format"] = fmt
+
+    if state.get("season") not in (None, season):
+        raise ValueError(f"{out_dir} holds an export of season {state['season']!r}; use another directory")
+    state["season"] = season
+
+    print(f"[data] Exporting {', '.join(tables)} of season {season!r} from {data.backend.name} as {fmt} to {out_dir}...")
+    started = time.perf_counter()
+    stats = {"format": fmt, "season": season, "out_dir": out_dir, "tables": {}}
+    for table in tables:
+        stats["tables"][table] = await _export_table(table, fmt, season, out_dir, state, page_size, progress)
+        await asyncio.to_thread(_save_state, out_dir, state)
+    stats["elapsed"] = time.perf_counter() - started
+    stats["rows"] = sum(t["rows"] for t in stats["tables"].values())
+    stats["bytes"] = sum(t["bytes"] for t in stats["tables"].values())
+    state["last_run"] = {"finished_at": data._now(), "rows": stats["rows"], "bytes": stats["bytes"],
+                         "elapsed": round(stats["elapsed"], 3)}
+    await asyncio.to_thread(_save_state, out_dir, state)
+
+    print(f"[data] Exported {stats['rows']} rows ({stats['bytes'] / 2**20:.2f} MB) in {stats['elapsed']:.2f}s.")
+    return stats
+
+
+async def export_async(fmt: str = "csv", out_dir: str = None, tables: List[str] = None, page_size: int = None,
+                       restart: bool = False, progress: Callable[[str, int, int], None] = None,
+                       season: str = None) -> Dict[str, Any]:
+    """Stream one season's ``tables`` from storage into ``out_dir``, continuing the export already there.
+
+    Queued gifts are flushed first so the export includes them. Returns per
+    table ``rows``, ``bytes``, ``elapsed``, ``rows_per_sec``, ``mb_per_sec``
+    and ``resumed_after``, plus the totals.
+    """
+    await data.flush_all_async()
+    return await data._io.call(_export(fmt, out_dir, tables, page_size, restart, progress, season))
+
+
+def export(fmt: str = "csv", out_dir: str = None, tables: List[str] = None, page_size: int = None,
+           restart: bool = False, progress: Callable[[str, int, int], None] = None,
+           season: str = None) -> Dict[str, Any]:
+    data.flush_all()
+    return data._io.run(_export(fmt, out_dir, tables, page_size, restart, progress, season))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--season", help="season to export (default: the active one)")
+    parser.add_argument("--out", help="output directory (default: EXPORT_DIR/<season>/<format>)")
+    parser.add_argument("--tables", nargs="+", choices=list(TABLES), default=list(TABLES))
+    parser.add_argument("--page-size", type=int, default=EXPORT_PAGE_SIZE)
+    parser.add_argument("--restart", action="store_true", help="discard the previous export in --out and start over")
+    args = parser.parse_args()
+
+    stats = export(args.format, args.out, args.tables, args.page_size, args.restart, season=args.season)
+    for table, t in stats["tables"].items():
+        rate = f"{t['rows_per_sec']:.0f} rows/s" if t["rows_per_sec"] else "-"
+        print(f"  {table:<13} {t['rows']:>10} rows  {t['bytes'] / 2**20:8.2f} MB  {rate}  -> {t['path'] or '(nothing new)'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import datetime
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def to_epoch(value: Any) -> int:
+    """Epoch seconds from an ISO timestamp (naive means UTC) or a number."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    if not value:
+        return 0
+    dt = datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return int((dt - _EPOCH).total_seconds())
+
+
+def to_iso(epoch: int) -> str:
+    return datetime.datetime.utcfromtimestamp(epoch).isoformat()
+
+
+class DropNames:
+    """Interns drop names so each history entry stores a small id."""
+
+    __slots__ = ("names", "_ids")
+
+    def __init__(self):
+        self.names: List[str] = []
+        self._ids: Dict[str, int] = {}
+
+    def intern(self, name: str) -> int:
+        drop_id = self._ids.get(name)
+        if drop_id is None:
+            drop_id = self._ids[name] = len(self.names)
+            self.names.append(name)
+        return drop_id
+
+
+class UserHistory:
+    """One user's gift events as parallel arrays, optionally a ring buffer.
+
+    ``amounts`` is int8, ``drops`` holds interned drop ids and ``times`` epoch
+    seconds. With a ``capacity`` the oldest entry is overwritten once full.
+    ``complete`` says the arrays hold every entry since the user's first gift
+    (as far as retention allows), so reads don't need to go to storage.
+    ``version`` is the ``HistoryStore`` version it was made under.
+    """
+
+    __slots__ = ("amounts", "drops", "times", "capacity", "head", "wrapped", "complete", "version")
+
+    def __init__(self, capacity: int = 0, complete: bool = True, version: int = 0):
+        self.amounts = array("b")
+        self.drops = array("H")
+        self.times = array("q")
+        self.capacity = capacity
+        self.head = 0  # index of the oldest entry once the ring is full
+        self.wrapped = False
+        self.complete = complete
+        self.version = version
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def append(self, amount: int, drop_id: int, epoch: int):
+        if self.capacity and len(self.amounts) >= self.capacity:
+            i = self.head
+            self.amounts[i] = amount
+            self.drops[i] = drop_id
+            self.times[i] = epoch
+            self.head = (i + 1) % self.capacity
+            self.wrapped = True
+        else:
+            self.amounts.append(amount)
+            self.drops.append(drop_id)
+            self.times.append(epoch)
+
+    def copy(self, version: int) -> "UserHistory":
+        h = UserHistory(self.capacity, self.complete, version)
+        h.amounts, h.drops, h.times = self.amounts[:], self.drops[:], self.times[:]
+        h.head, h.wrapped = self.head, self.wrapped
+        return h
+
+    def iter_newest(self) -> Iterator[Tuple[int, int, int]]:
+        n = len(self.amounts)
+        for k in range(n):
+            i = (self.head - 1 - k) % n
+            yield self.amounts[i], self.drops[i], self.times[i]
+
+    def can_serve(self, limit: Optional[int]) -> bool:
+        if not self.complete:
+            return False
+        if limit is None:
+            return not self.wrapped
+        return limit <= len(self.amounts) or not self.wrapped
+
+
+class HistoryStore:
+    """Per-user compact gift history, keyed by user id string.
+
+    ``copy()`` shares every ``UserHistory`` with the copy and bumps
+    ``version``; a user made under an older version is copied before its
+    next append, so the copy stays as it was without copying the arrays of
+    users who didn't change.
+    """
+
+    def __init__(self, retention: int = 0):
+        self.retention = retention
+        self.names = DropNames()
+        self._users: Dict[str, UserHistory] = {}
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._users
+
+    def get(self, user_id: str) -> Optional[UserHistory]:
+        return self._users.get(user_id)
+
+    def user(self, user_id: str, complete: bool = True) -> UserHistory:
+        """The user's history, ready to append to."""
+        h = self._users.get(user_id)
+        if h is None:
+            h = self._users[user_id] = UserHistory(self.retention, complete, self.version)
+        elif h.version != self.version:
+            h = self._users[user_id] = h.copy(self.version)  # shared with a copy
+        return h
+
+    def append(self, user_id: str, amount: int, drop_name: str, created_at: Any, complete: bool = True):
+        self.user(user_id, complete).append(amount, self.names.intern(drop_name or ""), to_epoch(created_at))
+
+    def replace(self, user_id: str, entries: List[Tuple[int, str, Any]]):
+        """Set a user's full history from oldest-first ``(amount, drop_name, created_at)``."""
+        h = self._users[user_id] = UserHistory(self.retention, True, self.version)
+        for amount, drop_name, created_at in entries:
+            h.append(amount, self.names.intern(drop_name or ""), to_epoch(created_at))
+
+    def entries(self, user_id: str, limit: int = None) -> List[Dict[str, Any]]:
+        """Newest-first entries as ``{"amount", "drop_name", "created_at"}`` dicts."""
+        h = self._users.get(user_id)
+        if h is None:
+            return []
+        names = self.names.names
+        out = []
+        for amount, drop_id, epoch in h.iter_newest():
+            if limit is not None and len(out) >= limit:
+                break
+            out.append({"amount": amount, "drop_name": names[drop_id], "created_at": to_iso(epoch)})
+        return out
+
+    def copy(self) -> "HistoryStore":
+        """Read-only copy that later appends here don't reach; O(users) pointer copies."""
+        store = HistoryStore(self.retention)
+        store.names.names = list(self.names.names)
+        store._users = dict(self._users)
+        self.version += 1
+        return store
+
+    def compact_entries(self, user_id: str, limit: int = None) -> List[List[Any]]:
+        """Oldest-first ``[amount, drop_name, epoch]`` lists, for snapshots."""
+        h = self._users.get(user_id)
+        if h is None:
+            return []
+        names = self.names.names
+        rows = [[a, names[d], t] for a, d, t in h.iter_newest()]
+        if limit:
+            rows = rows[:limit]
+        rows.reverse()
+        return rows
+
+    def user_ids(self) -> List[str]:
+        return list(self._users)
+
+    def total_entries(self) -> int:
+        return sum(len(h) for h in self._users.values())
+
+    def clear(self):
+        self._users.clear()
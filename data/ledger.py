@@ -0,0 +1,133 @@
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+
+class WriteBehindLedger:
+    """Queue of gift mutations waiting to be written to Supabase.
+
+    The in-memory caches in ``data`` are updated first; this only holds what
+    still has to reach the database. History rows are flushed with one
+    multi-row insert and the per-user deltas with one atomic increment call.
+
+    Every row carries the journal sequence number it was logged under, so a
+    flush can tell the journal how far the database has caught up. Rows carry
+    their ``season`` and deltas are kept per season, so gifts queued just
+    before a rollover still land in the season they were won in.
+
+    Drained deltas stay ``unsettled`` until the increment is known to have
+    landed: a call that failed may still have been applied, so it is resent
+    as the same batch (same deltas, same ``upto``) and storage can recognise
+    it, instead of being merged with newer gifts.
+    """
+
+    def __init__(self, batch_size: int = 500):
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._rows: List[Dict[str, Any]] = []
+        self._seqs: List[int] = []
+        self._deltas: Dict[str, Dict[str, int]] = {}  # season -> user_id -> delta
+        self._unsettled: Optional[Tuple[Dict[str, Dict[str, int]], int]] = None  # (deltas, upto) in flight
+
+    def push(self, row: Dict[str, Any], seq: int = 0):
+        uid = row["user_id"]
+        with self._lock:
+            self._rows.append(row)
+            self._seqs.append(seq)
+            deltas = self._deltas.setdefault(row["season"], {})
+            deltas[uid] = deltas.get(uid, 0) + row["amount"]
+
+    def depth(self) -> int:
+        with self._lock:
+            return len(self._rows)
+
+    def _all_deltas(self) -> Dict[str, Dict[str, int]]:
+        # callers hold _lock
+        merged = {s: dict(d) for s, d in self._deltas.items()}
+        if self._unsettled is not None:
+            for season, season_deltas in self._unsettled[0].items():
+                queued = merged.setdefault(season, {})
+                for uid, delta in season_deltas.items():
+                    queued[uid] = queued.get(uid, 0) + delta
+        return merged
+
+    def pending_users(self) -> int:
+        with self._lock:
+            return sum(len(d) for d in self._all_deltas().values())
+
+    def pending_delta(self, uid: str, season: str) -> int:
+        with self._lock:
+            delta = self._deltas.get(season, {}).get(uid, 0)
+            if self._unsettled is not None:
+                delta += self._unsettled[0].get(season, {}).get(uid, 0)
+            return delta
+
+    def pending_deltas(self, season: str) -> Dict[str, int]:
+        with self._lock:
+            return self._all_deltas().get(season, {})
+
+    def pending(self) -> Tuple[List[Tuple[int, Dict[str, Any]]], Dict[str, Dict[str, int]]]:
+        """Copy of the queued ``(seq, row)`` pairs and per-season deltas, unsettled ones included."""
+        with self._lock:
+            return list(zip(self._seqs, self._rows)), self._all_deltas()
+
+    def unsettled(self) -> Optional[Tuple[Dict[str, Dict[str, int]], int]]:
+        """Copy of the increment batch in flight as ``(deltas, upto)``, or None."""
+        with self._lock:
+            if self._unsettled is None:
+                return None
+            deltas, upto = self._unsettled
+            return {s: dict(d) for s, d in deltas.items()}, upto
+
+    def queued_deltas(self) -> Dict[str, Dict[str, int]]:
+        """Copy of the deltas not yet part of a batch, for snapshots."""
+        with self._lock:
+            return {s: dict(d) for s, d in self._deltas.items()}
+
+    def drain(self, limit: int = None, upto: int = 0) -> Tuple[List[Dict[str, Any]], List[int],
+                                                                Dict[str, Dict[str, int]], int]:
+        """Take up to ``limit`` history rows and the increment batch to send.
+
+        The batch is the unsettled one if there is one, else every pending
+        delta, which then becomes unsettled under ``upto`` (the journal
+        sequence the caller knows all of them to be logged by). Returns the
+        rows, their sequence numbers, the batch deltas and its ``upto``.
+        """
+        limit = limit or self.batch_size
+        with self._lock:
+            rows = self._rows[:limit]
+            seqs = self._seqs[:limit]
+            del self._rows[:limit]
+            del self._seqs[:limit]
+            if self._unsettled is None and self._deltas:
+                self._unsettled = (self._deltas, upto)
+                self._deltas = {}
+            deltas, upto = self._unsettled or ({}, upto)
+            return rows, seqs, deltas, upto
+
+    def settle(self):
+        """The unsettled batch reached storage."""
+        with self._lock:
+            self._unsettled = None
+
+    def requeue(self, rows: List[Dict[str, Any]] = None, seqs: List[int] = None):
+        """Put back history rows that failed to flush, ahead of newer entries."""
+        with self._lock:
+            if rows:
+                self._rows[:0] = rows
+                self._seqs[:0] = seqs or [0] * len(rows)
+
+    def restore(self, entries: List[Tuple[int, Dict[str, Any]]], deltas: Dict[str, Dict[str, int]],
+                unsettled: Tuple[Dict[str, Dict[str, int]], int] = None):
+        """Replace the queue with state recovered from a snapshot and journal."""
+        with self._lock:
+            self._seqs = [seq for seq, _ in entries]
+            self._rows = [row for _, row in entries]
+            self._deltas = {s: dict(d) for s, d in deltas.items()}
+            self._unsettled = unsettled
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+            self._seqs.clear()
+            self._deltas.clear()
+            self._unsettled = None
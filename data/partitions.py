@@ -0,0 +1,92 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from .rank import RankIndex
+
+
+class GuildPartition:
+    """One guild's gift totals and its own leaderboard index.
+
+    ``version`` is bumped on every change, like ``data.leaderboard_version``
+    for the global board, so renders can be cached per guild; ``leaderboard``
+    is where a caller keeps that cache, so it goes away with the partition.
+    """
+
+    __slots__ = ("guild_id", "gifts", "ranks", "version", "last_used", "leaderboard")
+
+    def __init__(self, guild_id: str, totals: Iterable[Tuple[str, int]] = ()):
+        self.guild_id = guild_id
+        self.gifts: Dict[str, int] = dict(totals)
+        self.ranks = RankIndex()
+        self.ranks.rebuild(self.gifts.items())
+        self.version = 0
+        self.last_used = time.time()
+        self.leaderboard = None
+
+    def __len__(self) -> int:
+        return len(self.gifts)
+
+    def add(self, user_id: str, amount: int) -> int:
+        total = self.gifts.get(user_id, 0) + amount
+        self.gifts[user_id] = total
+        self.ranks.set(user_id, total)
+        self.version += 1
+        return total
+
+
+class GuildPartitions:
+    """Loaded ``GuildPartition``s, least recently used first.
+
+    A partition that wasn't used for ``ttl`` seconds is dropped, and so is
+    the least recently used one once more than ``max_guilds`` are loaded;
+    either way it is loaded from storage again on its next use. Callers hold
+    ``data._cache_lock``.
+    """
+
+    def __init__(self, ttl: float = 3600, max_guilds: int = 0):
+        self.ttl = ttl
+        self.max_guilds = max_guilds
+        self._guilds: "OrderedDict[str, GuildPartition]" = OrderedDict()
+        self.generation = 0  # bumped by clear(), so a load that started before a reset is dropped
+
+    def __len__(self) -> int:
+        return len(self._guilds)
+
+    def __contains__(self, guild_id: str) -> bool:
+        return guild_id in self._guilds
+
+    def get(self, guild_id: str, now: float = None) -> Optional[GuildPartition]:
+        """The loaded partition, marked as used, or None."""
+        part = self._guilds.get(guild_id)
+        if part is not None:
+            part.last_used = time.time() if now is None else now
+            self._guilds.move_to_end(guild_id)
+        return part
+
+    def put(self, part: GuildPartition):
+        self._guilds[part.guild_id] = part
+        self._guilds.move_to_end(part.guild_id)
+        self.evict(part.last_used)
+
+    def evict(self, now: float = None) -> int:
+        now = time.time() if now is None else now
+        evicted = 0
+        guilds = self._guilds
+        while guilds:
+            guild_id, part = next(iter(guilds.items()))
+            if now - part.last_used < self.ttl and not (self.max_guilds and len(guilds) > self.max_guilds):
+                break
+            guilds.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def values(self):
+        return list(self._guilds.values())
+
+    def total_entries(self) -> int:
+        return sum(len(p) for p in self._guilds.values())
+
+    def clear(self):
+        self._guilds.clear()
+        self.generation += 1
@@ -0,0 +1,70 @@
+from typing import Dict, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+
+
+class RankIndex:
+    """Order-statistics index over user totals.
+
+    Keeps ``(-total, seq, user_id)`` keys in a ``SortedList`` so top-k and a
+    user's rank are O(log n). ``seq`` is the order a user was first seen,
+    which is the same tie-break the old ``sorted(gifts.items())`` gave since
+    that sort is stable over dict insertion order.
+    """
+
+    def __init__(self):
+        self._keys = SortedList()
+        self._entries: Dict[str, Tuple[int, int]] = {}  # user_id -> (total, seq)
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._entries
+
+    def set(self, user_id: str, total: int):
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            old_total, seq = entry
+            if old_total == total:
+                return
+            self._keys.remove((-old_total, seq, user_id))
+        else:
+            seq = self._seq
+            self._seq += 1
+        self._entries[user_id] = (total, seq)
+        self._keys.add((-total, seq, user_id))
+
+    def rebuild(self, items):
+        """Replace the index with ``(user_id, total)`` pairs, in tie-break order."""
+        self._entries = {}
+        keys = []
+        for seq, (user_id, total) in enumerate(items):
+            self._entries[user_id] = (total, seq)
+            keys.append((-total, seq, user_id))
+        self._seq = len(keys)
+        self._keys = SortedList(keys)
+
+    def copy(self) -> "RankIndex":
+        index = RankIndex()
+        index._keys = self._keys.copy()
+        index._entries = dict(self._entries)
+        index._seq = self._seq
+        return index
+
+    def clear(self):
+        self._keys.clear()
+        self._entries.clear()
+        self._seq = 0
+
+    def top(self, k: int) -> List[Tuple[str, int]]:
+        return [(user_id, -neg_total) for neg_total, _, user_id in self._keys.islice(0, k)]
+
+    def rank(self, user_id: str) -> Optional[int]:
+        """1-based position of ``user_id``, or None if they have no entry."""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        total, seq = entry
+        return self._keys.index((-total, seq, user_id)) + 1
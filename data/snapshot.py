@@ -0,0 +1,146 @@
+import os
+import json
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+class Journal:
+    """Append-only log of ledger mutations, one JSON array per line.
+
+    Records (``seq`` is assigned here and strictly increasing)::
+
+        ["g", seq, user_id, amount, drop_name, created_at, guild_id]   gift recorded
+                                                  (journals from before guilds have no guild_id)
+        ["g", seq, user_id, amount, drop_name, created_at, guild_id, drop_id]   gift that claimed drop_id
+        ["d", seq, drop_id, channel_id, message_id, guild_id, drop_name, slot, expires_at]   drop posted
+        ["x", seq, drop_id]   drop message removed
+        ["w", seq, writer]   id of this journal, see ``data.writer``
+        ["a", seq, upto]   increment batch of gifts up to upto sent to storage
+        ["t", seq, upto]    deltas of every gift with seq <= upto reached Supabase
+        ["h", seq, upto]    history rows of every gift with seq <= upto reached Supabase
+        ["s", seq, name, title]   season started; later gifts belong to it
+        ["r", seq]          reset
+
+    Lines are written through to the OS on every append and fsynced in
+    batches of ``sync_every`` or whenever ``sync`` is called. With an
+    ``on_sync_due`` callback a full batch calls it instead of fsyncing in
+    ``append``, so the caller can run ``sync`` on another thread; ``sync``
+    doesn't hold the lock appends take while it waits on the disk.
+    """
+
+    def __init__(self, path: str, sync_every: int = 64, on_sync_due: Optional[Callable[[], None]] = None):
+        self.path = path
+        self.sync_every = sync_every
+        self.on_sync_due = on_sync_due
+        self.seq = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._unsynced = 0
+        self._sync_due = False  # on_sync_due was called and its sync hasn't run yet
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+
+    def append(self, kind: str, *fields) -> int:
+        with self._lock:
+            self._open()
+            self.seq += 1
+            self._file.write(json.dumps([kind, self.seq, *fields], separators=(",", ":")) + "\n")
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every and not self._sync_due:
+                if self.on_sync_due is None:
+                    self._sync()
+                else:
+                    self._sync_due = True
+                    self.on_sync_due()
+            return self.seq
+
+    def _sync(self):
+        # callers hold _lock
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._sync_due = False
+
+    def sync(self):
+        """fsync everything appended so far; appends made meanwhile don't wait for it."""
+        with self._lock:
+            self._sync_due = False
+            if self._file is None or not self._unsynced:
+                return
+            self._unsynced = 0
+            fd = os.dup(self._file.fileno())  # rotate or close may close the file meanwhile
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def rotate(self):
+        """Move the current journal aside so a snapshot can replace it.
+
+        If an older rotated journal is still around (a compaction died before
+        its snapshot landed) the current one is appended to it instead.
+        """
+        with self._lock:
+            self._sync()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if not os.path.exists(self.path):
+                return
+            rotated = self.path + ".old"
+            if os.path.exists(rotated):
+                with open(self.path, "r", encoding="utf-8") as src, open(rotated, "a", encoding="utf-8") as dst:
+                    dst.write(src.read())
+                os.remove(self.path)
+            else:
+                os.replace(self.path, rotated)
+
+    def discard_rotated(self):
+        try:
+            os.remove(self.path + ".old")
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        with self._lock:
+            self._sync()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_journal(path: str) -> Iterator[List[Any]]:
+    """Yield journal records, the rotated file first. Stops at a torn last line."""
+    for p in (path + ".old", path):
+        if not os.path.exists(p):
+            continue
+        with open(p, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    break
+
+
+def load_snapshot(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            snap = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if not isinstance(snap, dict) or "seq" not in snap:
+        return None
+    return snap
+
+
+def write_snapshot(path: str, snap: Dict[str, Any]):
+    """Write the snapshot to a temp file, fsync it and swap it in atomically."""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snap, f, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
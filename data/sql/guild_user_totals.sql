@@ -0,0 +1,20 @@
+-- Per-guild gift totals of one season, used by data.guild_async() to load a guild's leaderboard lazily.
+-- Needs the season column from seasons.sql.
+alter table gift_history add column if not exists guild_id text;
+drop index if exists gift_history_guild_user;
+create index if not exists gift_history_season_guild_user on gift_history (season, guild_id, user_id);
+
+-- One keyset page of (user_id, total) for a guild, ordered by user_id.
+drop function if exists guild_user_totals(text, text, int);
+create or replace function guild_user_totals(season text, gid text, after text, lim int)
+returns table (user_id text, total bigint)
+language sql
+stable
+as $$
+  select h.user_id, sum(h.amount)::bigint as total
+  from gift_history h
+  where h.season = $1 and h.guild_id = gid and h.user_id > after
+  group by h.user_id
+  order by h.user_id
+  limit lim;
+$$;
@@ -0,0 +1,35 @@
+-- Atomic per-user total increments used by data.flush_ledger().
+-- deltas: [{"season": "christmas-2025", "user_id": "123", "delta": 3}, ...],
+-- one entry per user and season. Needs the seasons.sql schema.
+-- batch_key names the flush ("<writer>:<journal seq>"); a batch resent after
+-- a timeout that had in fact committed is skipped, so the call is idempotent.
+create table if not exists ledger_batches (
+  batch      text primary key,
+  applied_at timestamptz not null default now()
+);
+create index if not exists ledger_batches_applied_at on ledger_batches (applied_at);
+
+drop function if exists increment_user_totals(jsonb);
+create or replace function increment_user_totals(deltas jsonb, batch_key text)
+returns table (season text, user_id text, total bigint)
+language plpgsql
+as $$
+#variable_conflict use_column
+begin
+  insert into ledger_batches (batch) values (batch_key) on conflict do nothing;
+  if not found then
+    return;
+  end if;
+  -- a batch is only ever resent until it lands, a week covers any outage
+  delete from ledger_batches where applied_at < now() - interval '7 days';
+
+  return query
+  insert into users as u (season, user_id, total, updated_at)
+  select d ->> 'season', d ->> 'user_id', (d ->> 'delta')::bigint, now()
+  from jsonb_array_elements(deltas) as d
+  on conflict (season, user_id) do update
+    set total = u.total + excluded.total,
+        updated_at = now()
+  returning u.season, u.user_id, u.total;
+end;
+$$;
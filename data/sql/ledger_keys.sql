@@ -0,0 +1,5 @@
+-- Idempotency key of gift_history rows written by data.flush_ledger().
+-- ledger_key is "<writer>:<journal seq>" (see data.writer); a batch insert
+-- retried after a timeout or 5xx skips the rows that already landed.
+alter table gift_history add column if not exists ledger_key text;
+create unique index if not exists gift_history_ledger_key on gift_history (ledger_key);
@@ -0,0 +1,39 @@
+-- First-class seasons: every users/gift_history row belongs to one season and
+-- data.start_season_async() switches the active one. Run once, before
+-- guild_user_totals.sql and increment_user_totals.sql.
+create table if not exists seasons (
+  name       text primary key,
+  title      text not null,
+  started_at timestamptz not null default now(),
+  ended_at   timestamptz,
+  summary    jsonb
+);
+-- at most one active season
+create unique index if not exists seasons_active on seasons ((true)) where ended_at is null;
+
+-- rows from before seasons belong to the first one (DEFAULT_SEASON)
+insert into seasons (name, title) values ('christmas-2025', 'Christmas 2025') on conflict do nothing;
+alter table users add column if not exists season text not null default 'christmas-2025';
+alter table gift_history add column if not exists season text not null default 'christmas-2025';
+alter table users alter column season drop default;
+alter table gift_history alter column season drop default;
+
+-- one users row per user and season
+alter table gift_history drop constraint if exists gift_history_user_id_fkey;
+alter table users drop constraint if exists users_pkey;
+alter table users add primary key (season, user_id);
+alter table gift_history add constraint gift_history_season_user_fkey
+  foreign key (season, user_id) references users (season, user_id);
+
+create index if not exists gift_history_season_id on gift_history (season, id);
+create index if not exists gift_history_season_user on gift_history (season, user_id, id);
+create index if not exists users_season_total on users (season, total);
+
+-- End the active season and start a new one in one transaction.
+create or replace function start_season(name text, title text, started_at timestamptz)
+returns void
+language sql
+as $$
+  update seasons set ended_at = $3 where ended_at is null;
+  insert into seasons (name, title, started_at) values ($1, $2, $3);
+$$;
@@ -0,0 +1,234 @@
+import os
+import json
+import sqlite3
+import datetime
+from typing import Any, Dict, List
+
+from .storage import DEFAULT_SEASON, StorageBackend
+
+SEASONS_TABLE = """
+CREATE TABLE IF NOT EXISTS seasons (
+    name       TEXT PRIMARY KEY,
+    title      TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    ended_at   TEXT,
+    summary    TEXT
+)"""
+USERS_TABLE = """
+CREATE TABLE IF NOT EXISTS users (
+    season     TEXT NOT NULL,
+    user_id    TEXT NOT NULL,
+    total      INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT,
+    PRIMARY KEY (season, user_id)
+)"""
+HISTORY_TABLE = """
+CREATE TABLE IF NOT EXISTS gift_history (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    season     TEXT NOT NULL,
+    user_id    TEXT NOT NULL,
+    amount     INTEGER NOT NULL,
+    drop_name  TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL,
+    guild_id   TEXT,
+    ledger_key TEXT,
+    FOREIGN KEY (season, user_id) REFERENCES users(season, user_id)
+)"""
+LEDGER_BATCHES_TABLE = """
+CREATE TABLE IF NOT EXISTS ledger_batches (
+    batch      TEXT PRIMARY KEY,
+    applied_at TEXT NOT NULL
+)"""
+# created after the season migration, files from before it have other columns
+INDEXES = """
+CREATE INDEX IF NOT EXISTS gift_history_season_id ON gift_history(season, id);
+CREATE INDEX IF NOT EXISTS gift_history_season_user ON gift_history(season, user_id, id);
+CREATE INDEX IF NOT EXISTS gift_history_season_guild_user ON gift_history(season, guild_id, user_id);
+CREATE INDEX IF NOT EXISTS users_total ON users(season, total);
+CREATE INDEX IF NOT EXISTS users_updated ON users(season, updated_at, user_id);
+CREATE UNIQUE INDEX IF NOT EXISTS gift_history_ledger_key ON gift_history(ledger_key);
+CREATE INDEX IF NOT EXISTS ledger_batches_applied ON ledger_batches(applied_at);
+"""
+
+# Fixed statement texts, so sqlite3 prepares each once and reuses it from the
+# connection's statement cache.
+SQL_USERS_FIRST = ("SELECT season, user_id, total, updated_at FROM users "
+                   "WHERE season = ? ORDER BY user_id LIMIT ?")
+SQL_USERS_AFTER = ("SELECT season, user_id, total, updated_at FROM users "
+                   "WHERE season = ? AND user_id > ? ORDER BY user_id LIMIT ?")
+SQL_CHANGED_USERS = ("SELECT user_id, total, updated_at FROM users "
+                     "WHERE season = ? AND (updated_at > ? OR (updated_at = ? AND user_id > ?)) "
+                     "ORDER BY updated_at, user_id LIMIT ?")
+SQL_HISTORY_AFTER = ("SELECT id, season, user_id, amount, drop_name, created_at, guild_id FROM gift_history "
+                     "WHERE season = ? AND id > ? ORDER BY id LIMIT ?")
+SQL_USER_HISTORY_BEFORE = ("SELECT id, amount, drop_name, created_at FROM gift_history "
+                           "WHERE season = ? AND user_id = ? AND id < ? ORDER BY id DESC LIMIT ?")
+SQL_USER_TOTAL = "SELECT total FROM users WHERE season = ? AND user_id = ?"
+SQL_GUILD_TOTALS = ("SELECT user_id, SUM(amount) AS total FROM gift_history "
+                    "WHERE season = ? AND guild_id = ? AND user_id > ? GROUP BY user_id ORDER BY user_id LIMIT ?")
+SQL_INCREMENT = ("INSERT INTO users (season, user_id, total, updated_at) SELECT ?, ?, ?, ? "
+                 "WHERE NOT EXISTS (SELECT 1 FROM ledger_batches WHERE batch = ?) "
+                 "ON CONFLICT(season, user_id) DO UPDATE SET total = total + excluded.total, "
+                 "updated_at = excluded.updated_at")
+SQL_APPLIED_BATCH = "INSERT OR IGNORE INTO ledger_batches (batch, applied_at) VALUES (?, ?)"
+SQL_PRUNE_BATCHES = "DELETE FROM ledger_batches WHERE applied_at < ?"
+SQL_INSERT_HISTORY = ("INSERT INTO gift_history (season, user_id, amount, drop_name, created_at, guild_id, ledger_key) "
+                      "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(ledger_key) DO NOTHING")
+SQL_ENSURE_USER = "INSERT OR IGNORE INTO users (season, user_id, total, updated_at) VALUES (?, ?, 0, ?)"
+SQL_UPSERT_TOTAL = ("INSERT INTO users (season, user_id, total, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(season, user_id) DO UPDATE SET total = excluded.total, updated_at = excluded.updated_at")
+SQL_SET_TOTAL = "UPDATE users SET total = ?, updated_at = ? WHERE season = ? AND user_id = ?"
+SQL_SEASONS = "SELECT name, title, started_at, ended_at, summary FROM seasons ORDER BY started_at"
+SQL_END_SEASON = "UPDATE seasons SET ended_at = ? WHERE ended_at IS NULL"
+SQL_START_SEASON = "INSERT INTO seasons (name, title, started_at) VALUES (?, ?, ?)"
+SQL_SEASON_SUMMARY = "UPDATE seasons SET summary = ? WHERE name = ?"
+
+_MAX_ID = 1 << 62  # keyset start for newest-first pages
+
+
+class SQLiteBackend(StorageBackend):
+    """Embedded single-node storage in one SQLite file.
+
+    WAL mode with ``synchronous=NORMAL`` lets reads run alongside the writer
+    and turns a commit into a WAL append without an fsync. Each batch write
+    is one transaction. Statements are sub-millisecond, so they run inline
+    on the data I/O loop; the connection is only ever used from that thread.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, cached_statements=64)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        for table in (SEASONS_TABLE, USERS_TABLE, HISTORY_TABLE, LEDGER_BATCHES_TABLE):
+            self.conn.execute(table)
+        if "season" not in {r["name"] for r in self.conn.execute("PRAGMA table_info(users)")}:
+            self._migrate_seasons()
+        if "ledger_key" not in {r["name"] for r in self.conn.execute("PRAGMA table_info(gift_history)")}:
+            self.conn.execute("ALTER TABLE gift_history ADD COLUMN ledger_key TEXT")
+        self.conn.executescript(INDEXES)
+
+    def _migrate_seasons(self):
+        """Rebuild a file from before seasons: every row goes to ``DEFAULT_SEASON``.
+
+        The users primary key becomes ``(season, user_id)``, which SQLite can
+        only do by copying both tables. Runs once, in one transaction.
+        """
+        history_columns = {r["name"] for r in self.conn.execute("PRAGMA table_info(gift_history)")}
+        guild_id = "guild_id" if "guild_id" in history_columns else "NULL"
+        cur = self.conn.cursor()
+        cur.execute("PRAGMA foreign_keys=OFF")
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            cur.execute("ALTER TABLE users RENAME TO users_old")
+            cur.execute("ALTER TABLE gift_history RENAME TO gift_history_old")
+            cur.execute(USERS_TABLE)
+            cur.execute(HISTORY_TABLE)
+            cur.execute("INSERT INTO users (season, user_id, total, updated_at) "
+                        "SELECT ?, user_id, total, updated_at FROM users_old", (DEFAULT_SEASON,))
+            cur.execute("INSERT INTO gift_history (id, season, user_id, amount, drop_name, created_at, guild_id) "
+                        f"SELECT id, ?, user_id, amount, drop_name, created_at, {guild_id} FROM gift_history_old",
+                        (DEFAULT_SEASON,))
+            cur.execute("DROP TABLE gift_history_old")
+            cur.execute("DROP TABLE users_old")
+            cur.execute("COMMIT")
+        except BaseException:
+            cur.execute("ROLLBACK")
+            raise
+        finally:
+            cur.execute("PRAGMA foreign_keys=ON")
+
+    def _write(self, *steps):
+        """Run ``(sql, params_seq)`` steps in one transaction: a batch lands whole or not at all."""
+        cur = self.conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, params in steps:
+                cur.executemany(sql, params)
+            cur.execute("COMMIT")
+        except BaseException:
+            cur.execute("ROLLBACK")
+            raise
+
+    def _read(self, sql: str, params: tuple) -> List[Dict[str, Any]]:
+        return [dict(r) for r in self.conn.execute(sql, params)]
+
+    async def fetch_users(self, after, limit, season):
+        if after is None:
+            return self._read(SQL_USERS_FIRST, (season, limit))
+        return self._read(SQL_USERS_AFTER, (season, after, limit))
+
+    async def fetch_changed_users(self, since, after, limit, season):
+        # "" sorts before every user id, so after=None also matches rows at exactly since
+        return self._read(SQL_CHANGED_USERS, (season, since, since, after or "", limit))
+
+    async def fetch_history(self, after, limit, season, user_ids=None):
+        after = -1 if after is None else after
+        if user_ids is None:
+            return self._read(SQL_HISTORY_AFTER, (season, after, limit))
+        marks = ",".join("?" * len(user_ids))
+        return self._read(
+            "SELECT id, season, user_id, amount, drop_name, created_at, guild_id FROM gift_history "
+            f"WHERE season = ? AND user_id IN ({marks}) AND id > ? ORDER BY id LIMIT ?",
+            (season, *user_ids, after, limit),
+        )
+
+    async def fetch_user_history(self, user_id, before, limit, season):
+        return self._read(SQL_USER_HISTORY_BEFORE, (season, user_id, _MAX_ID if before is None else before, limit))
+
+    async def fetch_user_total(self, user_id, season):
+        row = self.conn.execute(SQL_USER_TOTAL, (season, user_id)).fetchone()
+        return int(row["total"]) if row else None
+
+    async def fetch_guild_totals(self, after, limit, guild_id, season):
+        return [{"user_id": r["user_id"], "total": int(r["total"])}
+                for r in self._read(SQL_GUILD_TOTALS, (season, guild_id, after or "", limit))]
+
+    async def increment_totals(self, deltas, batch):
+        now = datetime.datetime.utcnow()
+        week_ago = (now - datetime.timedelta(days=7)).isoformat()
+        now = now.isoformat()
+        # the increments check the batch isn't recorded before the same transaction records it
+        self._write((SQL_INCREMENT, [(season, uid, d, now, batch) for season, season_deltas in deltas.items()
+                                     for uid, d in season_deltas.items()]),
+                    (SQL_APPLIED_BATCH, [(batch, now)]),
+                    (SQL_PRUNE_BATCHES, [(week_ago,)]))
+
+    async def insert_history(self, rows):
+        # same guarantee as the Supabase flush order: never a row without its user
+        first_seen = {(r["season"], r["user_id"]): r["created_at"] for r in reversed(rows)}
+        self._write(
+            (SQL_ENSURE_USER, [(season, uid, created_at) for (season, uid), created_at in first_seen.items()]),
+            (SQL_INSERT_HISTORY, [(r["season"], r["user_id"], r["amount"], r.get("drop_name") or "", r["created_at"],
+                                   r.get("guild_id"), r.get("ledger_key")) for r in rows]),
+        )
+
+    async def upsert_totals(self, rows):
+        self._write((SQL_UPSERT_TOTAL, [(r["season"], r["user_id"], r["total"], r.get("updated_at")) for r in rows]))
+
+    async def set_total(self, user_id, total, updated_at, season):
+        self._write((SQL_SET_TOTAL, [(total, updated_at, season, user_id)]))
+
+    async def fetch_seasons(self):
+        rows = self._read(SQL_SEASONS, ())
+        for r in rows:
+            r["summary"] = json.loads(r["summary"]) if r["summary"] else None
+        return rows
+
+    async def start_season(self, name, title, started_at):
+        self._write((SQL_END_SEASON, [(started_at,)]), (SQL_START_SEASON, [(name, title, started_at)]))
+
+    async def save_season_summary(self, name, summary):
+        self._write((SQL_SEASON_SUMMARY, [(json.dumps(summary, separators=(",", ":")), name)]))
+
+    async def clear(self):
+        self._write(("DELETE FROM gift_history", [()]), ("DELETE FROM users", [()]))
+
+    async def aclose(self):
+        self.conn.close()
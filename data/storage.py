@@ -0,0 +1,213 @@
+import os
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+
+from .client import AsyncPostgrest
+
+load_dotenv()
+
+STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "supabase")
+SQLITE_PATH: str = os.getenv("SQLITE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "gifts.sqlite3"))
+
+# Pooled HTTP client settings
+SUPABASE_MAX_CONNECTIONS: int = int(os.getenv("SUPABASE_MAX_CONNECTIONS", "20"))
+SUPABASE_CONCURRENCY: int = int(os.getenv("SUPABASE_CONCURRENCY", "10"))
+SUPABASE_TIMEOUT: float = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+SUPABASE_RETRIES: int = int(os.getenv("SUPABASE_RETRIES", "3"))
+
+# The season started when storage has none active yet; rows written before
+# seasons existed belong to it
+DEFAULT_SEASON: str = os.getenv("DEFAULT_SEASON", "christmas-2025")
+DEFAULT_SEASON_TITLE: str = os.getenv("DEFAULT_SEASON_TITLE", "Christmas 2025")
+
+
+class StorageBackend:
+    """Where ``users``, ``gift_history`` and ``seasons`` live.
+
+    Everything in ``data`` goes through these calls, which run on the data
+    I/O loop. ``users`` rows are ``{"season", "user_id", "total"}``, one per
+    user and season, and ``gift_history`` rows ``{"id", "season", "user_id",
+    "amount", "drop_name", "created_at", "guild_id"}``; user and guild ids
+    are strings, ``guild_id`` is None for gifts outside a guild. Reads are
+    scoped to one season. ``seasons`` rows are ``{"name", "title",
+    "started_at", "ended_at", "summary"}``; the active season is the one
+    without ``ended_at``.
+    """
+
+    name = "base"
+
+    async def fetch_users(self, after: Optional[str], limit: int, season: str) -> List[Dict[str, Any]]:
+        """One keyset page of ``{"season", "user_id", "total", "updated_at"}`` ordered by user_id."""
+        raise NotImplementedError
+
+    async def fetch_changed_users(self, since: str, after: Optional[str], limit: int,
+                                  season: str) -> List[Dict[str, Any]]:
+        """Users updated after ``(since, after)``, as ``{"user_id", "total", "updated_at"}`` ordered by that pair.
+
+        With ``after`` None every row with ``updated_at >= since`` qualifies.
+        """
+        raise NotImplementedError
+
+    async def fetch_history(self, after: Optional[int], limit: int, season: str,
+                            user_ids: List[str] = None) -> List[Dict[str, Any]]:
+        """One keyset page of history rows ordered by id, optionally for some users only."""
+        raise NotImplementedError
+
+    async def fetch_user_history(self, user_id: str, before: Optional[int], limit: int,
+                                 season: str) -> List[Dict[str, Any]]:
+        """One keyset page of a user's ``{"id", "amount", "drop_name", "created_at"}``, newest first."""
+        raise NotImplementedError
+
+    async def fetch_user_total(self, user_id: str, season: str) -> Optional[int]:
+        raise NotImplementedError
+
+    async def fetch_guild_totals(self, after: Optional[str], limit: int, guild_id: str,
+                                 season: str) -> List[Dict[str, Any]]:
+        """One keyset page of ``{"user_id", "total"}`` summed over the guild's history, ordered by user_id."""
+        raise NotImplementedError
+
+    async def increment_totals(self, deltas: Dict[str, Dict[str, int]], batch: str):
+        """Atomically add ``{season: {user_id: delta}}`` to ``users.total``, creating missing users.
+
+        ``batch`` names the call; a batch that was already applied is skipped,
+        so a call that timed out can be sent again.
+        """
+        raise NotImplementedError
+
+    async def insert_history(self, rows: List[Dict[str, Any]]):
+        """Insert history rows, skipping any whose ``ledger_key`` is already stored."""
+        raise NotImplementedError
+
+    async def upsert_totals(self, rows: List[Dict[str, Any]]):
+        """Overwrite ``{"season", "user_id", "total", "updated_at"}`` rows."""
+        raise NotImplementedError
+
+    async def set_total(self, user_id: str, total: int, updated_at: str, season: str):
+        raise NotImplementedError
+
+    async def fetch_seasons(self) -> List[Dict[str, Any]]:
+        """Every season, oldest first."""
+        raise NotImplementedError
+
+    async def start_season(self, name: str, title: str, started_at: str):
+        """End the active season and start ``name``, in one transaction."""
+        raise NotImplementedError
+
+    async def save_season_summary(self, name: str, summary: Dict[str, Any]):
+        raise NotImplementedError
+
+    async def clear(self):
+        """Delete every history row and user, of every season."""
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+
+class SupabaseBackend(StorageBackend):
+    """Supabase over its REST API, through the pooled ``AsyncPostgrest`` client."""
+
+    name = "supabase"
+
+    def __init__(self, client: AsyncPostgrest):
+        self.client = client
+
+    async def fetch_users(self, after, limit, season):
+        keyset = (("user_id", "gt", after),) if after is not None else ()
+        return await self.client.select("users", "season, user_id, total, updated_at", ("season", "eq", season),
+                                        *keyset, order="user_id", limit=limit)
+
+    async def fetch_changed_users(self, since, after, limit, season):
+        if after is None:
+            keyset = ("updated_at", "gte", since)
+        else:
+            keyset = ("or", "or", f'updated_at.gt."{since}",and(updated_at.eq."{since}",user_id.gt."{after}")')
+        # the client appends the direction to the last column only; both sort ascending
+        return await self.client.select("users", "user_id, total, updated_at", ("season", "eq", season), keyset,
+                                        order="updated_at,user_id", limit=limit)
+
+    async def fetch_history(self, after, limit, season, user_ids=None):
+        filters = [("season", "eq", season)]
+        if user_ids is not None:
+            filters.append(("user_id", "in", user_ids))
+        if after is not None:
+            filters.append(("id", "gt", after))
+        return await self.client.select("gift_history", "id, season, user_id, amount, drop_name, created_at, guild_id",
+                                        *filters, order="id", limit=limit)
+
+    async def fetch_user_history(self, user_id, before, limit, season):
+        keyset = (("id", "lt", before),) if before is not None else ()
+        return await self.client.select("gift_history", "id, amount, drop_name, created_at",
+                                        ("season", "eq", season), ("user_id", "eq", user_id), *keyset,
+                                        order="id", desc=True, limit=limit)
+
+    async def fetch_user_total(self, user_id, season):
+        rows = await self.client.select("users", "total", ("season", "eq", season), ("user_id", "eq", user_id))
+        return int(rows[0]["total"]) if rows else None
+
+    async def fetch_guild_totals(self, after, limit, guild_id, season):
+        # see data/sql/guild_user_totals.sql
+        return await self.client.rpc("guild_user_totals", {"season": season, "gid": guild_id,
+                                                           "after": after or "", "lim": limit},
+                                     idempotent=True) or []
+
+    async def increment_totals(self, deltas, batch):
+        # see data/sql/increment_user_totals.sql; keyed by batch, so retrying is safe
+        await self.client.rpc("increment_user_totals", {
+            "deltas": [{"season": season, "user_id": uid, "delta": d}
+                       for season, season_deltas in deltas.items() for uid, d in season_deltas.items()],
+            "batch_key": batch,
+        }, idempotent=True)
+
+    async def insert_history(self, rows):
+        # see data/sql/ledger_keys.sql
+        await self.client.insert("gift_history", rows, on_conflict="ledger_key")
+
+    async def upsert_totals(self, rows):
+        await self.client.upsert("users", rows, on_conflict="season,user_id")
+
+    async def set_total(self, user_id, total, updated_at, season):
+        await self.client.update("users", {"total": total, "updated_at": updated_at},
+                                 ("season", "eq", season), ("user_id", "eq", user_id))
+
+    async def fetch_seasons(self):
+        return await self.client.select("seasons", "name, title, started_at, ended_at, summary", order="started_at")
+
+    async def start_season(self, name, title, started_at):
+        # see data/sql/seasons.sql
+        await self.client.rpc("start_season", {"name": name, "title": title, "started_at": started_at})
+
+    async def save_season_summary(self, name, summary):
+        await self.client.update("seasons", {"summary": summary}, ("name", "eq", name))
+
+    async def clear(self):
+        # PostgREST refuses unfiltered deletes
+        await self.client.delete("gift_history", ("id", "not.is", "null"))
+        await self.client.delete("users", ("user_id", "not.is", "null"))
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def create_backend(name: str = None) -> StorageBackend:
+    """Build the backend named by ``name`` or ``STORAGE_BACKEND`` ("supabase" or "sqlite")."""
+    name = (name or STORAGE_BACKEND).lower()
+
+    if name == "sqlite":
+        from .sqlite_backend import SQLiteBackend
+        return SQLiteBackend(SQLITE_PATH)
+
+    if name == "supabase":
+        url = os.getenv("PUBLIC_SUPABASE_URL")
+        key = os.getenv("PUBLIC_SUPABASE_ANON_KEY")
+        if not url or not key:
+            raise RuntimeError("Supabase credentials not set in environment variables.")
+        return SupabaseBackend(AsyncPostgrest(
+            url, key,
+            max_connections=SUPABASE_MAX_CONNECTIONS,
+            concurrency=SUPABASE_CONCURRENCY,
+            timeout=SUPABASE_TIMEOUT,
+            retries=SUPABASE_RETRIES,
+        ))
+
+    raise RuntimeError(f"Unknown STORAGE_BACKEND {name!r}, expected 'supabase' or 'sqlite'.")
@@ -0,0 +1,162 @@
+"""Sharded launch: N bot worker processes, each running a slice of the gateway shards.
+
+    SHARD_COUNT=8 WORKERS=4 python launcher.py
+
+Worker ``i`` runs ``bot.py`` with the shards ``s`` where ``s % WORKERS == i``
+and its own snapshot/journal files. Workers share the gift ledger through the
+storage backend (Supabase, or one SQLite file on a single host) and pick up
+each other's writes every SHARED_SYNC_INTERVAL seconds. Crashed workers are
+restarted with backoff, and ``/healthz`` on WEB_PORT combines every worker's
+own ``/healthz``.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import asyncio
+from typing import Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "2"))
+WORKERS = max(1, min(int(os.getenv("WORKERS", "2")), SHARD_COUNT))
+WEB_PORT = int(os.getenv("WEB_PORT", "10000"))  # combined health; worker i uses WEB_PORT + 1 + i
+SHARED_SYNC_INTERVAL = os.getenv("SHARED_SYNC_INTERVAL", "5")
+RESTART_BACKOFF_CAP = float(os.getenv("RESTART_BACKOFF_CAP", "60"))
+HEALTHY_UPTIME = 60  # a worker that ran this long gets its backoff reset
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py")
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+class Worker:
+    def __init__(self, index: int, shard_ids: List[int]):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.port = WEB_PORT + 1 + index
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.last_exit: Optional[int] = None
+
+    def env(self) -> Dict[str, str]:
+        env = dict(os.environ)
+        env.update({
+            "SHARD_COUNT": str(SHARD_COUNT),
+            "SHARD_IDS": ",".join(map(str, self.shard_ids)),
+            "WORKER_ID": str(self.index),
+            "WEB_PORT": str(self.port),
+            "SHARED_SYNC_INTERVAL": SHARED_SYNC_INTERVAL,
+            # the caches are per process, so are their snapshot and journal
+            "SNAPSHOT_PATH": os.path.join(DATA_DIR, f"gifts_data.w{self.index}.json"),
+            "JOURNAL_PATH": os.path.join(DATA_DIR, f"gifts_journal.w{self.index}.jsonl"),
+        })
+        return env
+
+    async def start(self):
+        self.proc = await asyncio.create_subprocess_exec(sys.executable, BOT_SCRIPT, env=self.env())
+        self.started_at = time.monotonic()
+        print(f"🚀 Worker {self.index} started (pid {self.proc.pid}, shards {self.shard_ids}, port {self.port})")
+
+    def stop(self):
+        if self.proc is not None and self.proc.returncode is None:
+            self.proc.send_signal(signal.SIGINT)  # lets data flush its ledger at exit
+
+    async def supervise(self, stopping: asyncio.Event):
+        backoff = 1.0
+        while not stopping.is_set():
+            await self.start()
+            self.last_exit = await self.proc.wait()
+            if stopping.is_set():
+                return
+            if time.monotonic() - self.started_at > HEALTHY_UPTIME:
+                backoff = 1.0
+            self.restarts += 1
+            print(f"⚠️ Worker {self.index} exited with code {self.last_exit}, restarting in {backoff:.0f}s")
+            try:
+                await asyncio.wait_for(stopping.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+            backoff = min(backoff * 2, RESTART_BACKOFF_CAP)
+
+    async def health(self, http: httpx.AsyncClient) -> Dict:
+        status = {
+            "worker": self.index,
+            "shards": self.shard_ids,
+            "pid": self.proc.pid if self.proc else None,
+            "running": self.proc is not None and self.proc.returncode is None,
+            "restarts": self.restarts,
+            "last_exit": self.last_exit,
+            "ready": False,
+        }
+        if status["running"]:
+            try:
+                resp = await http.get(f"http://127.0.0.1:{self.port}/healthz")
+                status.update(resp.json())
+            except Exception as e:
+                status["error"] = str(e)
+        return status
+
+
+def assign_shards(shard_count: int, workers: int) -> List[List[int]]:
+    return [[s for s in range(shard_count) if s % workers == i] for i in range(workers)]
+
+
+async def serve_health(workers: List[Worker]):
+    http = httpx.AsyncClient(timeout=2.0)
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = (await reader.readline()).decode(errors="replace")
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass  # skip headers
+            path = request_line.split(" ")[1] if " " in request_line else "/"
+            if path.startswith("/healthz"):
+                statuses = await asyncio.gather(*(w.health(http) for w in workers))
+                healthy = all(s["ready"] for s in statuses)
+                body = json.dumps({"healthy": healthy, "shard_count": SHARD_COUNT, "workers": statuses})
+                status, ctype = ("200 OK" if healthy else "503 Service Unavailable"), "application/json"
+            else:
+                body, status, ctype = "✅ Launcher is alive!", "200 OK", "text/plain; charset=utf-8"
+            data = body.encode()
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {ctype}\r\nContent-Length: {len(data)}\r\n"
+                         f"Connection: close\r\n\r\n".encode() + data)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "0.0.0.0", WEB_PORT)
+
+
+async def main():
+    workers = [Worker(i, shards) for i, shards in enumerate(assign_shards(SHARD_COUNT, WORKERS))]
+    stopping = asyncio.Event()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stopping.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    server = await serve_health(workers)
+    print(f"🤖 Launching {WORKERS} worker(s) for {SHARD_COUNT} shard(s), health on port {WEB_PORT}")
+    supervisors = [asyncio.create_task(w.supervise(stopping)) for w in workers]
+
+    await stopping.wait()
+    print("🛑 Stopping workers...")
+    for w in workers:
+        w.stop()
+    await asyncio.wait(supervisors, timeout=30)
+    for w in workers:
+        if w.proc is not None and w.proc.returncode is None:
+            w.proc.kill()
+    server.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from utils.drop_rate import RateWindow
+
+
+class ChannelActivity:
+    """Message rate and drop state for one channel.
+
+    ``rate`` holds the messages and speakers of the last ``window`` seconds
+    that passed the same-user cooldown; ``drops`` counts the drops of the
+    last hour, to compare with what the drop model aims for.
+    """
+
+    __slots__ = ("rate", "drops", "user_last_message", "last_drop", "last_seen")
+
+    def __init__(self, window: float = 300):
+        self.rate = RateWindow(window)
+        self.drops = RateWindow(3600, 12, max_speakers=0)
+        self.user_last_message = OrderedDict()  # user_id -> time, oldest first
+        self.last_drop = 0
+        self.last_seen = 0
+
+    def record_message(self, user_id, now: float):
+        self.rate.record(user_id, now)
+
+    def record_drop(self, now: float):
+        self.last_drop = now
+        self.drops.record(None, now)
+
+    def on_cooldown(self, user_id, now: float, cooldown: float) -> bool:
+        """Same-user rate limit; forgets users whose cooldown has passed."""
+        last = self.user_last_message
+        while last:
+            uid, ts = next(iter(last.items()))
+            if now - ts < cooldown:
+                break
+            last.popitem(last=False)
+        if user_id in last:
+            return True
+        last[user_id] = now
+        return False
+
+
+class ActivityTracker:
+    """Per-channel ``ChannelActivity`` with idle-channel eviction.
+
+    Channels are kept in least-recently-active order, so each touch evicts
+    whatever has been idle longer than ``ttl`` seconds in amortized O(1).
+    Each channel's rate is measured over the last ``window`` seconds.
+    """
+
+    def __init__(self, ttl: float = 1800, window: float = 300):
+        self.ttl = ttl
+        self.window = window
+        self._channels = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._channels)
+
+    def __iter__(self):
+        return iter(self._channels.items())
+
+    def get(self, channel_id) -> Optional[ChannelActivity]:
+        return self._channels.get(channel_id)
+
+    def channel(self, channel_id, now: float = None) -> ChannelActivity:
+        now = time.time() if now is None else now
+        state = self._channels.get(channel_id)
+        if state is None:
+            state = self._channels[channel_id] = ChannelActivity(self.window)
+        else:
+            self._channels.move_to_end(channel_id)
+        state.last_seen = now
+        self.evict(now)
+        return state
+
+    def evict(self, now: float = None) -> int:
+        now = time.time() if now is None else now
+        evicted = 0
+        channels = self._channels
+        while channels:
+            channel_id, state = next(iter(channels.items()))
+            if now - state.last_seen < self.ttl:
+                break
+            channels.popitem(last=False)
+            evicted += 1
+        return evicted
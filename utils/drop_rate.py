@@ -0,0 +1,137 @@
+from collections import OrderedDict
+from typing import Dict
+
+
+class RateWindow:
+    """Messages and distinct speakers of one channel over the last ``window`` seconds.
+
+    Messages are counted in a ring of ``buckets`` time slices plus a running
+    total; recording or reading first retires the slices that fell out of the
+    window, so both are O(1) amortized (never more than ``buckets`` steps).
+    Speakers are user id -> last message time, oldest first, trimmed from the
+    old end and capped at ``max_speakers``. Memory per channel is fixed.
+    """
+
+    __slots__ = ("window", "width", "counts", "head", "head_start", "total", "started",
+                 "speakers", "max_speakers")
+
+    def __init__(self, window: float = 300, buckets: int = 30, max_speakers: int = 64):
+        self.window = window
+        self.width = window / buckets
+        self.counts = [0] * buckets
+        self.head = 0  # slice the current time falls in
+        self.head_start = 0.0  # start time of that slice
+        self.total = 0
+        self.started = 0.0  # first message since the window was last empty
+        self.speakers: "OrderedDict[int, float]" = OrderedDict()
+        self.max_speakers = max_speakers
+
+    def _advance(self, now: float):
+        steps = int((now - self.head_start) // self.width)
+        if steps <= 0:
+            return
+        counts = self.counts
+        if steps >= len(counts):
+            for i in range(len(counts)):
+                counts[i] = 0
+            self.total = 0
+            self.head = (self.head + steps) % len(counts)
+        else:
+            for _ in range(steps):
+                self.head = (self.head + 1) % len(counts)
+                self.total -= counts[self.head]
+                counts[self.head] = 0
+        self.head_start += steps * self.width
+
+    def _trim_speakers(self, now: float):
+        speakers = self.speakers
+        while speakers:
+            ts = next(iter(speakers.values()))
+            if now - ts < self.window:
+                break
+            speakers.popitem(last=False)
+
+    def record(self, user_id, now: float):
+        self._advance(now)
+        if not self.total:
+            self.started = now
+        self.counts[self.head] += 1
+        self.total += 1
+        if self.max_speakers:
+            speakers = self.speakers
+            speakers[user_id] = now
+            speakers.move_to_end(user_id)
+            if len(speakers) > self.max_speakers:
+                speakers.popitem(last=False)
+            self._trim_speakers(now)
+
+    def messages(self, now: float) -> int:
+        self._advance(now)
+        return self.total
+
+    def speaker_count(self, now: float) -> int:
+        self._trim_speakers(now)
+        return len(self.speakers)
+
+    def per_hour(self, now: float) -> float:
+        """Messages per hour over the window, or over the time since the window was last empty if shorter."""
+        total = self.messages(now)
+        if not total:
+            return 0.0
+        covered = self.window - self.width + (now - self.head_start)
+        span = max(min(covered, now - self.started), self.width)
+        return total * 3600 / span
+
+
+class DropRateModel:
+    """Per-message drop chance that aims at a number of drops per hour in each channel.
+
+    A channel with fewer than ``min_speakers`` distinct speakers or
+    ``min_messages`` messages in its window gets no drops. Otherwise its
+    target is ``per_hour`` plus ``per_speaker`` for every speaker beyond
+    ``min_speakers``, capped at ``max_per_hour``, and each message rolls
+    ``target / messages per hour`` (at most ``max_chance``). A channel posting
+    20 messages an hour and one posting 2000 both expect their target; the
+    busy one just can't farm more drops by chatting faster. The rate is
+    raised slightly for the ``cooldown`` after each drop, when no roll happens.
+    """
+
+    def __init__(self, per_hour: float = 6, per_speaker: float = 2, max_per_hour: float = 20,
+                 min_speakers: int = 2, min_messages: int = 5, max_chance: float = 0.8, cooldown: float = 10):
+        self.per_hour = per_hour
+        self.per_speaker = per_speaker
+        self.max_per_hour = max_per_hour
+        self.min_speakers = min_speakers
+        self.min_messages = min_messages
+        self.max_chance = max_chance
+        self.cooldown = cooldown
+
+    def target(self, speakers: int) -> float:
+        """Drops per hour aimed at for a channel with ``speakers`` people talking."""
+        if speakers < self.min_speakers:
+            return 0.0
+        return min(self.per_hour + self.per_speaker * (speakers - self.min_speakers), self.max_per_hour)
+
+    def chance(self, rate: RateWindow, now: float) -> float:
+        messages = rate.messages(now)
+        if messages < self.min_messages:
+            return 0.0
+        target = self.target(rate.speaker_count(now))
+        if not target:
+            return 0.0
+        # 1/n of a Poisson count overshoots 1/mean on quiet channels, 1/(n+1) doesn't
+        per_hour = rate.per_hour(now) * (messages + 1) / messages
+        # share of the hour spent in post-drop cooldowns, where messages don't roll
+        rolling = max(1 - target * self.cooldown / 3600, 0.1)
+        return min(target / (per_hour * rolling), self.max_chance)
+
+    def describe(self, rate: RateWindow, now: float) -> Dict[str, float]:
+        """Current inputs and output of the model for one channel, for tuning."""
+        speakers = rate.speaker_count(now)
+        return {
+            "messages": rate.messages(now),
+            "messages_per_hour": rate.per_hour(now),
+            "speakers": speakers,
+            "target_per_hour": self.target(speakers),
+            "chance": self.chance(rate, now),
+        }
@@ -0,0 +1,270 @@
+"""Drop tables loaded from JSON files and compiled into alias-method samplers.
+
+DROP_TABLES_DIR holds:
+
+    default.json               the base table
+    season.<name>.json         seasonal variant, used while today is in its "window"
+    guild.<guild_id>.json      per-guild override, applied on top of the base/season table
+
+A table file looks like::
+
+    {
+      "window": ["12-24", "12-26"],        # seasons only, MM-DD inclusive, may wrap the new year
+      "replace": false,                    # true: don't inherit the base table's drops
+      "fallback_message": "...",
+      "drops": [
+        {"name": "Santa Claus", "emoji": "🎅", "gifts": 3, "weight": 10, "message": "..."}
+      ]
+    }
+
+Drops in a variant are merged by name onto the table they extend (so
+``{"name": "Coal", "weight": 0}`` turns coal off), new names are added.
+DROP_SEASON forces a season regardless of the date.
+"""
+import os
+import json
+import random
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+DROP_TABLES_DIR = os.getenv("DROP_TABLES_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "drop_tables"))
+DROP_SEASON = os.getenv("DROP_SEASON", "")
+DROP_FIELDS = ("name", "emoji", "gifts", "weight", "message")
+# gift history keeps amounts as int8 (data/history_store.py)
+GIFTS_MIN, GIFTS_MAX = -128, 127
+
+
+class DropTableError(ValueError):
+    pass
+
+
+class Drop:
+    """One compiled drop; ``result_text`` is the claim line after the winner's mention."""
+
+    __slots__ = ("name", "emoji", "gifts", "weight", "message", "result_text")
+
+    def __init__(self, name: str, emoji: str, gifts: int, weight: float, message: str):
+        self.name = name
+        self.emoji = emoji
+        self.gifts = gifts
+        self.weight = weight
+        self.message = message
+        self.result_text = (
+            f"claimed the {emoji} **{name}**! {message} **`{'+' if gifts > 0 else ''}{gifts}`**🎁"
+        )
+
+    def __repr__(self):
+        return f"Drop({self.name!r}, gifts={self.gifts}, weight={self.weight})"
+
+
+class CompiledTable:
+    """Walker/Vose alias table: one ``random()`` call and two list reads per sample."""
+
+    __slots__ = ("name", "drops", "_prob", "_alias", "_n")
+
+    def __init__(self, name: str, drops: List[Drop]):
+        drops = [d for d in drops if d.weight > 0]
+        if not drops:
+            raise DropTableError(f"{name}: no drop has a positive weight")
+        n = len(drops)
+        total = sum(d.weight for d in drops)
+        scaled = [d.weight * n / total for d in drops]
+        prob = [1.0] * n
+        alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # whatever is left is 1.0 up to rounding
+        self.name = name
+        self.drops = tuple(drops)
+        self._prob = prob
+        self._alias = alias
+        self._n = n
+
+    def sample(self, rand=random.random) -> Drop:
+        u = rand() * self._n
+        i = int(u)
+        return self.drops[i if u - i < self._prob[i] else self._alias[i]]
+
+    def get(self, name: str) -> Optional[Drop]:
+        return next((d for d in self.drops if d.name == name), None)
+
+    def probabilities(self) -> Dict[str, float]:
+        """Configured probability per drop name."""
+        total = sum(d.weight for d in self.drops)
+        return {d.name: d.weight / total for d in self.drops}
+
+
+def _parse_window(name: str, window) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+    """``["MM-DD", "MM-DD"]`` as ``(month, day)`` pairs."""
+    try:
+        start, end = (tuple(int(p) for p in s.split("-")) for s in window)
+        for month, day in (start, end):
+            date(2000, month, day)  # a leap year, so 02-29 is fine
+    except (AttributeError, TypeError, ValueError):
+        raise DropTableError(f"{name}: bad window {window!r}, expected [\"MM-DD\", \"MM-DD\"]") from None
+    return start, end
+
+
+def _in_window(window: Tuple[Tuple[int, int], Tuple[int, int]], today: date) -> bool:
+    start, end = window
+    day = (today.month, today.day)
+    return start <= day <= end if start <= end else day >= start or day <= end
+
+
+def _merge(name: str, base: List[Dict], spec: Dict) -> List[Dict]:
+    drops = [] if spec.get("replace") else [dict(d) for d in base]
+    by_name = {d["name"]: d for d in drops}
+    for entry in spec.get("drops", []):
+        if "name" not in entry:
+            raise DropTableError(f"{name}: drop without a name")
+        unknown = set(entry) - set(DROP_FIELDS)
+        if unknown:
+            raise DropTableError(f"{name}: unknown field(s) {sorted(unknown)} on {entry['name']}")
+        if entry["name"] in by_name:
+            by_name[entry["name"]].update(entry)
+        else:
+            by_name[entry["name"]] = dict(entry)
+            drops.append(by_name[entry["name"]])
+    return drops
+
+
+def _compile(name: str, drops: List[Dict], fallback: str) -> CompiledTable:
+    compiled = []
+    for d in drops:
+        try:
+            compiled.append(Drop(d["name"], d["emoji"], int(d["gifts"]), float(d["weight"]),
+                                 d.get("message") or fallback))
+        except (KeyError, TypeError, ValueError) as e:
+            raise DropTableError(f"{name}: bad drop {d.get('name')!r}: {e}") from None
+        if not GIFTS_MIN <= compiled[-1].gifts <= GIFTS_MAX:
+            raise DropTableError(f"{name}: drop {d['name']!r} gives {compiled[-1].gifts} gifts, "
+                                 f"outside {GIFTS_MIN}..{GIFTS_MAX}")
+    return CompiledTable(name, compiled)
+
+
+class _State:
+    """Everything one reload produced; swapped in as a whole."""
+
+    __slots__ = ("season", "base", "guilds", "stamp")
+
+    def __init__(self, season: Optional[str], base: CompiledTable, guilds: Dict[int, CompiledTable], stamp):
+        self.season = season
+        self.base = base
+        self.guilds = guilds
+        self.stamp = stamp
+
+
+class DropTables:
+    """The drop tables in ``directory``, recompiled when the files or the season change.
+
+    ``sample(guild_id)`` only reads ``self._state``; ``reload()`` builds a new
+    state off to the side and replaces it in one assignment, and keeps the old
+    one if any file fails to parse or validate.
+    """
+
+    def __init__(self, directory: str = DROP_TABLES_DIR, season: str = DROP_SEASON):
+        self.directory = directory
+        self.forced_season = season or None
+        self._state: Optional[_State] = None
+        self.reload()
+
+    # --- SAMPLING ---
+    def table(self, guild_id: Optional[int] = None) -> CompiledTable:
+        state = self._state
+        return state.guilds.get(guild_id, state.base)
+
+    def sample(self, guild_id: Optional[int] = None) -> Drop:
+        return self.table(guild_id).sample()
+
+    @property
+    def season(self) -> Optional[str]:
+        return self._state.season
+
+    # --- LOADING ---
+    def _stamp(self) -> Tuple:
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+        except FileNotFoundError:
+            return ()
+        return tuple(sorted((e.name, st.st_mtime_ns, st.st_size) for e in entries for st in (e.stat(),)))
+
+    def _read(self, filename: str) -> Dict:
+        path = os.path.join(self.directory, filename)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                spec = json.load(f)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise DropTableError(f"{filename}: {e}") from None
+        if not isinstance(spec, dict) or not isinstance(spec.get("drops", []), list):
+            raise DropTableError(f"{filename}: expected an object with a \"drops\" list")
+        return spec
+
+    def _active_season(self, seasons: Dict[str, Dict], today: date) -> Optional[str]:
+        # every window is checked, not only the forced or active season's
+        windows = {name: _parse_window(f"season.{name}.json", spec["window"])
+                   for name, spec in seasons.items() if spec.get("window")}
+        if self.forced_season:
+            return self.forced_season if self.forced_season in seasons else None
+        for name in sorted(windows):
+            if _in_window(windows[name], today):
+                return name
+        return None
+
+    def _build(self, stamp, today: date) -> _State:
+        files = [name for name, _, _ in stamp]
+        if "default.json" not in files:
+            raise DropTableError(f"no default.json in {self.directory}")
+        default = self._read("default.json")
+        seasons = {f[len("season."):-len(".json")]: self._read(f) for f in files if f.startswith("season.")}
+        guilds = {}
+        for f in files:
+            if f.startswith("guild."):
+                gid = f[len("guild."):-len(".json")]
+                if not gid.isdigit():
+                    raise DropTableError(f"{f}: expected guild.<guild id>.json")
+                guilds[int(gid)] = self._read(f)
+
+        season = self._active_season(seasons, today)
+        fallback = default.get("fallback_message", "You found something interesting!")
+        base_drops = _merge("default.json", [], default)
+        base_name = "default"
+        if season:
+            spec = seasons[season]
+            base_drops = _merge(f"season.{season}.json", base_drops, spec)
+            fallback = spec.get("fallback_message", fallback)
+            base_name = f"season.{season}"
+        base = _compile(base_name, base_drops, fallback)
+        compiled_guilds = {
+            gid: _compile(f"guild.{gid}", _merge(f"guild.{gid}.json", base_drops, spec),
+                          spec.get("fallback_message", fallback))
+            for gid, spec in guilds.items()
+        }
+        return _State(season, base, compiled_guilds, (stamp, today))
+
+    def reload(self, force: bool = False) -> bool:
+        """Recompile if a file or today's season changed; True if new tables are live.
+
+        Raises ``DropTableError`` on the first load; later bad edits are
+        reported and the tables already in use stay.
+        """
+        stamp, today = self._stamp(), date.today()
+        state = self._state
+        if not force and state is not None and state.stamp[0] == stamp and state.stamp[1] == today:
+            return False
+        try:
+            new = self._build(stamp, today)
+        except (OSError, DropTableError) as e:
+            if state is None:
+                raise
+            print(f"⚠️ Drop tables not reloaded, keeping the current ones: {e}")
+            return False
+        self._state = new
+        if state is not None and (state.stamp[0] != stamp or state.season != new.season):
+            print(f"🎁 Drop tables reloaded (season: {new.season or 'none'}, guild overrides: {len(new.guilds)})")
+        return True
@@ -0,0 +1,188 @@
+import bisect
+import math
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# latency buckets in seconds, 100us .. 10s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY: List["Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names: Sequence[str], values: Sequence[str], extra: Tuple[str, str] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A named metric family, Prometheus text format.
+
+    Children per label-value tuple are created on first ``labels()`` call;
+    a metric without labels has a single child used by ``inc``/``observe``/``set``.
+    Updates are plain attribute writes, cheap enough for the message hot path.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), register: bool = True):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if register:
+            REGISTRY.append(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        return [f"{self.name}{_label_str(self.labelnames, k)} {_fmt(c.value)}" for k, c in self._children.items()]
+
+
+class _GaugeChild:
+    __slots__ = ("value", "fn")
+
+    def __init__(self):
+        self.value = 0
+        self.fn = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def set_function(self, fn: Callable[[], float]):
+        """Read the value from ``fn`` at scrape time instead."""
+        self.fn = fn
+
+    def get(self) -> float:
+        return self.fn() if self.fn is not None else self.value
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def set_function(self, fn: Callable[[], float]):
+        self.labels().set_function(fn)
+
+    def samples(self):
+        out = []
+        for k, c in self._children.items():
+            try:
+                value = c.get()
+            except Exception:
+                continue  # a broken callback shouldn't take the whole scrape down
+            out.append(f"{self.name}{_label_str(self.labelnames, k)} {_fmt(value)}")
+        return out
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS, register: bool = True):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, register)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self):
+        out = []
+        for k, c in self._children.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), c.counts):
+                cumulative += n
+                out.append(f"{self.name}_bucket{_label_str(self.labelnames, k, ('le', _fmt(bound)))} {cumulative}")
+            out.append(f"{self.name}_sum{_label_str(self.labelnames, k)} {_fmt(c.sum)}")
+            out.append(f"{self.name}_count{_label_str(self.labelnames, k)} {c.count}")
+        return out
+
+
+def render(registry: List[Metric] = None) -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    return "\n".join(m.render() for m in (REGISTRY if registry is None else registry)) + "\n"
+
+
+# --- BOT METRICS ---
+ON_MESSAGE_SECONDS = Histogram("sylcore_on_message_seconds", "ChristmasEvent.on_message handler latency")
+DROPS_SPAWNED = Counter("sylcore_drops_spawned_total", "Gift drops posted")
+DROPS_CLAIMED = Counter("sylcore_drops_claimed_total", "Gift drops claimed", ("drop",))
+RECORD_GIFT_SECONDS = Histogram("sylcore_record_gift_seconds", "data.record_gift latency")
+STORAGE_SECONDS = Histogram("sylcore_storage_call_seconds", "Storage backend call latency", ("backend", "op"))
+STORAGE_ERRORS = Counter("sylcore_storage_call_errors_total", "Storage backend calls that raised", ("backend", "op"))
+WRITE_QUEUE_DEPTH = Gauge("sylcore_write_queue_depth", "Gift history rows waiting for the next ledger flush")
+LOOP_LAG_SECONDS = Histogram("sylcore_event_loop_lag_seconds", "How late the bot event loop runs a timer")
+CACHE_SIZE = Gauge("sylcore_cache_entries", "Entries in in-memory caches", ("cache",))
+OUTBOUND_QUEUE_SECONDS = Histogram("sylcore_outbound_queue_seconds", "Time a message send/edit/delete waited in the outbound queue", ("action",))
+OUTBOUND_COALESCED = Counter("sylcore_outbound_coalesced_total", "Message edits merged into an already queued edit")
+OUTBOUND_PENDING = Gauge("sylcore_outbound_pending", "Message actions waiting in the outbound queue")
@@ -0,0 +1,186 @@
+import time
+import asyncio
+import itertools
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils import metrics
+
+# lower runs first
+CLAIM_EDIT = 0
+EDIT = 1
+POST = 2
+DELETE = 3
+
+# (capacity, seconds) per channel and route, kept a bit under Discord's limits;
+# discord.py still handles any 429 that gets through
+DEFAULT_BUCKETS = {
+    "post": (5, 5.0),
+    "edit": (5, 5.0),
+    "delete": (5, 1.0),
+}
+GLOBAL_BUCKET = (45, 1.0)
+
+
+class TokenBucket:
+    __slots__ = ("capacity", "per", "tokens", "updated")
+
+    def __init__(self, capacity: int, per: float):
+        self.capacity = capacity
+        self.per = per
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is now)."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / self.per)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) * self.per / self.capacity
+
+    def take(self):
+        self.tokens -= 1
+
+
+class _Action:
+    __slots__ = ("priority", "seq", "route", "kind", "target", "kwargs", "future", "queued_at")
+
+    def __init__(self, priority, seq, route, kind, target, kwargs):
+        self.priority = priority
+        self.seq = seq
+        self.route = route
+        self.kind = kind
+        self.target = target
+        self.kwargs = kwargs
+        self.future = asyncio.get_running_loop().create_future()
+        self.queued_at = time.perf_counter()
+
+
+class OutboundScheduler:
+    """Per-channel queue for the bot's own message posts, edits and deletes.
+
+    Each channel with pending actions gets one worker task that runs them in
+    priority order (claim results, then other edits, posts, deletes), taking
+    a token from the channel's per-route bucket and a global bucket first.
+    A queued edit of a message absorbs later edits of the same message, and
+    queued edits are dropped once the message is queued for deletion. A
+    channel's buckets are kept until they have refilled, so the limits hold
+    across bursts; channels idle that long hold no state.
+    """
+
+    def __init__(self, buckets: Dict[str, Tuple[int, float]] = None, global_bucket: Tuple[int, float] = GLOBAL_BUCKET):
+        self.bucket_limits = dict(DEFAULT_BUCKETS, **(buckets or {}))
+        self._global = TokenBucket(*global_bucket)
+        self._queues: Dict[int, List[_Action]] = {}
+        self._buckets: Dict[Tuple[int, str], TokenBucket] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._edits: Dict[int, _Action] = {}  # message id -> queued edit
+        self._seq = itertools.count()
+        self.coalesced = 0
+
+    def pending(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    # --- PUBLIC API ---
+    async def send(self, channel, **kwargs):
+        """``channel.send(**kwargs)``; returns the sent message."""
+        return await self._enqueue(channel.id, POST, "post", "send", channel, kwargs)
+
+    async def edit(self, message, priority: int = EDIT, **kwargs):
+        """``message.edit(**kwargs)``, merged into an edit of the same message that hasn't started yet."""
+        queued = self._edits.get(message.id)
+        if queued is not None:
+            queued.kwargs.update(kwargs)
+            if priority < queued.priority:
+                queued.priority = priority
+            self.coalesced += 1
+            metrics.OUTBOUND_COALESCED.inc()
+            return await asyncio.shield(queued.future)
+        return await self._enqueue(message.channel.id, priority, "edit", "edit", message, kwargs)
+
+    async def delete(self, message):
+        """``message.delete()``; edits still queued for the message are dropped."""
+        queued = self._edits.pop(message.id, None)
+        if queued is not None:
+            self._queues[message.channel.id].remove(queued)
+            queued.future.set_result(None)
+        return await self._enqueue(message.channel.id, DELETE, "delete", "delete", message, {})
+
+    async def close(self, timeout: float = 5.0):
+        """Let queued actions finish for up to ``timeout`` seconds, then cancel the rest."""
+        workers = list(self._workers.values())
+        if workers:
+            await asyncio.wait(workers, timeout=timeout)
+        for task in self._workers.values():
+            task.cancel()
+        for queue in self._queues.values():
+            for action in queue:
+                if not action.future.done():
+                    action.future.cancel()
+        self._queues.clear()
+        self._edits.clear()
+
+    # --- INTERNALS ---
+    async def _enqueue(self, channel_id: int, priority: int, route: str, kind: str, target, kwargs) -> Any:
+        action = _Action(priority, next(self._seq), route, kind, target, kwargs)
+        self._queues.setdefault(channel_id, []).append(action)
+        if kind == "edit":
+            self._edits[target.id] = action
+        if channel_id not in self._workers:
+            self._prune(time.monotonic())
+            self._workers[channel_id] = asyncio.create_task(self._drain(channel_id))
+        return await asyncio.shield(action.future)
+
+    def _bucket(self, channel_id: int, route: str) -> TokenBucket:
+        bucket = self._buckets.get((channel_id, route))
+        if bucket is None:
+            bucket = self._buckets[(channel_id, route)] = TokenBucket(*self.bucket_limits[route])
+        return bucket
+
+    def _prune(self, now: float):
+        """Drop buckets of idle channels that are full again, i.e. unused for a whole window."""
+        for key, bucket in list(self._buckets.items()):
+            if key[0] not in self._workers and now - bucket.updated >= bucket.per:
+                del self._buckets[key]
+
+    def _next(self, channel_id: int, queue: List[_Action]) -> Tuple[Optional[_Action], float]:
+        """Highest-priority action whose bucket has a token, else how long until one does."""
+        now = time.monotonic()
+        wait = self._global.wait_time(now)
+        if wait > 0:
+            return None, wait
+        best, soonest = None, None
+        for action in queue:
+            w = self._bucket(channel_id, action.route).wait_time(now)
+            if w == 0:
+                if best is None or (action.priority, action.seq) < (best.priority, best.seq):
+                    best = action
+            elif soonest is None or w < soonest:
+                soonest = w
+        return best, soonest or 0.0
+
+    async def _drain(self, channel_id: int):
+        queue = self._queues[channel_id]
+        try:
+            while queue:
+                action, wait = self._next(channel_id, queue)
+                if action is None:
+                    await asyncio.sleep(wait)
+                    continue
+                queue.remove(action)
+                if action.kind == "edit" and self._edits.get(action.target.id) is action:
+                    del self._edits[action.target.id]
+                self._bucket(channel_id, action.route).take()
+                self._global.take()
+                metrics.OUTBOUND_QUEUE_SECONDS.labels(action.kind).observe(time.perf_counter() - action.queued_at)
+                try:
+                    result = await getattr(action.target, action.kind)(**action.kwargs)
+                except Exception as e:
+                    if not action.future.done():
+                        action.future.set_exception(e)
+                else:
+                    if not action.future.done():
+                        action.future.set_result(result)
+        finally:
+            del self._workers[channel_id]
+            if not queue:
+                self._queues.pop(channel_id, None)
+                # the buckets stay until they've refilled, see _prune
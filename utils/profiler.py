@@ -0,0 +1,122 @@
+import sys
+import time
+import asyncio
+import threading
+from array import array
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+import psutil
+
+_process = psutil.Process()
+_process.cpu_percent(None)  # prime it, the next call reports usage since now
+
+
+def process_stats() -> Dict[str, Any]:
+    """RSS/VMS in MB, CPU percent since the previous call, thread and fd counts."""
+    mem = _process.memory_info()
+    stats = {
+        "rss_mb": mem.rss / 2**20,
+        "vms_mb": mem.vms / 2**20,
+        "cpu_percent": _process.cpu_percent(None),
+        "threads": _process.num_threads(),
+    }
+    try:
+        stats["open_fds"] = _process.num_fds()
+    except AttributeError:  # Windows
+        stats["open_fds"] = len(_process.open_files())
+    return stats
+
+
+_NOT_FOLLOWED = (type, type(sys), type(process_stats))  # classes, modules, functions
+
+
+def deep_sizeof(obj: Any, exclude: tuple = ()) -> int:
+    """Bytes held by ``obj`` and everything reachable from it, each object counted once.
+
+    Walks containers, ``__dict__`` and ``__slots__``. Classes, modules,
+    functions and instances of ``exclude`` (say the bot or a cog a view
+    points back to) are neither counted nor followed. Nothing is locked:
+    walk structures only their own thread mutates from that thread, and
+    anything shared as a copy taken under its lock.
+    """
+    seen = set()
+    stack = [obj]
+    total = 0
+    skip = _NOT_FOLLOWED + tuple(exclude)
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, skip):
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, (str, bytes, int, float, bool, array)) or o is None:
+            continue
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        else:
+            d = getattr(o, "__dict__", None)
+            if d is not None:
+                stack.append(d)
+            for cls in type(o).__mro__:
+                for name in getattr(cls, "__slots__", ()):
+                    if hasattr(o, name):
+                        stack.append(getattr(o, name))
+    return total
+
+
+class LoopSampler:
+    """Time-boxed sampling profiler for one thread, usually the event loop's.
+
+    A helper thread reads the target's current frame every ``interval``
+    seconds and counts the innermost function (self time) and every function
+    on the stack (total time). Nothing is installed on the profiled thread,
+    and when no sampling run is active there is no thread at all.
+    """
+
+    def __init__(self, thread_id: int = None, interval: float = 0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = 0
+        self.self_counts: Counter = Counter()
+        self.total_counts: Counter = Counter()
+
+    @staticmethod
+    def _key(code) -> Tuple[str, int, str]:
+        return code.co_filename, code.co_firstlineno, code.co_name
+
+    def _sample(self, deadline: float):
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples += 1
+                self.self_counts[self._key(frame.f_code)] += 1
+                on_stack = set()
+                while frame is not None:
+                    on_stack.add(self._key(frame.f_code))
+                    frame = frame.f_back
+                self.total_counts.update(on_stack)
+            del frame
+            time.sleep(self.interval)
+
+    def run(self, seconds: float):
+        """Sample for ``seconds``; call it from any thread but the profiled one."""
+        self._sample(time.monotonic() + seconds)
+
+    async def run_async(self, seconds: float):
+        """Sample the calling loop's thread without blocking it."""
+        await asyncio.to_thread(self.run, seconds)
+
+    def top(self, n: int = 15, by: str = "self") -> List[Tuple[str, int, int]]:
+        """``(function, self samples, total samples)`` for the hottest ``n`` functions."""
+        counts = self.self_counts if by == "self" else self.total_counts
+        out = []
+        for key, _ in counts.most_common(n):
+            filename, lineno, name = key
+            short = filename.replace("\\", "/").rsplit("/", 2)
+            label = f"{name} ({'/'.join(short[-2:])}:{lineno})"
+            out.append((label, self.self_counts.get(key, 0), self.total_counts.get(key, 0)))
+        return out
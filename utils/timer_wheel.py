@@ -0,0 +1,57 @@
+import time
+from typing import Any, Dict, List
+
+
+class TimerWheel:
+    """One deadline per key on a hashed timing wheel; setting or cancelling one is O(1).
+
+    Time is cut into ``tick``-second slots on a ring of ``size``; a deadline
+    more than one turn away waits in its slot for its turn to come round.
+    ``advance(now)`` visits only the slots that passed since the last call
+    and hands back the keys that came due, at most one tick late.
+    """
+
+    __slots__ = ("tick", "slots", "where", "cursor")
+
+    def __init__(self, tick: float = 0.1, size: int = 512, now: float = None):
+        self.tick = tick
+        self.slots: List[Dict[Any, float]] = [{} for _ in range(size)]  # key -> deadline
+        self.where: Dict[Any, int] = {}  # key -> slot index
+        self.cursor = int((time.time() if now is None else now) // tick) - 1  # last tick visited
+
+    def __len__(self) -> int:
+        return len(self.where)
+
+    def __contains__(self, key) -> bool:
+        return key in self.where
+
+    def schedule(self, key, when: float):
+        """Set ``key``'s deadline, replacing the one it had."""
+        self.cancel(key)
+        t = max(int(when // self.tick), self.cursor + 1)  # already due: the next advance picks it up
+        i = t % len(self.slots)
+        self.slots[i][key] = when
+        self.where[key] = i
+
+    def cancel(self, key):
+        i = self.where.pop(key, None)
+        if i is not None:
+            del self.slots[i][key]
+
+    def advance(self, now: float = None) -> List[Any]:
+        """Keys whose deadline is at or before ``now``; their timers are gone afterwards."""
+        now = time.time() if now is None else now
+        last = int(now // self.tick) - 1  # newest tick that has fully passed
+        n = len(self.slots)
+        steps = min(last - self.cursor, n)  # after a long stall one turn covers every slot
+        due = []
+        for t in range(last - steps + 1, last + 1):
+            slot = self.slots[t % n]
+            if slot:
+                for key, when in list(slot.items()):
+                    if when <= now:
+                        del slot[key]
+                        del self.where[key]
+                        due.append(key)
+        self.cursor = max(self.cursor, last)
+        return due
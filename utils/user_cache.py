@@ -0,0 +1,71 @@
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+import discord
+
+
+class UserDisplayCache:
+    """Bounded LRU of user id -> display name, filled on demand.
+
+    Without the member cache ``bot.get_user`` only knows users the gateway
+    happened to send, so misses are fetched over HTTP (at most
+    ``concurrency`` at once) and remembered. Users that no longer exist are
+    remembered as ``None`` so they aren't fetched again.
+    """
+
+    def __init__(self, maxsize: int = 1000, concurrency: int = 4):
+        self.maxsize = maxsize
+        self._names: "OrderedDict[int, Optional[str]]" = OrderedDict()
+        self._fetching: Dict[int, asyncio.Future] = {}
+        self._sem = asyncio.Semaphore(concurrency)
+        self.hits = 0
+        self.fetches = 0
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def _store(self, user_id: int, name: Optional[str]):
+        self._names[user_id] = name
+        self._names.move_to_end(user_id)
+        while len(self._names) > self.maxsize:
+            self._names.popitem(last=False)
+
+    async def _fetch(self, bot, user_id: int) -> Optional[str]:
+        async with self._sem:
+            self.fetches += 1
+            try:
+                user = await bot.fetch_user(user_id)
+            except discord.NotFound:
+                user = None
+            except discord.HTTPException:
+                return None  # try again next time
+        self._store(user_id, user.display_name if user else None)
+        return self._names.get(user_id)
+
+    async def resolve(self, bot, user_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+        """Display names for ``user_ids``; None for users that couldn't be resolved."""
+        out: Dict[int, Optional[str]] = {}
+        waits = {}
+        for uid in user_ids:
+            if uid in self._names:
+                self._names.move_to_end(uid)
+                out[uid] = self._names[uid]
+                self.hits += 1
+                continue
+            user = bot.get_user(uid)
+            if user is not None:
+                self._store(uid, user.display_name)
+                out[uid] = user.display_name
+                continue
+            task = self._fetching.get(uid)
+            if task is None:
+                task = self._fetching[uid] = asyncio.ensure_future(self._fetch(bot, uid))
+                task.add_done_callback(lambda _, uid=uid: self._fetching.pop(uid, None))
+            waits[uid] = task
+        for uid, task in waits.items():
+            try:
+                out[uid] = await asyncio.shield(task)
+            except Exception:
+                out[uid] = None
+        return out
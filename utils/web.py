@@ -0,0 +1,60 @@
+import asyncio
+import time
+from typing import Any, Dict
+
+from aiohttp import web
+
+from utils import metrics
+
+LOOP_LAG_INTERVAL = 0.5  # seconds between event-loop lag probes
+
+
+async def _watch_loop_lag(interval: float = LOOP_LAG_INTERVAL):
+    # a timer that fires late means something blocked the loop
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        metrics.LOOP_LAG_SECONDS.observe(max(0.0, time.perf_counter() - started - interval))
+
+
+def make_app(bot, info: Dict[str, Any] = None) -> web.Application:
+    """``/`` keep-alive, ``/healthz`` gateway status and ``/metrics`` for Prometheus."""
+    info = info or {}
+
+    async def home(request):
+        return web.Response(text="✅ Bot is alive!")
+
+    async def healthz(request):
+        ready = bot.is_ready() and not bot.is_closed()
+        body = dict(info, ready=ready, guilds=len(bot.guilds),
+                    latency_ms=round(bot.latency * 1000) if ready else None)
+        if ready and hasattr(bot, "latencies"):  # AutoShardedBot
+            body["shard_latency_ms"] = {str(sid): round(lat * 1000) for sid, lat in bot.latencies}
+        return web.json_response(body, status=200 if ready else 503)
+
+    async def metrics_view(request):
+        return web.Response(body=metrics.render().encode(),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    async def watch_lag(app):
+        task = asyncio.create_task(_watch_loop_lag())
+        yield
+        task.cancel()
+
+    app = web.Application()
+    app.router.add_get("/", home)
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/metrics", metrics_view)
+    app.cleanup_ctx.append(watch_lag)
+    return app
+
+
+async def start_web(bot, port: int, info: Dict[str, Any] = None) -> web.AppRunner:
+    """Serve the app on the bot's own event loop; returns the runner to ``cleanup()``."""
+    runner = web.AppRunner(make_app(bot, info), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", port).start()
+    metrics.CACHE_SIZE.labels("discord_users").set_function(lambda: len(bot.users))
+    metrics.CACHE_SIZE.labels("discord_guilds").set_function(lambda: len(bot.guilds))
+    metrics.CACHE_SIZE.labels("discord_members").set_function(lambda: sum(len(g.members) for g in bot.guilds))
+    return runner